@@ -8,12 +8,15 @@ import os
 import sys
 
 from turbofile import create_app
-from turbofile.extensions import socketio
-from turbofile.core import TURBOFILE_HOST_IP, BASE_DIR
 
-app = create_app()
 
 if __name__ == '__main__':
+    # Image pool workers re-import this module as __mp_main__; keep the app out of them.
+    from turbofile.extensions import socketio
+    from turbofile.core import TURBOFILE_HOST_IP, BASE_DIR, resume_journaled_transfers
+
+    app = create_app()
+
     # Ensure the templates directory exists.
     os.makedirs(os.path.join(BASE_DIR, 'templates'), exist_ok=True)
 
@@ -23,6 +26,11 @@ if __name__ == '__main__':
     print(f"📱 访问地址: http://{TURBOFILE_HOST_IP}:5000")
     print("🔧 确保所有服务器SSH密钥已配置")
 
+    # With the debug reloader this block runs in the watcher and in the serving child;
+    # only the serving process may replay the journal, or every job would restart twice.
+    if is_production or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_journaled_transfers()
+
     if is_production:
         print("🏭 生产模式启动")
         socketio.run(app, host='0.0.0.0', port=5000, debug=False, allow_unsafe_werkzeug=True)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Developer benchmark: ls -la text parsing vs. the structured find -printf listing parser.
+
+Usage: python benchmark_listing.py [entries] [repeat]
+"""
+
+import json
+import sys
+import time
+
+from turbofile.core import parse_find_listing, parse_ls_listing
+
+
+def benchmark_listing_parsers(entries=100000, repeat=3):
+    """Time the ls -la text parser against the structured find -printf parser on synthetic rows."""
+    entries = max(1, int(entries))
+    names = [f"file {i:07d} copy.dat" if i % 10 else f"dir_{i:07d}" for i in range(entries)]
+    ls_lines = [
+        f"{'drwxr-xr-x' if i % 10 == 0 else '-rw-r--r--'} 1 user group {i * 7} 2024-05-{1 + i % 28:02d} 12:{i % 60:02d} {name}"
+        for i, name in enumerate(names)
+    ]
+    find_text = ''.join(
+        f"{'d' if i % 10 == 0 else 'f'}\0{i * 7}\0{1714564800 + i}.5\0"
+        f"2024-05-{1 + i % 28:02d} 12:{i % 60:02d}\0{name}\0"
+        for i, name in enumerate(names)
+    )
+    ls_text = '\n'.join(ls_lines)
+
+    def _best(fn):
+        best = None
+        for _ in range(max(1, int(repeat))):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    ls_sec = _best(lambda: parse_ls_listing(ls_text.split('\n'), '/data/bench', False))
+    find_sec = _best(lambda: parse_find_listing(find_text, '/data/bench', False))
+    return {
+        'entries': entries,
+        'ls_ms': round(ls_sec * 1000, 1),
+        'find_ms': round(find_sec * 1000, 1),
+        'speedup': round(ls_sec / find_sec, 2) if find_sec else None,
+        'ls_bytes': len(ls_text.encode('utf-8')),
+        'find_bytes': len(find_text.encode('utf-8')),
+    }
+
+
+if __name__ == '__main__':
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(json.dumps(benchmark_listing_parsers(entries, repeat), ensure_ascii=False, indent=2))
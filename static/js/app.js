@@ -683,6 +683,7 @@
             const startBtn = document.getElementById('startTransferBtn');
             if (startBtn) startBtn.style.display = 'none';
             document.getElementById('cancelTransferBtn').style.display = 'inline-block';
+            { const el = document.getElementById('rateLimitBtn'); if (el) el.style.display = 'inline-block'; }
 
 	            const fileNames = files.map(f => f.name).join(', ');
 	            if (selectAllPayload) {
@@ -4135,6 +4136,15 @@
         }
 
 
+        const pendingSizeJobs = new Map();
+
+        function reportComputedSize(result, label) {
+            const sizeText = result.human_size || result.size_bytes + ' bytes';
+            const countText = typeof result.file_count === 'number' ? `，${result.file_count} 个文件` : '';
+            addLogSuccess(`📏 大小: ${sizeText}${countText} (${label})`);
+            showToast(`📏 大小: ${sizeText}`, 'success');
+        }
+
         async function computeSizeOnServer(server, filePath, fileName) {
             if (!server) {
                 addLogWarning('⚠️ 请先选择服务器');
@@ -4153,10 +4163,11 @@
                     body: JSON.stringify({ server: server, path: filePath })
                 });
                 const result = await resp.json();
-                if (result.success) {
-                    const sizeText = result.human_size || result.size_bytes + ' bytes';
-                    addLogSuccess(`📏 大小: ${sizeText} (${fileName || filePath})`);
-                    showToast(`📏 大小: ${sizeText}`, 'success');
+                if (result.success && result.pending) {
+                    pendingSizeJobs.set(result.job_id, fileName || filePath);
+                    addLogInfo(`⏳ 仍在统计: 已计 ${result.human_size} (${result.file_count} 个文件)，完成后自动显示`);
+                } else if (result.success) {
+                    reportComputedSize(result, fileName || filePath);
                 } else {
                     addLogError(`❌ 计算失败: ${result.error || '未知错误'}`);
                     showActionFailureToast('计算失败', result);
@@ -4506,6 +4517,10 @@
                 limit: BROWSE_PAGE_SIZE,
                 force_refresh: forceRefresh
             }), isSource);
+            if (!isReset && state.browseCursor) {
+                // Keep paging the same streamed listing so the order stays stable.
+                params.set('cursor', state.browseCursor);
+            }
 
             try {
                 const response = await fetch(`/api/browse/${server}?${params.toString()}`, {
@@ -4527,6 +4542,7 @@
                     const startIndex = requestOffset;
 
                     state.total = total;
+                    state.browseCursor = data.streaming ? data.cursor : null;
                     state.loadedCount = data.loaded_count || (state.loadedCount + pageFiles.length);
                     state.hasMore = data.has_more;
                     state.offset = data.next_offset ?? state.loadedCount;
@@ -6211,6 +6227,7 @@
             const startBtn = document.getElementById('startTransferBtn');
             if (startBtn) startBtn.style.display = 'none';
             document.getElementById('cancelTransferBtn').style.display = 'inline-block';
+            { const el = document.getElementById('rateLimitBtn'); if (el) el.style.display = 'inline-block'; }
 
 	            const fileNames = (sourceFiles || []).map(f => f.name).join(', ');
 	            const modeText = mode === 'copy' ? '复制' : '移动';
@@ -6281,6 +6298,22 @@
         }
 
 
+        function setTransferRateLimit() {
+            if (!currentTransferId) return;
+            const input = window.prompt('设置当前传输限速 (MB/s，0 表示不限速)', '0');
+            if (input === null) return;
+            const mbps = parseFloat(input);
+            if (!Number.isFinite(mbps) || mbps < 0) {
+                addLogWarning('⚠️ 无效的限速值');
+                return;
+            }
+            socket.emit('set_rate_limit', {
+                transfer_id: currentTransferId,
+                limit_kb: Math.round(mbps * 1024)
+            });
+        }
+
+
         function forceCancelTransfer() {
             if (currentTransferId) {
                 addLogError('🚨 强制终止传输...');
@@ -6314,6 +6347,7 @@
                 cancelBtn.disabled = false;
                 cancelBtn.innerHTML = '<i class="bi bi-stop-circle-fill"></i> 取消';
             }
+            { const el = document.getElementById('rateLimitBtn'); if (el) el.style.display = 'none'; }
 
 
             const routeEl0 = document.getElementById('transferRoute');
@@ -6337,11 +6371,42 @@
             currentTransferId = data.transfer_id;
             latestTransferredBytes = 0;
             window.transferModeLogged = false;
-            { const el = document.getElementById('transferStatus'); if (el) el.textContent = '传输中...'; }
+            { const el = document.getElementById('transferStatus'); if (el) el.textContent = data.queued ? `排队中 (第 ${data.queue_position} 位)` : '传输中...'; }
             { const el = document.getElementById('elapsedTime'); if (el) el.textContent = '00:00:00'; }
             { const el = document.getElementById('transferSpeed'); if (el) el.textContent = '0 MB/s'; }
             { const el = document.getElementById('transferredBytes'); if (el) el.textContent = '0 B'; }
+            if (data.queued) {
+                addLogInfo(`⏳ 服务器繁忙，任务已进入队列 (第 ${data.queue_position} 位)`);
+            }
+
+        });
+
+
+        socket.on('rate_limit_updated', function(data) {
+            if (data.transfer_id && data.transfer_id !== currentTransferId) return;
+            if (!data.success) {
+                addLogWarning(`⚠️ 限速设置失败: ${data.message || '未知错误'}`);
+                return;
+            }
+            if (data.limit_kb) {
+                addLogInfo(`🚦 限速已设置为 ${formatFileSize(data.limit_kb * 1024)}/s (当前生效 ${formatFileSize((data.effective_kb || 0) * 1024)}/s)`);
+            } else if (data.effective_kb) {
+                addLogInfo(`🚦 已取消任务限速，仍受全局/链路限速 ${formatFileSize(data.effective_kb * 1024)}/s`);
+            } else {
+                addLogInfo('🚦 已取消限速');
+            }
+        });
 
+
+        socket.on('transfer_queued', function(data) {
+            if (data.transfer_id !== currentTransferId) return;
+            const el = document.getElementById('transferStatus');
+            if (data.position > 0) {
+                if (el) el.textContent = `排队中 (第 ${data.position} 位)`;
+            } else {
+                if (el) el.textContent = '传输中...';
+                addLogInfo(`▶️ ${data.message || '排队结束，开始传输'}`);
+            }
         });
 
 
@@ -6363,12 +6428,32 @@
         });
 
 
+        socket.on('size_progress', function(data) {
+            if (!data || !pendingSizeJobs.has(data.job_id)) return;
+            const label = pendingSizeJobs.get(data.job_id);
+            if (!data.done) {
+                addLogInfo(`📦 统计中: ${data.human_size} (${data.file_count} 个文件, ${data.dir_count} 个目录) - ${label}`);
+                return;
+            }
+            pendingSizeJobs.delete(data.job_id);
+            if (data.error) {
+                addLogError(`❌ 计算失败: ${data.error}`);
+                showActionFailureToast('计算失败', data.error);
+            } else {
+                reportComputedSize(data, label);
+            }
+        });
+
+
         socket.on('speed_update', function(data) {
             if (data.transfer_id === currentTransferId) {
 
                 if (data.speed) {
                     const el = document.getElementById('transferSpeed');
-                    if (el) el.textContent = data.speed;
+                    if (el) {
+                        el.textContent = data.speed;
+                        el.title = data.eta ? `预计剩余: ${data.eta}` : '';
+                    }
                 }
 
 
@@ -7849,6 +7934,7 @@
             const IMAGE_GRID_MAX_PARALLEL_EAGER_WIN = 12;
             const IMAGE_GRID_MAX_PARALLEL_BURST_WIN = 16;
             const IMAGE_GRID_BURST_DURATION = 1200;
+            const IMAGE_GRID_BATCH_MAX = 32;
             const IMAGE_GRID_EAGER_SCROLL_RATIO = 0.12;
             const imageGridLoadQueue = [];
             let imageGridLoadingCount = 0;
@@ -8248,9 +8334,128 @@
 		                applyImageGridColumns(initialCols);
 		            }
 
+            function getImageGridThumbVariant(thumbWidth) {
+                return `${thumbWidth}x0q${IMAGE_GRID_THUMB_QUALITY}-ilanczos-fwebp`;
+            }
+
+            function takeImageGridBatch() {
+                // Group queued thumbnails of the same server/size so one request renders many of them.
+                if (imageGridLoadQueue.length < 2) return null;
+                const head = imageGridLoadQueue[0];
+                if (head.noBatch) return null;
+                const thumbWidth = head.width || imageGridThumbWidth || computeImageGridThumbWidth();
+                const picked = [];
+                imageGridLoadQueue.forEach((task, idx) => {
+                    if (picked.length >= IMAGE_GRID_BATCH_MAX || task.noBatch) return;
+                    if (task.server === head.server && (task.width || thumbWidth) === thumbWidth) {
+                        picked.push(idx);
+                    }
+                });
+                if (picked.length < 2) return null;
+                const tasks = picked.map(idx => imageGridLoadQueue[idx]);
+                for (let i = picked.length - 1; i >= 0; i--) {
+                    imageGridLoadQueue.splice(picked[i], 1);
+                }
+                return { server: head.server, width: thumbWidth, tasks };
+            }
+
+            function finishImageGridTask(task, url, err) {
+                if (!task.imgEl) return;
+                if (url && task.imgEl.dataset.loaded !== '1') {
+                    task.imgEl.src = url;
+                    task.imgEl.dataset.loaded = '1';
+                } else if (!url && task.imgEl.dataset.loaded !== '1') {
+                    task.imgEl.alt = '加载失败';
+                    task.imgEl.title = err || '加载失败';
+                    task.imgEl.dataset.loaded = 'err';
+                }
+                try { delete task.imgEl.dataset.loading; } catch (_) { task.imgEl.dataset.loading = '0'; }
+            }
+
+            async function runImageGridBatch(batch) {
+                const variant = getImageGridThumbVariant(batch.width);
+                const pending = [];
+                batch.tasks.forEach(task => {
+                    const cached = previewCacheGet(batch.server, task.path, 'blob', variant);
+                    if (cached) {
+                        finishImageGridTask(task, cached.value);
+                    } else {
+                        pending.push(task);
+                    }
+                });
+                if (!pending.length) return;
+
+                const delivered = new Set();
+                try {
+                    const resp = await fetch('/api/image/batch', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        cache: 'no-store',
+                        body: JSON.stringify({
+                            server: batch.server,
+                            paths: pending.map(task => task.path),
+                            width: batch.width,
+                            quality: IMAGE_GRID_THUMB_QUALITY,
+                            interp: 'lanczos',
+                            format: 'webp'
+                        })
+                    });
+                    if (!resp.ok || !resp.body) throw new Error(`HTTP ${resp.status}`);
+                    const reader = resp.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    const handleLine = (line) => {
+                        if (!line.trim()) return;
+                        const record = JSON.parse(line);
+                        const task = pending[record.index];
+                        if (!task || delivered.has(record.index)) return;
+                        delivered.add(record.index);
+                        if (!record.success) {
+                            finishImageGridTask(task, null, record.error);
+                            return;
+                        }
+                        const bin = atob(record.data);
+                        const bytes = new Uint8Array(bin.length);
+                        for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+                        const url = URL.createObjectURL(new Blob([bytes], { type: record.mime || 'image/jpeg' }));
+                        previewCacheSet(batch.server, task.path, 'blob', url, variant);
+                        finishImageGridTask(task, url);
+                    };
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        let nl = buffer.indexOf('\n');
+                        while (nl >= 0) {
+                            handleLine(buffer.slice(0, nl));
+                            buffer = buffer.slice(nl + 1);
+                            nl = buffer.indexOf('\n');
+                        }
+                    }
+                    handleLine(buffer);
+                } catch (err) {
+                    console.warn('image batch failed:', err);
+                }
+                // Anything the batch did not return goes back through the single-image path.
+                pending.forEach((task, idx) => {
+                    if (delivered.has(idx)) return;
+                    task.noBatch = true;
+                    imageGridLoadQueue.push(task);
+                });
+            }
+
             function processImageGridQueue() {
                 if (imageGridSwitching) return;
                 if (imageGridLoadingCount >= getImageGridParallelLimit()) return;
+                const batch = takeImageGridBatch();
+                if (batch) {
+                    imageGridLoadingCount++;
+                    runImageGridBatch(batch).finally(() => {
+                        imageGridLoadingCount = Math.max(0, imageGridLoadingCount - 1);
+                        requestAnimationFrame(processImageGridQueue);
+                    });
+                    return;
+                }
                 const task = imageGridLoadQueue.shift();
                 if (!task) return;
 		                imageGridLoadingCount++;
@@ -1,12 +1,14 @@
 import os
-from flask import Flask
-
-from .extensions import socketio, SOCKETIO_INIT_OPTIONS
-from .core import secret_key, BASE_DIR
-from .web import bp as web_bp
 
 
 def create_app():
+    # Imported here so image pool workers can load turbofile.imaging without the whole app.
+    from flask import Flask
+
+    from .extensions import socketio, SOCKETIO_INIT_OPTIONS
+    from .core import secret_key, BASE_DIR
+    from .web import bp as web_bp
+
     app = Flask(
         __name__,
         template_folder=os.path.join(BASE_DIR, 'templates'),
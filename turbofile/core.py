@@ -15,21 +15,35 @@ import subprocess
 import re
 import asyncio
 import concurrent.futures
-import random
+import math
 from datetime import datetime
 from functools import lru_cache
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor
 import multiprocessing
 import shutil
 import shlex
 import uuid
+import weakref
 import signal
 import select
 import pty
 import fcntl
 import termios
 import struct
+import fnmatch
+import heapq
+import pickle
+import queue
+import sys
+from array import array
+import codecs
+import tempfile
+import hashlib
+import ctypes
+import ctypes.util
 from difflib import SequenceMatcher
+from collections import OrderedDict
 
 from .extensions import socketio
 
@@ -291,10 +305,17 @@ PARALLEL_TRANSFER_CONFIG = {
     'max_workers': 8,
     'enable_parallel': True,
     'instant_start': True,
+    # In-directory planning (any Linux source) walks the whole tree before the first byte moves,
+    # so it stays opt-in; single-rsync directories start immediately.
     'enable_folder_parallel': False,
     'folder_parallel_threshold': 1000,
     'enable_batch_transfer': True,
-    'batch_max_files': 200
+    'batch_max_files': 200,
+    # Transfer planner: per-file overhead expressed as bytes, and the largest work unit handed to one rsync.
+    'plan_per_file_cost_kb': 256,
+    'plan_unit_max_mb': 4096,
+    'plan_unit_max_files': 5000,
+    'plan_units_per_worker': 4
 }
 
 
@@ -333,6 +354,375 @@ def _load_transfer_bytes_config():
 TRANSFER_BYTES_CONFIG = _load_transfer_bytes_config()
 
 
+def _load_ssh_pool_config():
+    # max_per_host leaves headroom above PARALLEL_TRANSFER_CONFIG['max_workers'] for browsing.
+    config = {
+        'max_per_host': 10,
+        'checkout_timeout': 30.0,
+        'idle_timeout': 300.0,
+        'health_check_after': 30.0,
+        'reap_interval': 60.0,
+        # sshd's MaxSessions defaults to 10; keep room for terminal/run channels on the shared transport.
+        'channels_per_transport': 6,
+        'channel_queue_timeout': 30.0,
+        # Warm SFTP sessions per host for image/file streaming; they share the transport with the channels above.
+        'sftp_sessions_per_server': 4,
+        'sftp_session_wait': 30.0
+    }
+    raw = CONFIG.get('ssh_pool_config')
+    if not isinstance(raw, dict):
+        return config
+    for key, default in config.items():
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = type(default)(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+SSH_POOL_CONFIG = _load_ssh_pool_config()
+
+
+def _load_thumbnail_cache_config():
+    config = {
+        'enabled': True,
+        'max_bytes': 512 * 1024 * 1024,
+        'max_entry_bytes': 4 * 1024 * 1024,
+        'cache_dir': os.path.join(BASE_DIR, 'data', 'thumb_cache')
+    }
+    raw = CONFIG.get('thumbnail_cache_config')
+    if not isinstance(raw, dict):
+        return config
+    enabled = raw.get('enabled')
+    if isinstance(enabled, (bool, int)):
+        config['enabled'] = bool(enabled)
+    for key in ('max_bytes', 'max_entry_bytes'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value)
+            if value > 0:
+                config[key] = value
+        except (TypeError, ValueError):
+            pass
+    return config
+
+THUMBNAIL_CACHE_CONFIG = _load_thumbnail_cache_config()
+
+
+def _load_image_transform_pool_config():
+    config = {
+        'max_workers': max(1, min(4, (os.cpu_count() or 2) // 2)),
+        'queue_limit': 16,
+        'job_timeout': 30,
+        'shm_min_bytes': 256 * 1024
+    }
+    raw = CONFIG.get('image_pool_config')
+    if not isinstance(raw, dict):
+        return config
+    for key in ('max_workers', 'queue_limit', 'job_timeout', 'shm_min_bytes'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0 or (key == 'queue_limit' and value == 0):
+            config[key] = value
+    return config
+
+IMAGE_TRANSFORM_POOL_CONFIG = _load_image_transform_pool_config()
+
+
+def _load_listing_cache_config():
+    config = {
+        'revalidate_after': 2,
+        'max_age': 120,
+        'inotify': True,
+        'max_watches': 1024,
+        'max_entries': 5000,
+        'max_items': 2000000,
+        'sweep_interval': 60,
+        'stream_after': 1.0,
+        'stream_page_wait': 10,
+        'cursor_idle_timeout': 300
+    }
+    raw = CONFIG.get('listing_cache_config')
+    if not isinstance(raw, dict):
+        return config
+    inotify = raw.get('inotify')
+    if isinstance(inotify, (bool, int)):
+        config['inotify'] = bool(inotify)
+    float_keys = ('revalidate_after', 'max_age', 'sweep_interval', 'stream_after', 'stream_page_wait', 'cursor_idle_timeout')
+    for key in float_keys + ('max_watches', 'max_entries', 'max_items'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = float(value) if key in float_keys else int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0 or (key == 'revalidate_after' and value == 0):
+            config[key] = value
+    return config
+
+LISTING_CACHE_CONFIG = _load_listing_cache_config()
+
+
+def _load_search_index_config():
+    config = {
+        'index_dir': os.path.join(BASE_DIR, 'data', 'search_index'),
+        'save_interval': 300,
+        'crawl_timeout': 3600,
+        'max_results': 200,
+        'debounce_ms': 150,
+        'live_max_results': 1000
+    }
+    raw = CONFIG.get('search_index_config')
+    if not isinstance(raw, dict):
+        return config
+    for key in ('save_interval', 'crawl_timeout', 'max_results', 'debounce_ms', 'live_max_results'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+SEARCH_INDEX_CONFIG = _load_search_index_config()
+
+
+def _load_dir_size_config():
+    config = {
+        'wait_seconds': 2.0,
+        'progress_interval': 1.0,
+        'max_dirs': 2000000
+    }
+    raw = CONFIG.get('dir_size_config')
+    if not isinstance(raw, dict):
+        return config
+    for key in ('wait_seconds', 'progress_interval', 'max_dirs'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value) if key == 'max_dirs' else float(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+DIR_SIZE_CONFIG = _load_dir_size_config()
+
+
+def _load_stripe_config():
+    config = {
+        'enabled': True,
+        'threshold_mb': 8192,
+        'streams': 4,
+        'chunk_mb': 256,
+        'checksum': 'md5'
+    }
+    raw = CONFIG.get('stripe_config')
+    if not isinstance(raw, dict):
+        return config
+    if isinstance(raw.get('enabled'), bool):
+        config['enabled'] = raw['enabled']
+    if str(raw.get('checksum', '')).lower() in ('md5', 'sha1', 'sha256'):
+        config['checksum'] = str(raw['checksum']).lower()
+    for key in ('threshold_mb', 'streams', 'chunk_mb'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+STRIPE_CONFIG = _load_stripe_config()
+
+
+def _load_tar_stream_config():
+    config = {
+        'enabled': True,
+        'avg_file_kb': 256,
+        'min_files': 1000,
+        'sample_files': 100000
+    }
+    raw = CONFIG.get('tar_stream_config')
+    if not isinstance(raw, dict):
+        return config
+    if isinstance(raw.get('enabled'), bool):
+        config['enabled'] = raw['enabled']
+    for key in ('avg_file_kb', 'min_files', 'sample_files'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+TAR_STREAM_CONFIG = _load_tar_stream_config()
+
+
+def _load_transfer_journal_config():
+    config = {
+        'enabled': True,
+        'journal_dir': os.path.join(BASE_DIR, 'data', 'transfer_journal'),
+        'auto_resume': True,
+        'checkpoint_interval': 5.0
+    }
+    raw = CONFIG.get('transfer_journal_config')
+    if not isinstance(raw, dict):
+        return config
+    for key in ('enabled', 'auto_resume'):
+        if isinstance(raw.get(key), bool):
+            config[key] = raw[key]
+    if isinstance(raw.get('journal_dir'), str) and raw['journal_dir'].strip():
+        config['journal_dir'] = raw['journal_dir'].strip()
+    value = raw.get('checkpoint_interval')
+    if value is not None and not isinstance(value, bool):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = 0
+        if value > 0:
+            config['checkpoint_interval'] = value
+    return config
+
+TRANSFER_JOURNAL_CONFIG = _load_transfer_journal_config()
+
+
+def _load_transfer_scheduler_config():
+    config = {
+        'enabled': True,
+        'max_active': 6,
+        'per_server': 3,
+        'per_link': 2,
+        'aging_seconds': 300
+    }
+    raw = CONFIG.get('transfer_scheduler_config')
+    if not isinstance(raw, dict):
+        return config
+    if isinstance(raw.get('enabled'), bool):
+        config['enabled'] = raw['enabled']
+    for key in ('max_active', 'per_server', 'per_link', 'aging_seconds'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+TRANSFER_SCHEDULER_CONFIG = _load_transfer_scheduler_config()
+
+
+def _parse_clock(text):
+    """'HH:MM' -> minutes after midnight, None when malformed."""
+    try:
+        hours, minutes = str(text).strip().split(':')
+        value = int(hours) * 60 + int(minutes)
+    except (TypeError, ValueError):
+        return None
+    return value if 0 <= value <= 24 * 60 else None
+
+
+def _load_bandwidth_config():
+    config = {
+        'global_limit': 0,
+        'pair_limits': {},
+        'schedules': []
+    }
+    raw = CONFIG.get('bandwidth_config')
+    if not isinstance(raw, dict):
+        return config
+    try:
+        config['global_limit'] = max(0, int(raw.get('global_limit') or 0))
+    except (TypeError, ValueError):
+        pass
+    pairs = raw.get('pair_limits')
+    if isinstance(pairs, dict):
+        for key, value in pairs.items():
+            source, sep, target = str(key).partition('->')
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                continue
+            if sep and value > 0:
+                config['pair_limits'][(source.strip() or '*', target.strip() or '*')] = value
+    schedules = raw.get('schedules')
+    if isinstance(schedules, list):
+        for entry in schedules:
+            if not isinstance(entry, dict):
+                continue
+            start = _parse_clock(entry.get('start'))
+            end = _parse_clock(entry.get('end'))
+            try:
+                limit = max(0, int(entry.get('limit') or 0))
+            except (TypeError, ValueError):
+                continue
+            if start is not None and end is not None and start != end:
+                config['schedules'].append({'start': start, 'end': end, 'limit': limit})
+    return config
+
+BANDWIDTH_CONFIG = _load_bandwidth_config()
+
+
+def _load_autotune_config():
+    config = {
+        'enabled': True,
+        'initial_streams': 4,
+        'max_streams': 12,
+        'sample_seconds': 3.0,
+        'min_gain': 0.1,
+        'reprobe_windows': 10,
+        'state_file': os.path.join(BASE_DIR, 'data', 'autotune.json')
+    }
+    raw = CONFIG.get('autotune_config')
+    if not isinstance(raw, dict):
+        return config
+    if isinstance(raw.get('enabled'), bool):
+        config['enabled'] = raw['enabled']
+    if isinstance(raw.get('state_file'), str) and raw['state_file'].strip():
+        config['state_file'] = raw['state_file'].strip()
+    float_keys = ('sample_seconds', 'min_gain')
+    for key in float_keys + ('initial_streams', 'max_streams', 'reprobe_windows'):
+        value = raw.get(key)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = float(value) if key in float_keys else int(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            config[key] = value
+    return config
+
+AUTOTUNE_CONFIG = _load_autotune_config()
+
+
 
 
 
@@ -391,7 +781,7 @@ def emit_transfer_log(transfer_id, message):
 
 TRANSFER_BYTES_STATE = {}
 TRANSFER_BYTES_LOCK = threading.Lock()
-RSYNC_PROGRESS_BYTES_RE = re.compile(r'^\s*([0-9][0-9,]*)\s+\d+%')
+RSYNC_PROGRESS_BYTES_RE = re.compile(r'^\s*([0-9][0-9,]*)\s+(\d+)%')
 
 def init_transfer_bytes(transfer_id):
     if not transfer_id:
@@ -408,7 +798,7 @@ def cleanup_transfer_bytes(transfer_id):
     with TRANSFER_BYTES_LOCK:
         TRANSFER_BYTES_STATE.pop(transfer_id, None)
 
-def update_transfer_bytes_part(transfer_id, part_id, bytes_val):
+def update_transfer_bytes_part(transfer_id, part_id, bytes_val, percent=None):
     if not transfer_id or not part_id:
         return
     try:
@@ -420,6 +810,8 @@ def update_transfer_bytes_part(transfer_id, part_id, bytes_val):
         current = state['parts'].get(part_id)
         if current is None or bytes_val > current:
             state['parts'][part_id] = bytes_val
+    rate_tracker.record_part(transfer_id, part_id, bytes_val, percent)
+    transfer_journal.checkpoint(transfer_id)
 
 def finalize_transfer_bytes_part(transfer_id, part_id, final_bytes=None):
     if not transfer_id or not part_id:
@@ -438,6 +830,7 @@ def finalize_transfer_bytes_part(transfer_id, part_id, final_bytes=None):
                 pass
         if part_val is not None:
             state['completed_total'] += part_val
+    rate_tracker.finish_part(transfer_id, part_id, part_val)
 
 def get_transfer_bytes_total(transfer_id):
     if not transfer_id:
@@ -459,13 +852,18 @@ def emit_transfer_bytes_snapshot(transfer_id):
     })
 
 def _parse_rsync_progress_bytes(text):
+    parsed = _parse_rsync_progress_bytes_and_percent(text)
+    return parsed[0] if parsed else None
+
+def _parse_rsync_progress_bytes_and_percent(text):
+    """Parse a progress2 line into (bytes, percent); None when the line is not a progress line."""
     if not text:
         return None
     match = RSYNC_PROGRESS_BYTES_RE.match(text.strip())
     if not match:
         return None
     try:
-        return int(match.group(1).replace(',', ''))
+        return int(match.group(1).replace(',', '')), int(match.group(2))
     except Exception:
         return None
 
@@ -481,15 +879,17 @@ def _consume_progress_text(buffer, text, transfer_id, part_id):
             break
         line = buffer[:idx]
         buffer = buffer[idx + 1:]
-        bytes_val = _parse_rsync_progress_bytes(line)
-        if bytes_val is not None:
-            update_transfer_bytes_part(transfer_id, part_id, bytes_val)
+        parsed = _parse_rsync_progress_bytes_and_percent(line)
+        if parsed is not None:
+            update_transfer_bytes_part(transfer_id, part_id, parsed[0], parsed[1])
     if len(buffer) > 8192:
         buffer = buffer[-8192:]
     return buffer
 
 def _append_rsync_progress_opts(rsync_opts):
-    if TRANSFER_BYTES_CONFIG.get('enabled', True) and '--info=progress2' not in rsync_opts:
+    # Always request progress2: the rate tracker needs the byte counters even when
+    # the "transferred" display is disabled in transfer_bytes_config.
+    if '--info=progress2' not in rsync_opts:
         rsync_opts.append('--info=progress2')
 
 def _run_rsync_subprocess_with_progress(cmd, transfer_id, part_id):
@@ -497,13 +897,20 @@ def _run_rsync_subprocess_with_progress(cmd, transfer_id, part_id):
     import os
     import signal
 
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        bufsize=0,
-        preexec_fn=os.setsid
-    )
+    cmd = _with_resume_opts(cmd, transfer_id)
+    bandwidth_manager.open_stream(transfer_id)
+    cmd = _with_bwlimit(cmd, transfer_id, part_id)
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            preexec_fn=os.setsid
+        )
+    except Exception:
+        bandwidth_manager.close_stream(transfer_id, part_id)
+        raise
 
     register_transfer_process(transfer_id, {
         'type': 'subprocess',
@@ -527,6 +934,7 @@ def _run_rsync_subprocess_with_progress(cmd, transfer_id, part_id):
                     chunk = b''
                 if chunk:
                     buffer = _consume_progress_text(buffer, chunk.decode('utf-8', errors='ignore'), transfer_id, part_id)
+                    bandwidth_manager.pace(transfer_id, part_id, process)
                 else:
                     if process.poll() is not None:
                         break
@@ -554,39 +962,458 @@ def _run_rsync_subprocess_with_progress(cmd, transfer_id, part_id):
                 pass
         raise Exception("传输被用户取消")
     finally:
+        bandwidth_manager.close_stream(transfer_id, part_id)
         finalize_transfer_bytes_part(transfer_id, part_id)
 
     return return_code
 
-def _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id):
-    stdin, stdout, stderr = ssh.exec_command(remote_cmd)
-    register_transfer_process(transfer_id, {'type': 'ssh', 'channel': stdout.channel})
-
-    channel = stdout.channel
+def _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id, stdin_data=None):
+    remote_cmd = _with_resume_opts(remote_cmd, transfer_id)
+    bandwidth_manager.open_stream(transfer_id)
+    remote_cmd = _with_bwlimit(remote_cmd, transfer_id, part_id)
     buffer = ''
     err_buf = ''
     max_err = 8192
+    try:
+        stdin, stdout, stderr = ssh.exec_command(remote_cmd)
+        register_transfer_process(transfer_id, {'type': 'ssh', 'channel': stdout.channel})
 
-    while True:
-        if channel.recv_ready():
-            chunk = channel.recv(4096)
-            if chunk:
-                buffer = _consume_progress_text(buffer, chunk.decode('utf-8', errors='ignore'), transfer_id, part_id)
-        if channel.recv_stderr_ready():
-            chunk = channel.recv_stderr(4096)
-            if chunk:
-                err_buf += chunk.decode('utf-8', errors='ignore')
-                if len(err_buf) > max_err:
-                    err_buf = err_buf[-max_err:]
-        if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
-            break
-        time.sleep(0.1)
+        channel = stdout.channel
+        if stdin_data is not None:
+            channel.sendall(stdin_data)
+            channel.shutdown_write()
+        while True:
+            if channel.recv_ready():
+                chunk = channel.recv(4096)
+                if chunk:
+                    buffer = _consume_progress_text(buffer, chunk.decode('utf-8', errors='ignore'), transfer_id, part_id)
+            if channel.recv_stderr_ready():
+                chunk = channel.recv_stderr(4096)
+                if chunk:
+                    err_buf += chunk.decode('utf-8', errors='ignore')
+                    if len(err_buf) > max_err:
+                        err_buf = err_buf[-max_err:]
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            time.sleep(0.1)
 
-    exit_status = channel.recv_exit_status()
-    finalize_transfer_bytes_part(transfer_id, part_id)
+        exit_status = channel.recv_exit_status()
+    finally:
+        bandwidth_manager.close_stream(transfer_id, part_id)
+        finalize_transfer_bytes_part(transfer_id, part_id)
     return exit_status, err_buf
 
 
+RSYNC_RESUME_OPTS = ('--partial', '--append-verify')
+RSYNC_COMMAND_RE = re.compile(r'(^|\s)rsync(?=\s)')
+
+def _insert_rsync_opts(cmd, opts):
+    """Insert options right after the rsync word of an argv list or a remote shell command."""
+    if isinstance(cmd, str):
+        return RSYNC_COMMAND_RE.sub(lambda m: f"{m.group(0)} {' '.join(opts)}", cmd, count=1)
+    cmd = list(cmd)
+    if 'rsync' in cmd:
+        index = cmd.index('rsync') + 1
+        cmd[index:index] = list(opts)
+    return cmd
+
+def _with_resume_opts(cmd, transfer_id):
+    """For resumed jobs keep partial files and only send the bytes past what the target already has."""
+    if not transfer_journal.is_resumed(transfer_id):
+        return cmd
+    if isinstance(cmd, str):
+        cmd = cmd.replace(' --whole-file', '')
+    else:
+        cmd = [arg for arg in cmd if arg != '--whole-file']
+    return _insert_rsync_opts(cmd, RSYNC_RESUME_OPTS)
+
+def _with_bwlimit(cmd, transfer_id, part_id):
+    """Give a starting rsync stream its share of the transfer's byte budget as --bwlimit (KB/s)."""
+    limit = bandwidth_manager.stream_limit_kb(transfer_id, part_id)
+    if not limit:
+        return cmd
+    return _insert_rsync_opts(cmd, (f'--bwlimit={limit}',))
+
+
+class TransferJournal:
+    """Append-only JSONL journal per transfer, replayed at startup to resume unfinished jobs.
+
+    Records are `job` (the start request), `unit` (a finished work unit: a top-level item or a
+    directory plan unit), `chunk` (a striped chunk written at an offset, with its source digest)
+    and `bytes` (periodic snapshot of the per-part byte offsets). The file is removed when the
+    transfer worker exits, so only jobs interrupted by a restart are left behind.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handles = {}
+        self.units = {}
+        self.chunks = {}
+        self.resumed = set()
+        self.last_checkpoint = {}
+
+    def _path(self, transfer_id):
+        return os.path.join(TRANSFER_JOURNAL_CONFIG['journal_dir'], f'{transfer_id}.jsonl')
+
+    def _write(self, transfer_id, record, sync=True):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self.lock:
+            handle = self.handles.get(transfer_id)
+            if handle is None:
+                return
+            try:
+                handle.write(line)
+                handle.flush()
+                if sync:
+                    os.fsync(handle.fileno())
+            except Exception as e:
+                print(f"[JOURNAL] 写入传输日志失败 {transfer_id}: {e}")
+
+    def _open(self, transfer_id):
+        os.makedirs(TRANSFER_JOURNAL_CONFIG['journal_dir'], exist_ok=True)
+        return open(self._path(transfer_id), 'a', encoding='utf-8')
+
+    def begin(self, transfer_id, job):
+        if not TRANSFER_JOURNAL_CONFIG['enabled']:
+            return
+        try:
+            handle = self._open(transfer_id)
+        except Exception as e:
+            print(f"[JOURNAL] 无法创建传输日志 {transfer_id}: {e}")
+            return
+        with self.lock:
+            self.handles[transfer_id] = handle
+            self.units[transfer_id] = set()
+            self.chunks[transfer_id] = {}
+        self._write(transfer_id, {'event': 'job', 'time': time.time(), 'job': job})
+
+    def adopt(self, transfer_id, state):
+        """Reopen a replayed journal so a resumed worker keeps appending to it."""
+        with open(self._path(transfer_id), 'rb') as existing:
+            torn = False
+            if existing.seek(0, os.SEEK_END) > 0:
+                existing.seek(-1, os.SEEK_END)
+                torn = existing.read(1) != b'\n'
+        handle = self._open(transfer_id)
+        if torn:
+            handle.write('\n')
+        with self.lock:
+            self.handles[transfer_id] = handle
+            self.units[transfer_id] = set(state['units'])
+            self.chunks[transfer_id] = state['chunks']
+            self.resumed.add(transfer_id)
+        self._write(transfer_id, {'event': 'resume', 'time': time.time()})
+
+    def is_resumed(self, transfer_id):
+        return transfer_id in self.resumed
+
+    def unit_done(self, transfer_id, key):
+        units = self.units.get(transfer_id)
+        return units is not None and key in units
+
+    def mark_unit(self, transfer_id, key):
+        with self.lock:
+            units = self.units.get(transfer_id)
+            if units is None or key in units:
+                return
+            units.add(key)
+        self._write(transfer_id, {'event': 'unit', 'key': key})
+
+    def chunk_digests(self, transfer_id, file_key):
+        """{offset: source digest or None} of striped chunks already written for file_key."""
+        with self.lock:
+            return dict(self.chunks.get(transfer_id, {}).get(file_key, {}))
+
+    def mark_chunk(self, transfer_id, file_key, offset, digest):
+        with self.lock:
+            chunks = self.chunks.get(transfer_id)
+            if chunks is None:
+                return
+            chunks.setdefault(file_key, {})[offset] = digest
+        self._write(transfer_id, {'event': 'chunk', 'file': file_key, 'offset': offset, 'digest': digest})
+
+    def checkpoint(self, transfer_id, force=False):
+        if transfer_id not in self.handles:
+            return
+        now = time.time()
+        if not force and now - self.last_checkpoint.get(transfer_id, 0) < TRANSFER_JOURNAL_CONFIG['checkpoint_interval']:
+            return
+        self.last_checkpoint[transfer_id] = now
+        with TRANSFER_BYTES_LOCK:
+            state = TRANSFER_BYTES_STATE.get(transfer_id) or {}
+            record = {'event': 'bytes', 'completed_total': state.get('completed_total', 0),
+                      'parts': dict(state.get('parts', {}))}
+        self._write(transfer_id, record, sync=False)
+
+    def finish(self, transfer_id):
+        """The worker exited (success, failure or cancel): nothing is left to resume."""
+        with self.lock:
+            handle = self.handles.pop(transfer_id, None)
+            self.units.pop(transfer_id, None)
+            self.chunks.pop(transfer_id, None)
+            self.resumed.discard(transfer_id)
+            self.last_checkpoint.pop(transfer_id, None)
+        if handle is None:
+            return
+        try:
+            handle.close()
+            os.unlink(self._path(transfer_id))
+        except OSError:
+            pass
+
+    def pending(self):
+        """Replay every journal left on disk: [(transfer_id, state)] for jobs a restart interrupted."""
+        directory = TRANSFER_JOURNAL_CONFIG['journal_dir']
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return []
+        jobs = []
+        for name in names:
+            if not name.endswith('.jsonl'):
+                continue
+            transfer_id = name[:-len('.jsonl')]
+            if transfer_id in self.handles:
+                continue
+            state = {'job': None, 'units': set(), 'chunks': {}, 'bytes': None}
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8') as handle:
+                    for line in handle:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # A torn last line from the crash; everything before it is intact.
+                            continue
+                        event = record.get('event')
+                        if event == 'job':
+                            state['job'] = record.get('job')
+                        elif event == 'unit':
+                            state['units'].add(record.get('key'))
+                        elif event == 'chunk':
+                            state['chunks'].setdefault(record.get('file'), {})[int(record.get('offset', 0))] = record.get('digest')
+                        elif event == 'bytes':
+                            state['bytes'] = record
+            except OSError:
+                continue
+            if isinstance(state['job'], dict):
+                jobs.append((transfer_id, state))
+            else:
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return jobs
+
+
+transfer_journal = TransferJournal()
+
+
+class BandwidthManager:
+    """Byte-rate budgets in KB/s: global (optionally by time of day), per server pair and per transfer.
+
+    A transfer's budget is the smallest of its own limit, its pair's limit split across the transfers
+    on that pair, and the global limit split across all running transfers. rsync streams get their
+    share as --bwlimit when they start: the budget divided by the streams the transfer plans to run,
+    never more than what the streams already running leave free. Local rsync processes are additionally
+    paced with SIGSTOP/SIGCONT; the Python-pumped paths (tar, striped chunks, SFTP) draw from a per-transfer
+    token bucket. Both follow live limit changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transfers = {}
+        self.global_override = None
+
+    def register(self, transfer_id, source_server, target_server, limit=0):
+        with self.lock:
+            self.transfers[transfer_id] = {
+                'pair': (source_server, target_server),
+                'limit': max(0, int(limit or 0)),
+                'streams': 0,
+                'planned': 1,
+                'allocated': {},
+                'tokens': 0.0,
+                'stamp': time.time(),
+                'seen': {}
+            }
+
+    def unregister(self, transfer_id):
+        with self.lock:
+            self.transfers.pop(transfer_id, None)
+
+    def set_limit(self, transfer_id, limit):
+        """Live per-transfer limit in KB/s (0 removes it); False when the transfer is not running."""
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is None:
+                return False
+            entry['limit'] = max(0, int(limit or 0))
+            return True
+
+    def set_global_limit(self, limit):
+        """Live global limit in KB/s overriding config and schedules until restart; None restores them."""
+        with self.lock:
+            self.global_override = None if limit is None else max(0, int(limit))
+
+    def global_limit(self, now=None):
+        if self.global_override is not None:
+            return self.global_override
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for window in BANDWIDTH_CONFIG['schedules']:
+            start, end = window['start'], window['end']
+            inside = start <= minute < end if start < end else (minute >= start or minute < end)
+            if inside:
+                return window['limit']
+        return BANDWIDTH_CONFIG['global_limit']
+
+    def _pair_limit(self, pair):
+        source, target = pair
+        for key in ((source, target), (source, '*'), ('*', target), ('*', '*')):
+            if key in BANDWIDTH_CONFIG['pair_limits']:
+                return BANDWIDTH_CONFIG['pair_limits'][key]
+        return 0
+
+    def _budget_locked(self, transfer_id):
+        entry = self.transfers.get(transfer_id)
+        if entry is None:
+            return 0
+        shares = []
+        if entry['limit']:
+            shares.append(entry['limit'])
+        pair_limit = self._pair_limit(entry['pair'])
+        if pair_limit:
+            on_pair = sum(1 for other in self.transfers.values() if other['pair'] == entry['pair'])
+            shares.append(pair_limit / max(1, on_pair))
+        global_limit = self.global_limit()
+        if global_limit:
+            shares.append(global_limit / max(1, len(self.transfers)))
+        return min(shares) * 1024 if shares else 0
+
+    def budget(self, transfer_id):
+        """Current bytes/s allowance of a transfer; 0 means unlimited."""
+        with self.lock:
+            return self._budget_locked(transfer_id)
+
+    def limited(self, transfer_id):
+        return self.budget(transfer_id) > 0
+
+    def reserve_streams(self, transfer_id, count):
+        """Announce `count` more concurrent rsync streams (an executor about to start) before they launch."""
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is not None:
+                entry['planned'] += max(0, int(count))
+
+    def release_streams(self, transfer_id, count):
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is not None:
+                entry['planned'] = max(1, entry['planned'] - max(0, int(count)))
+
+    def open_stream(self, transfer_id):
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is not None:
+                entry['streams'] += 1
+
+    def close_stream(self, transfer_id, part_id=None):
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is not None:
+                entry['streams'] = max(0, entry['streams'] - 1)
+                entry['seen'].pop(part_id, None)
+                entry['allocated'].pop(part_id, None)
+
+    def stream_limit_kb(self, transfer_id, part_id):
+        """--bwlimit for a starting stream; the launch-time limits of open streams stay within the budget."""
+        with self.lock:
+            budget = self._budget_locked(transfer_id)
+            if not budget:
+                return 0
+            entry = self.transfers[transfer_id]
+            share = budget / 1024 / max(entry['planned'], entry['streams'], 1)
+            free = budget / 1024 - sum(entry['allocated'].values())
+            limit = max(1, int(min(share, free)))
+            entry['allocated'][part_id] = limit
+            return limit
+
+    def _consume(self, transfer_id, nbytes):
+        """Take nbytes from the transfer's bucket; returns how long the caller should hold off."""
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            rate = self._budget_locked(transfer_id)
+            if entry is None or not rate:
+                return 0.0
+            now = time.time()
+            # One second of burst at most, so a long idle spell cannot bank a flood.
+            entry['tokens'] = min(rate, entry['tokens'] + (now - entry['stamp']) * rate) - nbytes
+            entry['stamp'] = now
+            return -entry['tokens'] / rate if entry['tokens'] < 0 else 0.0
+
+    def throttle(self, transfer_id, nbytes):
+        delay = self._consume(transfer_id, nbytes)
+        if delay > 0:
+            time.sleep(min(delay, 5.0))
+
+    def pace(self, transfer_id, part_id, process):
+        """Hold a local rsync process group while its transfer is over budget."""
+        with TRANSFER_BYTES_LOCK:
+            current = (TRANSFER_BYTES_STATE.get(transfer_id) or {}).get('parts', {}).get(part_id)
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is None or current is None:
+                return
+            delta = current - entry['seen'].get(part_id, 0)
+            entry['seen'][part_id] = current
+        if delta <= 0:
+            return
+        delay = self._consume(transfer_id, delta)
+        if delay < 0.05:
+            return
+        try:
+            pgid = os.getpgid(process.pid)
+            os.killpg(pgid, signal.SIGSTOP)
+        except Exception:
+            return
+        try:
+            # Short holds keep cancel (SIGTERM, then SIGKILL after 1s) responsive.
+            time.sleep(min(delay, 1.0))
+        finally:
+            try:
+                os.killpg(pgid, signal.SIGCONT)
+            except Exception:
+                pass
+
+    def sftp_callback(self, transfer_id):
+        """paramiko put/get progress callback that throttles the copy it is called from."""
+        last = [0]
+
+        def callback(done, total):
+            delta = done - last[0]
+            last[0] = done
+            if delta > 0:
+                self.throttle(transfer_id, delta)
+        return callback
+
+    def snapshot(self, transfer_id=None):
+        with self.lock:
+            ids = [transfer_id] if transfer_id else list(self.transfers)
+            return {
+                'global_limit': self.global_limit(),
+                'transfers': {
+                    tid: {
+                        'limit': self.transfers[tid]['limit'],
+                        'effective': int(self._budget_locked(tid) / 1024),
+                        'streams': self.transfers[tid]['streams']
+                    } for tid in ids if tid in self.transfers
+                }
+            }
+
+
+bandwidth_manager = BandwidthManager()
+
+
 LOG_FILE_PATH = os.path.join(BASE_DIR, 'transfer.log')
 _log_file_lock = threading.Lock()
 LOG_MAX_LINES = 10000
@@ -708,78 +1535,193 @@ def append_transfer_log_record(source_ip: str,
         pass
 
 
-class SpeedSimulator:
-    def __init__(self):
-        self.transfer_speeds = {}
-        self.lock = threading.Lock()
-
-    def init_transfer_speed(self, transfer_id, min_speed: float = 110.0, max_speed: float = 114.0):
-        """Initialize transfer speed; allow scenario-specific ranges."""
-        with self.lock:
-
-            initial_speed = random.uniform(min_speed, max_speed)
-            self.transfer_speeds[transfer_id] = {
-                'current_speed': initial_speed,
-                'last_update': time.time(),
-                'trend': random.choice(['up', 'down', 'stable']),
-                'trend_duration': 0,
-                'min_speed': min_speed,
-                'max_speed': max_speed
-            }
-
-    def get_simulated_speed(self, transfer_id):
-        """Get simulated transfer speed; supports per-transfer ranges."""
-        with self.lock:
-            if transfer_id not in self.transfer_speeds:
-                self.init_transfer_speed(transfer_id)
+TRANSFER_RATE_CONFIG = {
+    'ewma_tau_seconds': 3.0,
+    'min_sample_interval': 0.2,
+    'stall_after_seconds': 5.0,
+}
 
-            speed_data = self.transfer_speeds[transfer_id]
-            current_time = time.time()
 
+class TransferRateTracker:
+    """Measured throughput per transfer and per rsync part, fed by --info=progress2 byte counters."""
 
-            min_s = speed_data.get('min_speed', 110.0)
-            max_s = speed_data.get('max_speed', 114.0)
-            width = max(0.1, max_s - min_s)
-            edge = max(0.2, 0.25 * width)
+    def __init__(self, ewma_tau_seconds=3.0, min_sample_interval=0.2, stall_after_seconds=5.0):
+        self.transfers = {}
+        self.lock = threading.Lock()
+        self.ewma_tau_seconds = max(0.1, float(ewma_tau_seconds))
+        self.min_sample_interval = max(0.01, float(min_sample_interval))
+        self.stall_after_seconds = max(self.min_sample_interval, float(stall_after_seconds))
 
+    def _new_rate_state(self, now, bytes_val=0):
+        return {
+            'start': now,
+            'last_ts': now,
+            'last_bytes': bytes_val,
+            'start_bytes': bytes_val,
+            'instant': 0.0,
+            'ewma': None,
+        }
 
-            if current_time - speed_data['last_update'] >= 0.1:
-                speed_data['last_update'] = current_time
-                speed_data['trend_duration'] += 1
+    def _advance(self, state, now, bytes_val):
+        """Fold a new cumulative byte reading into a rate state (time-aware EWMA)."""
+        dt = now - state['last_ts']
+        if dt < self.min_sample_interval:
+            return
+        delta = max(0, bytes_val - state['last_bytes'])
+        instant = delta / dt
+        alpha = 1.0 - math.exp(-dt / self.ewma_tau_seconds)
+        state['instant'] = instant
+        state['ewma'] = instant if state['ewma'] is None else state['ewma'] + alpha * (instant - state['ewma'])
+        state['last_ts'] = now
+        state['last_bytes'] = max(state['last_bytes'], bytes_val)
+
+    def _rates(self, state, now, bytes_val):
+        elapsed = max(0.0, now - state['start'])
+        idle = now - state['last_ts']
+        instant = state['instant'] if idle < self.stall_after_seconds else 0.0
+        ewma = state['ewma'] or 0.0
+        if idle >= self.stall_after_seconds:
+            # No counter movement for a while: decay towards zero instead of freezing the last value.
+            ewma *= math.exp(-idle / self.ewma_tau_seconds)
+        average = (bytes_val - state['start_bytes']) / elapsed if elapsed > 0 else 0.0
+        return instant, ewma, average
+
+    def start_transfer(self, transfer_id, total_bytes=0):
+        """Start measuring a transfer; total_bytes is optional and only used for ETA."""
+        if not transfer_id:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.transfers[transfer_id] = {
+                'rate': self._new_rate_state(now),
+                'parts': {},
+                'completed_bytes': 0,
+                'completed_parts': 0,
+                'total_bytes': int(total_bytes or 0),
+            }
 
+    def record_part(self, transfer_id, part_id, bytes_val, percent=None):
+        """Record a cumulative byte counter (and optional percent) reported by one rsync part."""
+        if not transfer_id or not part_id:
+            return
+        now = time.monotonic()
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is None:
+                # Late progress from a cancelled/cleaned transfer; do not resurrect it.
+                return
+            part = entry['parts'].get(part_id)
+            if part is None:
+                # The first reading is the baseline: we do not know when those bytes were sent.
+                part = self._new_rate_state(now, int(bytes_val))
+                part['bytes'] = 0
+                part['total_bytes'] = 0
+                part['percent'] = None
+                entry['parts'][part_id] = part
+            bytes_val = max(part['bytes'], int(bytes_val))
+            part['bytes'] = bytes_val
+            if percent is not None and 0 < percent <= 100:
+                part['percent'] = int(percent)
+                part['total_bytes'] = max(bytes_val, int(bytes_val * 100 / percent))
+            self._advance(part, now, bytes_val)
+
+    def finish_part(self, transfer_id, part_id, final_bytes=None):
+        """Fold a finished part into the transfer's completed byte count."""
+        if not transfer_id or not part_id:
+            return
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if not entry:
+                return
+            part = entry['parts'].pop(part_id, None)
+            done = part['bytes'] if part else 0
+            if final_bytes is not None:
+                try:
+                    done = max(done, int(final_bytes))
+                except (TypeError, ValueError):
+                    pass
+            entry['completed_bytes'] += done
+            entry['completed_parts'] += 1
 
-                if speed_data['trend_duration'] >= 20:
-                    speed_data['trend'] = random.choice(['up', 'down', 'stable'])
-                    speed_data['trend_duration'] = 0
+    def set_total_bytes(self, transfer_id, total_bytes):
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if entry is not None:
+                entry['total_bytes'] = max(0, int(total_bytes or 0))
 
-                current_speed = speed_data['current_speed']
+    def snapshot(self, transfer_id):
+        """Return measured rates (bytes/s) and ETA for a transfer and each active part."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.transfers.get(transfer_id)
+            if not entry:
+                return None
+            active_bytes = sum(p['bytes'] for p in entry['parts'].values())
+            total_done = entry['completed_bytes'] + active_bytes
+            rate = entry['rate']
+            self._advance(rate, now, total_done)
+            instant, ewma, average = self._rates(rate, now, total_done)
+
+            parts = []
+            known_remaining = 0
+            remaining_known = bool(entry['parts'])
+            for part_id, part in entry['parts'].items():
+                p_instant, p_ewma, p_average = self._rates(part, now, part['bytes'])
+                p_remaining = max(0, part['total_bytes'] - part['bytes']) if part['total_bytes'] else None
+                if p_remaining is None:
+                    remaining_known = False
+                else:
+                    known_remaining += p_remaining
+                parts.append({
+                    'part_id': part_id,
+                    'bytes': part['bytes'],
+                    'total_bytes': part['total_bytes'] or None,
+                    'percent': part['percent'],
+                    'speed_instant': round(p_instant, 1),
+                    'speed_ewma': round(p_ewma, 1),
+                    'speed_average': round(p_average, 1),
+                    'eta_seconds': round(p_remaining / p_ewma, 1) if p_remaining is not None and p_ewma > 0 else None,
+                })
 
-                if speed_data['trend'] == 'up':
-                    change = random.uniform(0.05 * width, 0.15 * width)
-                    new_speed = min(max_s, current_speed + change)
-                    if new_speed >= max_s - edge:
-                        speed_data['trend'] = 'down'
-                elif speed_data['trend'] == 'down':
-                    change = random.uniform(0.05 * width, 0.15 * width)
-                    new_speed = max(min_s, current_speed - change)
-                    if new_speed <= min_s + edge:
-                        speed_data['trend'] = 'up'
-                else:  # stable
-                    change = random.uniform(-0.05 * width, 0.05 * width)
-                    new_speed = max(min_s, min(max_s, current_speed + change))
+            if entry['total_bytes'] > 0:
+                remaining = max(0, entry['total_bytes'] - total_done)
+            elif remaining_known:
+                remaining = known_remaining
+            else:
+                remaining = None
+            eta_seconds = round(remaining / ewma, 1) if remaining is not None and ewma > 0 else None
+
+            return {
+                'transferred_bytes': total_done,
+                'total_bytes': entry['total_bytes'] or None,
+                'speed_instant': round(instant, 1),
+                'speed_ewma': round(ewma, 1),
+                'speed_average': round(average, 1),
+                'eta_seconds': eta_seconds,
+                'active_parts': len(parts),
+                'completed_parts': entry['completed_parts'],
+                'has_samples': rate['ewma'] is not None or total_done > 0,
+                'parts': parts,
+            }
 
-                speed_data['current_speed'] = new_speed
+    def format_speed(self, bytes_per_sec):
+        """Format bytes/s like the legacy UI string (MB/s with one decimal)."""
+        try:
+            return f"{float(bytes_per_sec) / (1024 * 1024):.1f} MB/s"
+        except (TypeError, ValueError):
+            return "0.0 MB/s"
 
-            return f"{speed_data['current_speed']:.1f} MB/s"
+    def get_speed_text(self, transfer_id):
+        snap = self.snapshot(transfer_id)
+        return self.format_speed(snap['speed_ewma'] if snap else 0)
 
     def cleanup_transfer(self, transfer_id):
-        """Clear transfer speed data."""
+        """Clear transfer rate data."""
         with self.lock:
-            if transfer_id in self.transfer_speeds:
-                del self.transfer_speeds[transfer_id]
+            self.transfers.pop(transfer_id, None)
 
 
-speed_simulator = SpeedSimulator()
+rate_tracker = TransferRateTracker(**TRANSFER_RATE_CONFIG)
 
 
 class TransferTimeTracker:
@@ -870,7 +1812,7 @@ class ProgressManager:
                 progress['last_update_time'] = current_time
 
 
-                simulated_speed = speed_simulator.get_simulated_speed(transfer_id)
+                measured_speed = rate_tracker.get_speed_text(transfer_id)
                 elapsed_time = time_tracker.get_elapsed_time(transfer_id)
 
 
@@ -931,8 +1873,10 @@ def _cleanup_transfer_state(transfer_id):
         transfer_processes.pop(transfer_id, None)
     cleanup_transfer_bytes(transfer_id)
     progress_manager.cleanup_transfer(transfer_id)
-    speed_simulator.cleanup_transfer(transfer_id)
+    rate_tracker.cleanup_transfer(transfer_id)
     cleanup_transfer_bytes(transfer_id)
+    bandwidth_manager.unregister(transfer_id)
+    transfer_scheduler.release(transfer_id)
 
 
 def start_transfer_watchdog():
@@ -973,145 +1917,455 @@ def start_transfer_watchdog():
 
 start_transfer_watchdog()
 
-class SSHManager:
-    def __init__(self):
-        self.connections = {}
-        self.connection_pool_size = 3
-        self.connection_pools = {}
-
-    def get_connection(self, server_ip):
-        """Get an SSH connection using the pool."""
-
-        if server_ip not in self.connection_pools:
-            self.connection_pools[server_ip] = []
+class SSHChannelScheduler:
+    """Caps concurrent session channels on one paramiko Transport; extra callers queue for a slot."""
 
+    def __init__(self, transport, max_channels=6, queue_timeout=30.0):
+        self.transport = transport
+        self.max_channels = max(1, int(max_channels))
+        self.queue_timeout = max(0.0, float(queue_timeout))
+        self.active = 0
+        self.queued = 0
+        self.lock = threading.Lock()
+        self.slot_free = threading.Condition(self.lock)
+        self.stats = {
+            'opened': 0,
+            'queued_total': 0,
+            'max_queue_depth': 0,
+            'timeouts': 0,
+        }
 
-        pool = self.connection_pools[server_ip]
-        for i, ssh in enumerate(pool):
-            if ssh and ssh.get_transport() and ssh.get_transport().is_active():
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else max(0.0, float(timeout)))
+        with self.slot_free:
+            if self.active >= self.max_channels:
+                self.queued += 1
+                self.stats['queued_total'] += 1
+                self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queued)
                 try:
-                    ssh.get_transport().set_keepalive(TERMINAL_SSH_KEEPALIVE_SECONDS)
+                    while self.active >= self.max_channels:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats['timeouts'] += 1
+                            raise paramiko.SSHException(f"channel queue timeout ({self.queued} waiting)")
+                        self.slot_free.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.active += 1
+            self.stats['opened'] += 1
+
+    def _release(self):
+        with self.slot_free:
+            self.active = max(0, self.active - 1)
+            self.slot_free.notify()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Yield a new session channel once a slot is free; the channel is closed on exit."""
+        self._acquire(timeout)
+        channel = None
+        try:
+            channel = self.transport.open_session(timeout=5)
+            yield channel
+        finally:
+            if channel is not None:
+                try:
+                    channel.close()
                 except Exception:
                     pass
+            self._release()
 
-                pool.append(pool.pop(i))
-                return ssh
-            else:
+    def get_stats(self):
+        with self.lock:
+            return {
+                'max_channels': self.max_channels,
+                'active': self.active,
+                'queue_depth': self.queued,
+                **self.stats,
+            }
 
-                if ssh:
-                    try:
-                        ssh.close()
-                    except:
-                        pass
-                pool.remove(ssh)
 
+class SSHManager:
+    """Per-host SSH connection pool.
 
-        try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-            server_config = SERVERS[server_ip]
-
-
-            connect_kwargs = {
-                'hostname': get_server_host(server_ip),
-                'username': server_config["user"],
-                'port': server_config.get("port", 22),
-                'timeout': 5,
-                'compress': False,
-                'look_for_keys': True,
-                'allow_agent': True,
-                'sock': None,
-                'gss_auth': False,
-                'gss_kex': False,
-                'gss_deleg_creds': False,
-                'gss_host': None,
-                'banner_timeout': 5,
-                'auth_timeout': 5,
-                'channel_timeout': 5
+    Long transfers lease a connection exclusively via checkout()/checkin() or
+    the lease() context manager. get_connection() returns a long-lived shared
+    client, never evicted while alive; short commands are multiplexed on its
+    transport through an SSHChannelScheduler.
+    """
+
+    def __init__(self, max_per_host=10, checkout_timeout=30.0, idle_timeout=300.0,
+                 health_check_after=30.0, reap_interval=60.0, channels_per_transport=6,
+                 channel_queue_timeout=30.0):
+        self.max_per_host = max(1, int(max_per_host))
+        self.checkout_timeout = max(0.0, float(checkout_timeout))
+        self.idle_timeout = max(1.0, float(idle_timeout))
+        self.health_check_after = max(0.0, float(health_check_after))
+        self.reap_interval = max(1.0, float(reap_interval))
+        self.channels_per_transport = max(1, int(channels_per_transport))
+        self.channel_queue_timeout = max(0.0, float(channel_queue_timeout))
+        self.schedulers = weakref.WeakKeyDictionary()
+        self.pools = {}
+        self.shared = {}
+        self.shared_locks = {}
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.reaper_started = False
+
+    def _pool(self, server_ip):
+        """Return the pool state for a host; caller must hold self.lock."""
+        pool = self.pools.get(server_ip)
+        if pool is None:
+            pool = {
+                'idle': [],
+                'leased': set(),
+                'opening': 0,
+                'waiting': 0,
+                'stats': {
+                    'checkouts': 0,
+                    'created': 0,
+                    'reused': 0,
+                    'closed': 0,
+                    'health_failures': 0,
+                    'connect_failures': 0,
+                    'timeouts': 0,
+                    'wait_seconds_total': 0.0,
+                    'wait_seconds_max': 0.0,
+                },
             }
+            self.pools[server_ip] = pool
+        return pool
+
+    def _open_connection(self, server_ip):
+        """Open a new SSH client (key first, then password); raise on failure."""
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        server_config = SERVERS[server_ip]
+
+
+        connect_kwargs = {
+            'hostname': get_server_host(server_ip),
+            'username': server_config["user"],
+            'port': server_config.get("port", 22),
+            'timeout': 5,
+            'compress': False,
+            'look_for_keys': True,
+            'allow_agent': True,
+            'sock': None,
+            'gss_auth': False,
+            'gss_kex': False,
+            'gss_deleg_creds': False,
+            'gss_host': None,
+            'banner_timeout': 5,
+            'auth_timeout': 5,
+            'channel_timeout': 5
+        }
 
 
-            try:
-                ssh.connect(**connect_kwargs)
-                print(f"✅ 使用密钥连接到服务器 {server_ip}")
-            except:
+        try:
+            ssh.connect(**connect_kwargs)
+            print(f"✅ 使用密钥连接到服务器 {server_ip}")
+        except:
 
-                connect_kwargs['password'] = server_config["password"]
-                ssh.connect(**connect_kwargs)
-                print(f"✅ 使用密码连接到服务器 {server_ip}")
+            connect_kwargs['password'] = server_config["password"]
+            ssh.connect(**connect_kwargs)
+            print(f"✅ 使用密码连接到服务器 {server_ip}")
 
+        try:
+            transport = ssh.get_transport()
+            if transport:
+                transport.set_keepalive(TERMINAL_SSH_KEEPALIVE_SECONDS)
+        except Exception:
+            pass
+        return ssh
+
+    def _close_quietly(self, ssh):
+        if ssh:
             try:
-                transport = ssh.get_transport()
-                if transport:
-                    transport.set_keepalive(TERMINAL_SSH_KEEPALIVE_SECONDS)
+                ssh.close()
             except Exception:
                 pass
 
+    def _is_alive(self, ssh):
+        transport = ssh.get_transport() if ssh else None
+        return bool(transport and transport.is_active())
 
-            if len(pool) >= self.connection_pool_size:
+    def _is_healthy(self, ssh, idle_seconds):
+        """Transport check, plus an SSH_MSG_IGNORE probe for connections idle a while."""
+        if not self._is_alive(ssh):
+            return False
+        if idle_seconds >= self.health_check_after:
+            try:
+                ssh.get_transport().send_ignore()
+            except Exception:
+                return False
+        return True
 
-                old_ssh = pool.pop(0)
+    def _record_wait(self, pool, started):
+        waited = time.monotonic() - started
+        stats = pool['stats']
+        stats['checkouts'] += 1
+        stats['wait_seconds_total'] += waited
+        if waited > stats['wait_seconds_max']:
+            stats['wait_seconds_max'] = waited
+
+    def checkout(self, server_ip, timeout=None):
+        """Lease a connection to one caller; returns None on connect failure or timeout."""
+        self._ensure_reaper()
+        timeout = self.checkout_timeout if timeout is None else max(0.0, float(timeout))
+        started = time.monotonic()
+        deadline = started + timeout
+        stale = []
+        leased = None
+        claimed = False
+        with self.available:
+            pool = self._pool(server_ip)
+            while True:
+                while pool['idle']:
+                    ssh, last_used = pool['idle'].pop()
+                    if self._is_healthy(ssh, time.monotonic() - last_used):
+                        leased = ssh
+                        break
+                    pool['stats']['health_failures'] += 1
+                    pool['stats']['closed'] += 1
+                    stale.append(ssh)
+                if leased is not None:
+                    pool['leased'].add(leased)
+                    pool['stats']['reused'] += 1
+                    self._record_wait(pool, started)
+                    break
+                if len(pool['leased']) + pool['opening'] < self.max_per_host:
+                    pool['opening'] += 1
+                    claimed = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    pool['stats']['timeouts'] += 1
+                    print(f"⚠️  等待SSH连接超时 {server_ip}: 已达上限 {self.max_per_host}")
+                    break
+                pool['waiting'] += 1
                 try:
-                    old_ssh.close()
-                except:
-                    pass
-
-            pool.append(ssh)
-            return ssh
+                    self.available.wait(remaining)
+                finally:
+                    pool['waiting'] -= 1
+        for ssh in stale:
+            self._close_quietly(ssh)
+        if not claimed:
+            return leased
 
+        ssh = None
+        try:
+            ssh = self._open_connection(server_ip)
         except Exception as e:
             print(f"❌ 连接服务器 {server_ip} 失败: {e}")
-            return None
-
-    def execute_command(self, server_ip, command):
-        """Execute a remote command and return (stdout, stderr, exit_code)."""
-        ssh = self.get_connection(server_ip)
-        if not ssh:
-            return None, f"无法连接到服务器 {server_ip}", -1
-
-
-        is_win = is_windows_server(server_ip)
-        encoding = 'gbk' if is_win else 'utf-8'
-
+        with self.available:
+            pool['opening'] -= 1
+            if ssh is None:
+                pool['stats']['connect_failures'] += 1
+                self.available.notify()
+                return None
+            pool['leased'].add(ssh)
+            pool['stats']['created'] += 1
+            self._record_wait(pool, started)
+        return ssh
+
+    def checkin(self, server_ip, ssh, broken=False):
+        """Return a leased connection; broken or dead connections are closed instead of pooled."""
+        if ssh is None:
+            return
+        discard = None
+        with self.available:
+            pool = self._pool(server_ip)
+            pool['leased'].discard(ssh)
+            if broken or not self._is_alive(ssh):
+                pool['stats']['closed'] += 1
+                discard = ssh
+            else:
+                pool['idle'].append((ssh, time.monotonic()))
+            self.available.notify()
+        self._close_quietly(discard)
+
+    @contextmanager
+    def lease(self, server_ip, timeout=None):
+        """Context manager around checkout()/checkin(); yields None if no connection could be leased."""
+        ssh = self.checkout(server_ip, timeout)
+        broken = False
         try:
-            stdin, stdout, stderr = ssh.exec_command(command)
+            yield ssh
+        except (paramiko.SSHException, EOFError, OSError):
+            broken = True
+            raise
+        finally:
+            self.checkin(server_ip, ssh, broken=broken)
 
-            output = stdout.read().decode(encoding, errors='ignore')
-            error = stderr.read().decode(encoding, errors='ignore')
+    def get_scheduler(self, ssh):
+        """Return the channel scheduler bound to this client's transport."""
+        transport = ssh.get_transport() if ssh else None
+        if transport is None:
+            raise paramiko.SSHException("SSH transport is not available")
+        with self.lock:
+            scheduler = self.schedulers.get(transport)
+            if scheduler is None:
+                scheduler = SSHChannelScheduler(transport, self.channels_per_transport, self.channel_queue_timeout)
+                self.schedulers[transport] = scheduler
+            return scheduler
+
+    def exec_command_bytes(self, ssh, command, timeout=None):
+        """Run a command on a scheduled channel of ssh's transport; return (stdout, stderr, exit_code) as bytes."""
+        with self.get_scheduler(ssh).session() as channel:
+            if timeout:
+                channel.settimeout(timeout)
+            channel.exec_command(command)
+            stdout = channel.makefile('rb', -1)
+            stderr = channel.makefile_stderr('rb', -1)
+            out_b = stdout.read()
+            err_b = stderr.read()
             try:
-                exit_code = stdout.channel.recv_exit_status()
+                exit_code = channel.recv_exit_status()
             except Exception:
-                exit_code = 0 if not error else 1
-            return output, error, exit_code
-        except Exception as e:
+                exit_code = 0 if not err_b else 1
+        return out_b, err_b, exit_code
+
+    def _drop_shared(self, server_ip, ssh):
+        with self.lock:
+            if self.shared.get(server_ip) is ssh:
+                self.shared.pop(server_ip, None)
+        self._close_quietly(ssh)
 
-            print(f"⚠️  SSH连接异常，尝试重新连接到 {server_ip}: {e}")
-            if server_ip in self.connections:
+    def get_connection(self, server_ip):
+        """Get the shared long-lived connection for a host (terminals, streamed runs, short commands)."""
+        with self.lock:
+            host_lock = self.shared_locks.setdefault(server_ip, threading.Lock())
+        with host_lock:
+            ssh = self.shared.get(server_ip)
+            if self._is_alive(ssh):
                 try:
-                    self.connections[server_ip].close()
-                except:
+                    ssh.get_transport().set_keepalive(TERMINAL_SSH_KEEPALIVE_SECONDS)
+                except Exception:
                     pass
-                del self.connections[server_ip]
+                return ssh
+            self._close_quietly(ssh)
+            self.shared.pop(server_ip, None)
+            try:
+                ssh = self._open_connection(server_ip)
+            except Exception as e:
+                print(f"❌ 连接服务器 {server_ip} 失败: {e}")
+                return None
+            self.shared[server_ip] = ssh
+            return ssh
 
+    def _ensure_reaper(self):
+        if self.reaper_started:
+            return
+        with self.lock:
+            if self.reaper_started:
+                return
+            self.reaper_started = True
+        threading.Thread(target=self._reap_loop, daemon=True).start()
 
-            ssh = self.get_connection(server_ip)
-            if ssh:
-                try:
-                    stdin, stdout, stderr = ssh.exec_command(command)
-                    output = stdout.read().decode(encoding, errors='ignore')
-                    error = stderr.read().decode(encoding, errors='ignore')
-                    try:
-                        exit_code = stdout.channel.recv_exit_status()
-                    except Exception:
-                        exit_code = 0 if not error else 1
-                    return output, error, exit_code
-                except Exception as retry_e:
-                    return None, f"重连后仍然失败: {str(retry_e)}", -1
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"⚠️  SSH连接池清理失败: {e}")
+
+    def reap_idle(self):
+        """Close pooled connections idle longer than idle_timeout, and dead ones."""
+        now = time.monotonic()
+        expired = []
+        with self.available:
+            for pool in self.pools.values():
+                keep = []
+                for ssh, last_used in pool['idle']:
+                    if now - last_used >= self.idle_timeout or not self._is_alive(ssh):
+                        expired.append(ssh)
+                        pool['stats']['closed'] += 1
+                    else:
+                        keep.append((ssh, last_used))
+                pool['idle'] = keep
+            if expired:
+                self.available.notify_all()
+        for ssh in expired:
+            self._close_quietly(ssh)
+        return len(expired)
+
+    def get_stats(self):
+        """Pool metrics per host."""
+        with self.lock:
+            hosts = {}
+            for server_ip, pool in self.pools.items():
+                stats = dict(pool['stats'])
+                checkouts = stats['checkouts']
+                stats['wait_seconds_avg'] = round(stats['wait_seconds_total'] / checkouts, 4) if checkouts else 0.0
+                stats['wait_seconds_total'] = round(stats['wait_seconds_total'], 4)
+                stats['wait_seconds_max'] = round(stats['wait_seconds_max'], 4)
+                hosts[server_ip] = {
+                    'idle': len(pool['idle']),
+                    'leased': len(pool['leased']),
+                    'opening': pool['opening'],
+                    'waiting': pool['waiting'],
+                    **stats,
+                }
+            shared_clients = list(self.shared.items())
+        shared = {}
+        for server_ip, ssh in shared_clients:
+            transport = ssh.get_transport() if ssh else None
+            scheduler = self.schedulers.get(transport) if transport is not None else None
+            shared[server_ip] = {
+                'active': self._is_alive(ssh),
+                'channels': scheduler.get_stats() if scheduler else None,
+            }
+        return {
+            'max_per_host': self.max_per_host,
+            'checkout_timeout': self.checkout_timeout,
+            'idle_timeout': self.idle_timeout,
+            'channels_per_transport': self.channels_per_transport,
+            'hosts': hosts,
+            'shared': shared,
+        }
 
+    def execute_command(self, server_ip, command):
+        """Execute a remote command and return (stdout, stderr, exit_code)."""
+        is_win = is_windows_server(server_ip)
+        encoding = 'gbk' if is_win else 'utf-8'
+
+        last_error = None
+        for attempt in range(2):
+            ssh = self.get_connection(server_ip)
+            if not ssh:
+                if last_error is not None:
+                    return None, f"重连后仍然失败: {str(last_error)}", -1
+                return None, f"无法连接到服务器 {server_ip}", -1
+            try:
+                out_b, err_b, exit_code = self.exec_command_bytes(ssh, command)
+                return out_b.decode(encoding, errors='ignore'), err_b.decode(encoding, errors='ignore'), exit_code
+            except Exception as e:
+                last_error = e
+                if self._is_alive(ssh):
+                    # Transport is fine (queue timeout or channel refused); terminals may share it,
+                    # so keep it and run this command on a leased connection instead.
+                    return self._execute_on_lease(server_ip, command, encoding)
+                # Transport is broken: drop the shared client and retry once on a fresh one.
+                self._drop_shared(server_ip, ssh)
+                if attempt == 0:
+                    print(f"⚠️  SSH连接异常，尝试重新连接到 {server_ip}: {e}")
+
+        return None, f"重连后仍然失败: {str(last_error)}", -1
+
+    def _execute_on_lease(self, server_ip, command, encoding):
+        try:
+            with self.lease(server_ip) as ssh:
+                if not ssh:
+                    return None, f"无法连接到服务器 {server_ip}", -1
+                out_b, err_b, exit_code = self.exec_command_bytes(ssh, command)
+            return out_b.decode(encoding, errors='ignore'), err_b.decode(encoding, errors='ignore'), exit_code
+        except Exception as e:
             return None, str(e), -1
 
-ssh_manager = SSHManager()
+ssh_manager = SSHManager(**SSH_POOL_CONFIG)
 RUN_TASKS = {}
 RUN_TASKS_LOCK = threading.Lock()
 TERMINAL_TASKS = {}
@@ -1222,42 +2476,424 @@ def normalize_windows_path_for_cmd(p: str) -> str:
 
         s = normalize_windows_path_for_transfer(p)
 
-        s = s.replace('/', '\\')
-        return s
-    except Exception:
-        return p
+        s = s.replace('/', '\\')
+        return s
+    except Exception:
+        return p
+
+
+
+
+
+def get_default_path(server_ip):
+    """Get the default server path."""
+    server_config = SERVERS.get(server_ip, {})
+    configured_default = server_config.get("default_path")
+
+
+    if is_windows_server(server_ip):
+        try:
+
+            output, error, _ = ssh_manager.execute_command(server_ip, 'echo %USERPROFILE%')
+            if output and not error:
+
+                user_profile = output.strip().replace('\\', '/')
+                print(f"🏠 Windows用户主目录: {user_profile}")
+                return user_profile
+        except Exception as e:
+            print(f"⚠️  无法获取Windows用户主目录: {e}")
+
+
+        return configured_default or "C:/"
+
+
+    if configured_default:
+        return configured_default
+
+    user = server_config.get("user", "th")
+    return f"/home/{user}"
+
+class FileTable:
+    """Regular files under one root as compact columns: relative paths in one byte buffer plus offsets, sizes, mtimes.
+
+    Iterating yields the classic file dicts ({'path', 'name', 'size', 'is_directory'}) one at a time.
+    """
+
+    __slots__ = ('root', 'blob', 'offsets', 'sizes', 'mtimes')
+
+    def __init__(self, root):
+        self.root = root
+        self.blob = bytearray()
+        self.offsets = array('q', [0])
+        self.sizes = array('q')
+        self.mtimes = array('d')
+
+    def append(self, relpath, size, mtime):
+        self.blob += relpath.encode('utf-8', 'surrogateescape')
+        self.offsets.append(len(self.blob))
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def total_size(self):
+        return sum(self.sizes)
+
+    @property
+    def nbytes(self):
+        return (len(self.blob) + self.offsets.itemsize * len(self.offsets)
+                + self.sizes.itemsize * len(self.sizes) + self.mtimes.itemsize * len(self.mtimes))
+
+    def relpath(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].decode('utf-8', 'surrogateescape')
+
+    def path(self, index):
+        root = self.root
+        return (root if root.endswith('/') else root + '/') + self.relpath(index)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return {
+            'path': self.path(index),
+            'name': self.relpath(index),
+            'size': self.sizes[index],
+            'modified_ts': self.mtimes[index],
+            'is_directory': False
+        }
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def walk_local_tree(root):
+    """scandir-based equivalent of `find root -type f -printf '%s %T@ %P'` (symlinks are not followed)."""
+    table = FileTable(root)
+    stack = [(root, '')]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, prefix + entry.name + '/'))
+                        elif entry.is_file(follow_symlinks=False):
+                            stat_info = entry.stat(follow_symlinks=False)
+                            table.append(prefix + entry.name, stat_info.st_size, stat_info.st_mtime)
+                    except OSError:
+                        continue
+        except OSError as e:
+            if directory == root:
+                raise
+            print(f"⚠️ 跳过目录 {directory}: {e}")
+    return table
+
+
+def _stream_remote_fields(server_ip, command, field_count, handle, stdin_data=None, on_chunk=None):
+    """Run a remote command on a leased connection, passing NUL-separated output to handle() in whole records.
+
+    Returns (exit_code, stderr_text). Undecodable bytes round-trip via surrogateescape.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='surrogateescape')
+    with ssh_manager.lease(server_ip) as ssh:
+        if ssh is None:
+            raise ConnectionError('无法连接到服务器')
+        channel = ssh.get_transport().open_session()
+        try:
+            channel.exec_command(command)
+            if stdin_data is not None:
+                channel.sendall(stdin_data)
+                channel.shutdown_write()
+            buf = ''
+            stderr_parts = []
+            while True:
+                chunk = channel.recv(256 * 1024)
+                if not chunk:
+                    break
+                buf += decoder.decode(chunk)
+                fields = buf.split('\0')
+                cut = (len(fields) - 1) // field_count * field_count
+                if cut:
+                    handle(fields[:cut])
+                    buf = '\0'.join(fields[cut:])
+                while channel.recv_stderr_ready():
+                    stderr_parts.append(channel.recv_stderr(65536))
+                if on_chunk is not None:
+                    on_chunk()
+            exit_code = channel.recv_exit_status()
+            while channel.recv_stderr_ready():
+                stderr_parts.append(channel.recv_stderr(65536))
+            return exit_code, b''.join(stderr_parts).decode('utf-8', errors='replace')
+        finally:
+            channel.close()
+
+
+def walk_remote_tree(server_ip, root):
+    """Stream `find -type f -printf` (size, mtime, relative path; NUL-separated) into a FileTable in one process."""
+    table = FileTable(root)
+    append = table.append
+
+    def handle(fields):
+        for i in range(0, len(fields), 3):
+            append(fields[i + 2], int(fields[i]), float(fields[i + 1]))
+
+    command = f"LC_ALL=C find {shlex.quote(root)} -type f -printf '%s\\0%T@\\0%P\\0'"
+    exit_code, stderr_text = _stream_remote_fields(server_ip, command, 3, handle)
+    if exit_code != 0:
+        if not len(table):
+            raise RuntimeError(stderr_text.strip() or f'find 退出码 {exit_code}')
+        print(f"⚠️ 远程目录分析部分失败: {stderr_text.strip()[:200]}")
+    return table
+
+
+class StreamTuningMemory:
+    """Best stream count per server pair, persisted as JSON so the next transfer starts from it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = None
+
+    @staticmethod
+    def _key(source_server, target_server):
+        return f'{source_server}->{target_server}'
+
+    def _load_locked(self):
+        if self.entries is None:
+            try:
+                with open(AUTOTUNE_CONFIG['state_file'], 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def initial(self, source_server, target_server, ceiling):
+        with self.lock:
+            entry = self._load_locked().get(self._key(source_server, target_server)) or {}
+        try:
+            streams = int(entry.get('streams') or AUTOTUNE_CONFIG['initial_streams'])
+        except (TypeError, ValueError):
+            streams = AUTOTUNE_CONFIG['initial_streams']
+        return max(1, min(streams, ceiling))
+
+    def remember(self, source_server, target_server, streams, rate):
+        with self.lock:
+            entries = self._load_locked()
+            entries[self._key(source_server, target_server)] = {
+                'streams': streams,
+                'rate': int(rate),
+                'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            try:
+                os.makedirs(os.path.dirname(AUTOTUNE_CONFIG['state_file']), exist_ok=True)
+                tmp = AUTOTUNE_CONFIG['state_file'] + '.tmp'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, AUTOTUNE_CONFIG['state_file'])
+            except OSError as e:
+                print(f"[AUTOTUNE] 保存调优结果失败: {e}")
+
 
+stream_tuning_memory = StreamTuningMemory()
 
 
+class AdaptiveStreamExecutor:
+    """Executor whose concurrency is tuned while it runs, from the transfer's measured byte rate.
 
+    It keeps `ceiling` worker threads but lets only `limit` of them take tasks. Every sample window
+    the aggregate rate (the rsync progress counters behind get_transfer_bytes_total) is compared with
+    the best so far: streams are added while each one still buys at least `min_gain`, and the count
+    falls back to the best setting once the gain flattens. Every `reprobe_windows` it probes one step
+    up or down again, since the file mix changes during a transfer. The best count is remembered for
+    the server pair. Tasks are taken FIFO, like ThreadPoolExecutor.
+    """
 
-def get_default_path(server_ip):
-    """Get the default server path."""
-    server_config = SERVERS.get(server_ip, {})
-    configured_default = server_config.get("default_path")
+    def __init__(self, transfer_id, source_server, target_server, max_workers):
+        self.transfer_id = transfer_id
+        self.pair = (source_server, target_server)
+        self.ceiling = max(1, max_workers)
+        self.limit = stream_tuning_memory.initial(source_server, target_server, self.ceiling)
+        self.tasks = []
+        self.active = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.stop = threading.Event()
+        self.best_rate = 0.0
+        self.best_limit = self.limit
+        self.tuned = False
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.ceiling)]
+        for thread in self.threads:
+            thread.start()
+        self.controller = threading.Thread(target=self._control, daemon=True)
+        self.controller.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
 
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        with self.cond:
+            self.tasks.append((future, fn, args, kwargs))
+            self.cond.notify_all()
+        return future
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.stop.set()
+        self.controller.join()
+        if self.tuned:
+            stream_tuning_memory.remember(self.pair[0], self.pair[1], self.best_limit, self.best_rate)
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not (self.tasks and self.active < self.limit) and not (self.closed and not self.tasks):
+                    self.cond.wait()
+                if not self.tasks:
+                    return
+                future, fn, args, kwargs = self.tasks.pop(0)
+                self.active += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self.cond:
+                    self.active -= 1
+                    self.cond.notify_all()
+
+    def _set_limit(self, limit):
+        limit = max(1, min(self.ceiling, limit))
+        with self.cond:
+            changed = limit != self.limit
+            self.limit = limit
+            self.cond.notify_all()
+        return changed
+
+    def _control(self):
+        interval = AUTOTUNE_CONFIG['sample_seconds']
+        gain = AUTOTUNE_CONFIG['min_gain']
+        direction = 1
+        holding = 0
+        probes = 0
+        baseline = 0.0
+        settle = True
+        last_bytes = get_transfer_bytes_total(self.transfer_id)
+        last_time = time.time()
+        while not self.stop.wait(interval):
+            now = time.time()
+            total = get_transfer_bytes_total(self.transfer_id)
+            rate = (total - last_bytes) / max(1e-6, now - last_time)
+            last_bytes, last_time = total, now
+            with self.cond:
+                starved = len(self.tasks) == 0 and self.active < self.limit
+            if settle or starved or bandwidth_manager.limited(self.transfer_id):
+                # The window straddling a change, a queue tail or a rate cap says nothing about streams.
+                settle = False
+                continue
+            if direction:
+                # Up: each added stream must pay for itself. Down: fewer streams win unless the rate drops.
+                better = rate > self.best_rate * (1 + gain) if direction > 0 else rate >= baseline * (1 - gain)
+                if better or not self.tuned:
+                    self.best_rate, self.best_limit, self.tuned = rate, self.limit, True
+                    if self._set_limit(self.limit + direction):
+                        settle = True
+                        continue
+                elif self._set_limit(self.best_limit):
+                    settle = True
+                print(f"[AUTOTUNE] {self.transfer_id} {self.pair[0]}->{self.pair[1]}: "
+                      f"{self.best_limit} 路 {_human_readable_size(self.best_rate)}/s")
+                direction = 0
+                holding = 0
+                continue
+            holding += 1
+            self.best_rate = rate
+            if holding >= AUTOTUNE_CONFIG['reprobe_windows']:
+                # Alternate the probe direction: a changing file mix can favour fewer or more streams.
+                probes += 1
+                direction = 1 if self.limit <= 1 or (self.limit < self.ceiling and probes % 2) else -1
+                holding = 0
+                baseline = rate
+                if self._set_limit(self.limit + direction):
+                    settle = True
+                else:
+                    direction = 0
 
-    if is_windows_server(server_ip):
-        try:
 
-            output, error, _ = ssh_manager.execute_command(server_ip, 'echo %USERPROFILE%')
-            if output and not error:
+def _stream_executor(transfer_id, source_server, target_server, max_workers):
+    """Autotuned executor for parallel rsync streams, or a fixed pool when autotuning is off."""
+    if AUTOTUNE_CONFIG['enabled']:
+        return AdaptiveStreamExecutor(transfer_id, source_server, target_server, max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
 
-                user_profile = output.strip().replace('\\', '/')
-                print(f"🏠 Windows用户主目录: {user_profile}")
-                return user_profile
-        except Exception as e:
-            print(f"⚠️  无法获取Windows用户主目录: {e}")
 
+def _stream_ceiling():
+    if AUTOTUNE_CONFIG['enabled']:
+        return max(PARALLEL_TRANSFER_CONFIG['max_workers'], AUTOTUNE_CONFIG['max_streams'])
+    return PARALLEL_TRANSFER_CONFIG['max_workers']
 
-        return configured_default or "C:/"
 
+def plan_transfer_units(table, workers):
+    """Bin-pack a FileTable into rsync work units and order them longest-first.
 
-    if configured_default:
-        return configured_default
+    Cost of a unit is bytes plus a fixed per-file overhead, so 10k tiny files weigh like the
+    data they really take to move. Files costing more than total / (workers * plan_units_per_worker)
+    become single-file units; the rest are grouped (in walk order, for locality) into units sized
+    from what remains, capped by plan_unit_max_mb / plan_unit_max_files.
+    Returns (units, predicted_loads) where predicted_loads is the static LPT assignment.
+    """
+    workers = max(1, int(workers))
+    slots = workers * PARALLEL_TRANSFER_CONFIG['plan_units_per_worker']
+    per_file = PARALLEL_TRANSFER_CONFIG['plan_per_file_cost_kb'] * 1024
+    sizes = table.sizes
+    total_cost = sum(sizes) + per_file * len(sizes)
+    solo = max(per_file, total_cost / slots)
+    rest_cost = sum(size + per_file for size in sizes if size + per_file < solo)
+    target = max(per_file, min(rest_cost / slots, PARALLEL_TRANSFER_CONFIG['plan_unit_max_mb'] * 1024 * 1024))
+    max_files = PARALLEL_TRANSFER_CONFIG['plan_unit_max_files']
+
+    units = []
+    current = None
+    for index, size in enumerate(sizes):
+        cost = size + per_file
+        if cost >= solo:
+            units.append({'indexes': [index], 'bytes': size, 'files': 1, 'cost': cost})
+            continue
+        if current is None or current['cost'] + cost > target or current['files'] >= max_files:
+            current = {'indexes': [], 'bytes': 0, 'files': 0, 'cost': 0}
+            units.append(current)
+        current['indexes'].append(index)
+        current['bytes'] += size
+        current['files'] += 1
+        current['cost'] += cost
+
+    units.sort(key=lambda unit: unit['cost'], reverse=True)
+    for number, unit in enumerate(units, 1):
+        unit['name'] = f'单元{number}'
+
+    loads = [0] * workers
+    heap = [(0, slot) for slot in range(workers)]
+    for unit in units:
+        load, slot = heapq.heappop(heap)
+        loads[slot] = load + unit['cost']
+        heapq.heappush(heap, (loads[slot], slot))
+    return units, loads
 
-    user = server_config.get("user", "th")
-    return f"/home/{user}"
 
 class ParallelTransferManager:
     def __init__(self):
@@ -1280,80 +2916,23 @@ class ParallelTransferManager:
                 return 0
 
     def analyze_directory_structure(self, source_server, dir_path):
-        """Analyze directory structure and return child file info."""
-        all_files = []
-
+        """Analyze directory structure and return its regular files as a FileTable."""
         print(f"🔍 分析目录结构: {source_server}:{dir_path}")
-
-
-        is_local_source = is_local_server(source_server)
-
-        if is_local_source:
-
-            print(f"📁 本地目录分析: {dir_path}")
-            try:
-                for root, dirs, files in os.walk(dir_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        try:
-                            file_size = os.path.getsize(file_path)
-                            relative_path = os.path.relpath(file_path, dir_path)
-                            all_files.append({
-                                'path': file_path,
-                                'name': relative_path,
-                                'size': file_size,
-                                'is_directory': False
-                            })
-                        except Exception as e:
-                            print(f"⚠️ 跳过文件 {file_path}: {e}")
-                            continue
-                print(f"✅ 本地目录分析完成，找到 {len(all_files)} 个文件")
-            except Exception as e:
-                print(f"❌ 本地目录分析失败: {e}")
-        else:
-
-            print(f"🌐 远程目录分析: {source_server}:{dir_path}")
-            try:
-
-                cmd = f"find {shlex.quote(dir_path)} -type f -exec stat -c '%n %s' {{}} \\;"
-                print(f"🔧 执行命令: {cmd}")
-                output, error, _ = ssh_manager.execute_command(source_server, cmd)
-
-                if error:
-                    print(f"⚠️ 命令执行警告: {error}")
-
-                if output:
-                    print(f"📄 命令输出长度: {len(output)} 字符")
-                    lines = output.strip().split('\n')
-                    print(f"📄 输出行数: {len(lines)}")
-
-                    for line in lines:
-                        if line.strip():
-                            parts = line.rsplit(' ', 1)
-                            if len(parts) == 2:
-                                file_path, size_str = parts
-                                try:
-                                    file_size = int(size_str)
-                                    relative_path = os.path.relpath(file_path, dir_path)
-                                    all_files.append({
-                                        'path': file_path,
-                                        'name': relative_path,
-                                        'size': file_size,
-                                        'is_directory': False
-                                    })
-                                except Exception as e:
-                                    print(f"⚠️ 解析文件信息失败 {line}: {e}")
-                                    continue
-                    print(f"✅ 远程目录分析完成，找到 {len(all_files)} 个文件")
-                else:
-                    print(f"⚠️ 命令无输出，可能目录为空或无权限")
-            except Exception as e:
-                print(f"❌ 远程目录分析失败: {e}")
-
-        return all_files
+        start = time.time()
+        try:
+            if is_local_server(source_server):
+                table = walk_local_tree(dir_path)
+            else:
+                table = walk_remote_tree(source_server, dir_path)
+        except Exception as e:
+            print(f"❌ 目录分析失败: {e}")
+            return FileTable(dir_path)
+        print(f"✅ 目录分析完成，找到 {len(table)} 个文件，共 {_human_readable_size(table.total_size)}，"
+              f"耗时 {time.time() - start:.2f}s")
+        return table
 
     def categorize_files(self, source_server, source_files, transfer_id=None):
-        """Classify files into small/large groups and analyze directory structure."""
+        """Classify files into small/large groups and analyze directory structure (one FileTable per directory)."""
         small_files = []
         large_files = []
         directory_files = []
@@ -1390,7 +2969,7 @@ class ParallelTransferManager:
                         else:
 
                             dir_files = self.analyze_directory_structure(source_server, file_info['path'])
-                            directory_files.extend(dir_files)
+                            directory_files.append(dir_files)
 
                             print(f"✅ 目录 {file_info['name']} 包含 {len(dir_files)} 个文件")
 
@@ -1407,7 +2986,7 @@ class ParallelTransferManager:
                             large_files.append({
                                 **file_info,
                                 'sub_files_count': len(dir_files),
-                                'total_size': sum(f['size'] for f in dir_files)
+                                'total_size': dir_files.total_size
                             })
                     except Exception as e:
                         print(f"❌ 分析目录 {file_info['name']} 失败: {e}")
@@ -1438,7 +3017,7 @@ class ParallelTransferManager:
 
                         large_files.append(file_info)
 
-            print(f"✅ 文件分类完成: {len(small_files)}个小文件, {len(large_files)}个大文件/目录, {len(directory_files)}个子文件")
+            print(f"✅ 文件分类完成: {len(small_files)}个小文件, {len(large_files)}个大文件/目录, {sum(len(t) for t in directory_files)}个子文件")
 
         except Exception as e:
             print(f"❌ 文件分类过程中出错: {e}")
@@ -1459,7 +3038,6 @@ class ParallelTransferManager:
 parallel_manager = ParallelTransferManager()
 
 
-file_cache = {}
 cache_timeout = 120
 instant_cache_timeout = 300
 BROWSE_PAGE_SIZE_DEFAULT = 400
@@ -1541,7 +3119,7 @@ def _get_item_modified_ts(item):
         if isinstance(item, dict):
             ts = item.get('modified_ts')
             if isinstance(ts, (int, float)):
-                return int(ts)
+                return ts
             return _coerce_modified_timestamp(item.get('modified'))
     except Exception:
         return 0
@@ -1573,71 +3151,584 @@ def sort_file_items(items, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_O
         return items
 
 
-def get_cache_key(server_ip, path, show_hidden, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
-    """Build cache key."""
-    return (
-        f"{server_ip}:{path}:{show_hidden}:"
-        f"{normalize_browse_sort_by(sort_by)}:{normalize_browse_sort_order(sort_order)}"
-    )
+class ColumnarListing:
+    """Directory listing as parallel arrays (one parent path, interned names); rows are built on demand."""
+
+    __slots__ = ('prefix', 'names', 'sizes', 'mtimes', 'flags', 'paths', 'modified_format', 'orders', 'name_rank')
+
+    FLAG_DIR = 1
+
+    def __init__(self, items, modified_format):
+        self.modified_format = modified_format
+        self.names = [sys.intern(str(item.get('name', ''))) for item in items]
+        self.sizes = array('q', [int(item.get('size') or 0) for item in items])
+        self.mtimes = array('d', [float(_get_item_modified_ts(item) or 0) for item in items])
+        self.flags = bytearray(self.FLAG_DIR if item.get('is_directory') else 0 for item in items)
+        self.orders = {}
+        self.name_rank = None
+        self.paths = None
+        self.prefix = ''
+        if items:
+            first_path = str(items[0].get('path', ''))
+            first_name = self.names[0]
+            self.prefix = first_path[:len(first_path) - len(first_name)] if first_path.endswith(first_name) else ''
+            prefix = self.prefix
+            if any(item.get('path') != prefix + name for item, name in zip(items, self.names)):
+                # Mixed parents never happen for real listings; keep exact paths rather than guessing.
+                self.paths = [item.get('path', '') for item in items]
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, index):
+        name = self.names[index]
+        mtime = self.mtimes[index]
+        is_dir = bool(self.flags[index] & self.FLAG_DIR)
+        try:
+            modified = datetime.fromtimestamp(mtime).strftime(self.modified_format) if mtime else ''
+        except (OverflowError, OSError, ValueError):
+            modified = ''
+        return {
+            "name": name,
+            "path": self.paths[index] if self.paths is not None else self.prefix + name,
+            "is_directory": is_dir,
+            "size": self.sizes[index],
+            "modified": modified,
+            "modified_ts": mtime
+        }
 
-def is_cache_valid(cache_entry):
-    """Check whether cache is valid."""
-    return time.time() - cache_entry['timestamp'] < cache_timeout
+    def _ensure_name_rank(self):
+        """Natural-sort the names once; later sorts use the rank as their tie-breaker.
+
+        Names with equal natural keys share a rank, so they stay tied exactly as in sort_file_items.
+        """
+        if self.name_rank is None:
+            names = self.names
+            natural = [_natural_sort_key(name) for name in names]
+            by_name = sorted(range(len(names)), key=natural.__getitem__)
+            rank = array('I', bytes(4 * len(names)))
+            position = 0
+            for number, index in enumerate(by_name):
+                if number and natural[index] != natural[by_name[number - 1]]:
+                    position = number
+                rank[index] = position
+            self.name_rank = rank
+        return self.name_rank
+
+    def order(self, sort_by, descending=False):
+        """Permutation for a sort field (directories first), computed once per field and direction.
+
+        Descending is its own stable sort rather than the ascending order reversed, so tied rows
+        keep their listing order in both directions, as sort_file_items does.
+        """
+        order = self.orders.get((sort_by, descending))
+        if order is not None:
+            return order
+        rank = self._ensure_name_rank()
+        names, flags = self.names, self.flags
+        if sort_by == BROWSE_SORT_BY_MODIFIED:
+            mtimes = self.mtimes
+            key = lambda i: (mtimes[i], rank[i])
+        elif sort_by == BROWSE_SORT_BY_SIZE:
+            sizes = self.sizes
+            key = lambda i: (sizes[i], rank[i])
+        elif sort_by == BROWSE_SORT_BY_TYPE:
+            key = lambda i: ('' if flags[i] & self.FLAG_DIR else _file_extension_sort_key(names[i]), rank[i])
+        else:
+            key = rank.__getitem__
+        indexes = sorted(range(len(names)), key=key, reverse=descending)
+        indexes.sort(key=lambda i: 0 if flags[i] & self.FLAG_DIR else 1)
+        order = self.orders[(sort_by, descending)] = array('I', indexes)
+        return order
+
+    def view(self, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
+        """Sorted view over the cached permutation for this field and direction."""
+        descending = normalize_browse_sort_order(sort_order) == BROWSE_SORT_ORDER_DESC
+        return ListingView(self, self.order(normalize_browse_sort_by(sort_by), descending))
+
+    def nbytes(self):
+        """Approximate memory held by this listing (names counted once per listing)."""
+        total = (sys.getsizeof(self.names) + sum(sys.getsizeof(n) for n in self.names)
+                 + self.sizes.buffer_info()[1] * self.sizes.itemsize
+                 + self.mtimes.buffer_info()[1] * self.mtimes.itemsize
+                 + len(self.flags) + sys.getsizeof(self.prefix))
+        if self.paths is not None:
+            total += sys.getsizeof(self.paths) + sum(sys.getsizeof(p) for p in self.paths)
+        for order in list(self.orders.values()) + ([self.name_rank] if self.name_rank is not None else []):
+            total += order.buffer_info()[1] * order.itemsize
+        return total
+
+
+class ListingView:
+    """Read-only sorted view over a ColumnarListing; slicing materializes only the requested rows."""
+
+    __slots__ = ('listing', 'order')
+
+    def __init__(self, listing, order):
+        self.listing = listing
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index):
+        row, order = self.listing.row, self.order
+        if isinstance(index, slice):
+            return [row(i) for i in order[index]]
+        return row(order[index])
+
+    def __iter__(self):
+        row = self.listing.row
+        for index in self.order:
+            yield row(index)
+
+    def find(self, needle):
+        """Positions (in view order) of rows whose name contains needle, case-insensitively."""
+        needle = needle.lower()
+        names = self.listing.names
+        hits = {i for i, name in enumerate(names) if needle in name.lower()}
+        if not hits:
+            return []
+        return [p for p, index in enumerate(self.order) if index in hits]
+
+
+class _InotifyDirWatcher:
+    """Invalidate local listing cache entries on inotify events (Linux, via libc)."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, on_change, max_watches):
+        self.on_change = on_change
+        self.max_watches = max(1, int(max_watches))
+        self.watches = {}
+        self.paths = {}
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.fd = -1
+        self.libc = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(self.IN_CLOEXEC)
+            if fd < 0:
+                return
+            self.libc = libc
+            self.fd = fd
+            threading.Thread(target=self._read_loop, daemon=True).start()
+        except Exception:
+            self.libc = None
+            self.fd = -1
 
-def get_cached_listing(server_ip, path, show_hidden, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
-    """Get cached file list."""
-    cache_key = get_cache_key(server_ip, path, show_hidden, sort_by, sort_order)
-    if cache_key in file_cache:
-        cache_entry = file_cache[cache_key]
-        if is_cache_valid(cache_entry):
-            return cache_entry['data']
-    return None
+    @property
+    def available(self):
+        return self.fd >= 0
+
+    def watch(self, path):
+        """Watch a directory; returns its change generation, or None when it cannot be watched."""
+        if not self.available:
+            return None
+        with self.lock:
+            if path not in self.paths:
+                if len(self.paths) >= self.max_watches:
+                    return None
+                wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+                if wd < 0:
+                    return None
+                self.watches[wd] = path
+                self.paths[path] = wd
+            return self.generations.get(path, 0)
+
+    def generation(self, path):
+        """Current change generation of a watched path, or None once the watch is gone."""
+        with self.lock:
+            if path not in self.paths:
+                return None
+            return self.generations.get(path, 0)
+
+    def unwatch(self, path):
+        if not self.available:
+            return
+        with self.lock:
+            wd = self.paths.pop(path, None)
+            if wd is None:
+                return
+            self.watches.pop(wd, None)
+            self.generations.pop(path, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def _read_loop(self):
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except InterruptedError:
+                continue
+            except OSError:
+                return
+            changed = set()
+            overflow = False
+            offset = 0
+            while offset + self.EVENT_HEADER.size <= len(buf):
+                wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(buf, offset)
+                offset += self.EVENT_HEADER.size + name_len
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                with self.lock:
+                    path = self.watches.get(wd)
+                    if path is not None:
+                        self.generations[path] = self.generations.get(path, 0) + 1
+                        if mask & self.IN_IGNORED:
+                            self.watches.pop(wd, None)
+                            self.paths.pop(path, None)
+                            self.generations.pop(path, None)
+                if path is not None:
+                    changed.add(path)
+            try:
+                if overflow:
+                    with self.lock:
+                        for path in self.paths:
+                            self.generations[path] = self.generations.get(path, 0) + 1
+                    self.on_change(None)
+                for path in changed:
+                    self.on_change(path)
+            except Exception:
+                pass
 
-def set_cached_listing(server_ip, path, show_hidden, data, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
-    """Set file list cache."""
-    cache_key = get_cache_key(server_ip, path, show_hidden, sort_by, sort_order)
-    file_cache[cache_key] = {
-        'data': data,
-        'timestamp': time.time()
-    }
 
+class _ListingTrieNode:
+    __slots__ = ('children', 'keys')
 
-    current_time = time.time()
-    expired_keys = [k for k, v in file_cache.items()
-                   if current_time - v['timestamp'] > cache_timeout]
-    for key in expired_keys:
-        del file_cache[key]
+    def __init__(self):
+        self.children = {}
+        self.keys = set()
 
-def clear_cached_listing(server_ip, path, show_hidden=None):
-    """Clear cache for a path."""
-    if show_hidden is None:
 
-        keys_to_remove = []
-        for cache_key in file_cache.keys():
-            if cache_key.startswith(f"{server_ip}:{path}:"):
-                keys_to_remove.append(cache_key)
+class DirectoryListingCache:
+    """Raw directory listings keyed by (server, path, show_hidden); sorted on read.
 
-        for key in keys_to_remove:
-            del file_cache[key]
+    Entries are revalidated against the directory mtime (remote: `stat -c %Y`)
+    instead of re-listing; local directories are invalidated by inotify when
+    available. max_age still bounds staleness of in-place child edits that do
+    not touch the directory mtime.
 
-        return len(keys_to_remove)
-    else:
-        keys_to_remove = []
-        prefix = f"{server_ip}:{path}:{show_hidden}:"
-        for cache_key in file_cache.keys():
-            if cache_key.startswith(prefix):
-                keys_to_remove.append(cache_key)
+    A per-server path trie indexes the entries so a directory (or its whole
+    subtree) is invalidated in O(depth); an LRU order caps the size and a
+    background sweeper drops expired entries off the request path.
+    """
+
+    def __init__(self, revalidate_after, max_age, use_inotify=True, max_watches=1024,
+                 max_entries=5000, max_items=2000000, sweep_interval=60):
+        self.revalidate_after = max(0.0, float(revalidate_after))
+        self.max_age = max(1.0, float(max_age))
+        self.max_entries = max(1, int(max_entries))
+        self.max_items = max(1, int(max_items))
+        self.sweep_interval = max(1.0, float(sweep_interval))
+        self.entries = OrderedDict()
+        self.roots = {}
+        self.total_items = 0
+        self.lock = threading.RLock()
+        self.sweeper_started = False
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stale': 0,
+                      'invalidated': 0, 'evicted': 0, 'expired': 0}
+        self.watcher = _InotifyDirWatcher(self._on_local_change, max_watches) if use_inotify else None
+
+    @staticmethod
+    def _key(server_ip, path, show_hidden):
+        return (server_ip, path, bool(show_hidden))
+
+    @staticmethod
+    def _path_parts(path):
+        return tuple(p for p in str(path or '').replace('\\', '/').split('/') if p)
+
+    def _find_node(self, server_ip, parts, create=False):
+        node = self.roots.get(server_ip)
+        if node is None:
+            if not create:
+                return None
+            node = self.roots[server_ip] = _ListingTrieNode()
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[part] = _ListingTrieNode()
+            node = child
+        return node
+
+    def _remove(self, key, unwatch=False):
+        """Drop one entry and prune empty trie nodes; caller holds the lock."""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.total_items -= len(entry['listing'])
+        server_ip = key[0]
+        trail = [self.roots.get(server_ip)]
+        for part in entry['parts']:
+            if trail[-1] is None:
+                break
+            trail.append(trail[-1].children.get(part))
+        node = trail[-1]
+        if node is not None:
+            node.keys.discard(key)
+            for depth in range(len(trail) - 1, 0, -1):
+                current = trail[depth]
+                if current is None or current.keys or current.children:
+                    break
+                trail[depth - 1].children.pop(entry['parts'][depth - 1], None)
+            root = self.roots.get(server_ip)
+            if root is not None and not root.keys and not root.children:
+                del self.roots[server_ip]
+        if unwatch and self.watcher is not None and not (node and node.keys) and is_local_server(server_ip):
+            self.watcher.unwatch(entry['path'])
+        return True
+
+    def _collect(self, node, recursive):
+        if not recursive:
+            return list(node.keys)
+        keys = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            keys.extend(current.keys)
+            stack.extend(current.children.values())
+        return keys
+
+    def _on_local_change(self, path):
+        with self.lock:
+            servers = [s for s in self.roots if is_local_server(s)]
+            count = 0
+            for server_ip in servers:
+                count += self.clear(server_ip, '/' if path is None else path, recursive=path is None)
+            self.stats['invalidated'] += count
+
+    def _remote_dir_mtime(self, server_ip, path):
+        output, error, _ = ssh_manager.execute_command(server_ip, f"stat -c %Y {shlex.quote(path)}")
+        try:
+            return int((output or '').strip().splitlines()[0])
+        except (IndexError, ValueError):
+            return None
+
+    def _is_current(self, server_ip, entry):
+        """Revalidate an entry; returns False when the directory must be listed again."""
+        now = time.time()
+        if now - entry['timestamp'] >= self.max_age:
+            return False
+        if entry['watch_generation'] is not None:
+            return self.watcher.generation(entry['path']) == entry['watch_generation']
+        if now - entry['checked_at'] < self.revalidate_after:
+            return True
+        if entry['racy']:
+            return False
+        if entry['dir_mtime'] is None:
+            # No cheap validator (Windows): plain TTL bounded by max_age.
+            return True
+        path = entry['path']
+        try:
+            if is_local_server(server_ip):
+                current = os.stat(path).st_mtime
+            else:
+                current = self._remote_dir_mtime(server_ip, path)
+        except OSError:
+            current = None
+        if current is None or current != entry['dir_mtime']:
+            return False
+        entry['checked_at'] = now
+        self.stats['revalidated'] += 1
+        return True
+
+    def begin_local(self, path):
+        """Snapshot validators before scanning a local directory: (watch_generation, dir_mtime, listed_at)."""
+        generation = self.watcher.watch(path) if self.watcher is not None else None
+        try:
+            dir_mtime = os.stat(path).st_mtime
+        except OSError:
+            dir_mtime = None
+        return generation, dir_mtime, time.time()
+
+    def get(self, server_ip, path, show_hidden, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
+        key = self._key(server_ip, path, show_hidden)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        if not self._is_current(server_ip, entry):
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    self._remove(key)
+            self.stats['stale'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry['listing'].view(sort_by, sort_order)
+
+    def set(self, server_ip, path, show_hidden, items, dir_mtime=None, listed_at=None, watch_generation=None):
+        """Store raw items; validators must be captured before the listing was read."""
+        now = time.time()
+        if listed_at is None:
+            listed_at = now
+        # Remote mtime has one-second granularity: a change in the listing's own second is invisible.
+        racy = dir_mtime is not None and dir_mtime >= listed_at - 1
+        if watch_generation is not None and self.watcher.generation(path) != watch_generation:
+            # Changed while we were scanning: serve it briefly, then list again.
+            watch_generation = None
+            racy = True
+        key = self._key(server_ip, path, show_hidden)
+        parts = self._path_parts(path)
+        listing = ColumnarListing(items, '%Y-%m-%d %H:%M:%S' if is_local_server(server_ip) else '%Y-%m-%d %H:%M')
+        entry = {
+            'path': path,
+            'parts': parts,
+            'listing': listing,
+            'timestamp': now,
+            'checked_at': now,
+            'dir_mtime': dir_mtime,
+            'racy': racy,
+            'watch_generation': watch_generation,
+        }
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = entry
+            self.total_items += len(listing)
+            self._find_node(server_ip, parts, create=True).keys.add(key)
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_items > self.max_items):
+                oldest = next(iter(self.entries))
+                self._remove(oldest, unwatch=True)
+                self.stats['evicted'] += 1
+        self._ensure_sweeper()
+        return listing
+
+    def clear(self, server_ip, path, show_hidden=None, recursive=False):
+        """Invalidate a directory (and optionally its subtree) in O(depth + matches)."""
+        with self.lock:
+            node = self._find_node(server_ip, self._path_parts(path))
+            if node is None:
+                return 0
+            keys = [k for k in self._collect(node, recursive) if show_hidden is None or k[2] == bool(show_hidden)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def child_names(self, server_ip, path):
+        """Names of subdirectories of path that have cached listings somewhere below them."""
+        with self.lock:
+            node = self._find_node(server_ip, self._path_parts(path))
+            return list(node.children) if node is not None else []
+
+    def clear_all(self):
+        with self.lock:
+            count = len(self.entries)
+            self.entries.clear()
+            self.roots.clear()
+            self.total_items = 0
+        return count
+
+    def _ensure_sweeper(self):
+        if self.sweeper_started:
+            return
+        with self.lock:
+            if self.sweeper_started:
+                return
+            self.sweeper_started = True
+        threading.Thread(target=self._sweep_loop, daemon=True).start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def sweep(self):
+        """Drop entries older than max_age."""
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            expired = [k for k, e in self.entries.items() if e['timestamp'] <= cutoff]
+            for key in expired:
+                self._remove(key, unwatch=True)
+            self.stats['expired'] += len(expired)
+        return len(expired)
+
+    def get_stats(self):
+        with self.lock:
+            entries = len(self.entries)
+            items = self.total_items
+            listings = [e['listing'] for e in self.entries.values()]
+        memory_bytes = sum(listing.nbytes() for listing in listings)
+        return {
+            'entries': entries,
+            'items': items,
+            'memory_bytes': memory_bytes,
+            'memory': _human_readable_size(memory_bytes),
+            'max_entries': self.max_entries,
+            'max_items': self.max_items,
+            'inotify': bool(self.watcher and self.watcher.available),
+            'watches': len(self.watcher.paths) if self.watcher and self.watcher.available else 0,
+            **self.stats,
+        }
+
+listing_cache = DirectoryListingCache(
+    LISTING_CACHE_CONFIG['revalidate_after'],
+    LISTING_CACHE_CONFIG['max_age'],
+    LISTING_CACHE_CONFIG['inotify'],
+    LISTING_CACHE_CONFIG['max_watches'],
+    LISTING_CACHE_CONFIG['max_entries'],
+    LISTING_CACHE_CONFIG['max_items'],
+    LISTING_CACHE_CONFIG['sweep_interval'],
+)
 
-        for key in keys_to_remove:
-            del file_cache[key]
 
-        return len(keys_to_remove)
+def get_cached_listing(server_ip, path, show_hidden, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
+    """Get cached file list (sorted on read)."""
+    return listing_cache.get(server_ip, path, show_hidden, sort_by, sort_order)
+
+def set_cached_listing(server_ip, path, show_hidden, data, dir_mtime=None, listed_at=None, watch_generation=None):
+    """Set file list cache with raw (unsorted) items; returns the stored ColumnarListing."""
+    filename_indexes.note_listing(server_ip, path, data, show_hidden)
+    return listing_cache.set(server_ip, path, show_hidden, data, dir_mtime, listed_at, watch_generation)
+
+def clear_cached_listing(server_ip, path, show_hidden=None, recursive=False):
+    """Clear cache for a path (and its subtree when recursive)."""
+    return listing_cache.clear(server_ip, path, show_hidden, recursive)
 
 def clear_all_cache():
     """Clear all caches."""
-    cache_count = len(file_cache)
-    file_cache.clear()
-    return cache_count
+    return listing_cache.clear_all()
+
+_WINSCP_SYSTEM_SYMLINKS = frozenset({
+    'bin', 'sbin', 'lib', 'lib32', 'lib64', 'libx32'
+})
+_WINSCP_SYSTEM_DIRS = frozenset({
+    'proc', 'sys', 'dev', 'run', 'boot', 'etc', 'var', 'tmp',
+    'lost+found', 'cdrom', 'media', 'mnt', 'opt', 'srv', 'usr'
+})
+_WINSCP_SYSTEM_FILES = frozenset({
+    'swapfile', 'vmlinuz', 'initrd.img'
+})
+_WINSCP_WORK_HIDDEN_DIRS = frozenset({
+    'home', 'root', 'snap', 'boot', 'etc', 'var', 'usr', 'opt',
+    'proc', 'sys', 'dev', 'run', 'tmp', 'media', 'mnt', 'srv',
+    'lost+found', 'cdrom'
+})
+# Every non-dot name is_winscp_hidden_file can hide; lets bulk parsers skip the call for the rest.
+_WINSCP_HIDDEN_CANDIDATES = (_WINSCP_SYSTEM_SYMLINKS | _WINSCP_SYSTEM_DIRS | _WINSCP_SYSTEM_FILES
+                             | _WINSCP_WORK_HIDDEN_DIRS | {'root', 'home', 'snap'})
 
 def is_winscp_hidden_file(name, permissions="", path="/"):
     """Decide whether to hide a file per WinSCP rules.
@@ -1655,25 +3746,15 @@ def is_winscp_hidden_file(name, permissions="", path="/"):
         return True
 
 
-    system_symlinks = {
-        'bin', 'sbin', 'lib', 'lib32', 'lib64', 'libx32'
-    }
-    if name in system_symlinks:
+    if name in _WINSCP_SYSTEM_SYMLINKS:
         return True
 
 
-    system_dirs = {
-        'proc', 'sys', 'dev', 'run', 'boot', 'etc', 'var', 'tmp',
-        'lost+found', 'cdrom', 'media', 'mnt', 'opt', 'srv', 'usr'
-    }
-    if name in system_dirs:
+    if name in _WINSCP_SYSTEM_DIRS:
         return True
 
 
-    system_files = {
-        'swapfile', 'vmlinuz', 'initrd.img'
-    }
-    if name in system_files:
+    if name in _WINSCP_SYSTEM_FILES:
         return True
 
 
@@ -1696,20 +3777,131 @@ def is_winscp_hidden_file(name, permissions="", path="/"):
 
     if '/Work' in path or path.endswith('/Work'):
 
-        work_hidden_dirs = {
-            'home', 'root', 'snap', 'boot', 'etc', 'var', 'usr', 'opt',
-            'proc', 'sys', 'dev', 'run', 'tmp', 'media', 'mnt', 'srv',
-            'lost+found', 'cdrom'
-        }
-        if name in work_hidden_dirs:
+        if name in _WINSCP_WORK_HIDDEN_DIRS:
             return True
 
 
-        if name in {'bin', 'sbin', 'lib', 'lib32', 'lib64', 'libx32'}:
+        if name in _WINSCP_SYSTEM_SYMLINKS:
             return True
 
     return False
 
+# NUL after every field: names may contain any byte but NUL. %TY..%TM mirrors the old ls long-iso column.
+FIND_LISTING_PRINTF = '%y\\0%s\\0%T@\\0%TY-%Tm-%Td %TH:%TM\\0%f\\0'
+FIND_LISTING_FIELDS = 5
+
+def _escape_find_glob(text):
+    """Escape glob metacharacters for a literal match in find -name/-iname."""
+    return re.sub(r'([*?\[\]\\])', r'\\\1', text)
+
+def parse_find_listing(text, path, show_hidden):
+    """Parse `find -printf FIND_LISTING_PRINTF` output column-wise.
+
+    Returns (items, tail); tail is an incomplete trailing record to prepend to the next chunk.
+    """
+    fields = text.split('\0')
+    cut = (len(fields) - 1) // FIND_LISTING_FIELDS * FIND_LISTING_FIELDS
+    tail = '\0'.join(fields[cut:])
+    names = fields[4:cut:FIND_LISTING_FIELDS]
+    if not names:
+        return [], tail
+    is_dirs = [t == 'd' for t in fields[0:cut:FIND_LISTING_FIELDS]]
+    sizes = list(map(int, fields[1:cut:FIND_LISTING_FIELDS]))
+    mtimes = list(map(float, fields[2:cut:FIND_LISTING_FIELDS]))
+    stamps = fields[3:cut:FIND_LISTING_FIELDS]
+    if show_hidden:
+        hidden = [False] * len(names)
+    else:
+        hidden = [n[:1] == '.' or (n in _WINSCP_HIDDEN_CANDIDATES and is_winscp_hidden_file(n, '', path))
+                  for n in names]
+    prefix = path if path.endswith('/') else path + '/'
+    items = [
+        {
+            "name": name,
+            "path": prefix + name,
+            "is_directory": is_dir,
+            "size": 0 if is_dir else size,
+            "modified": stamp,
+            "modified_ts": mtime
+        }
+        for name, is_dir, size, mtime, stamp, skip in zip(names, is_dirs, sizes, mtimes, stamps, hidden)
+        if not skip
+    ]
+    return items, tail
+
+def parse_ls_listing(lines, path, show_hidden):
+    """Parse `ls -la --time-style=long-iso` lines (fallback when find lacks -printf)."""
+    items = []
+    for line in lines:
+
+
+
+        if not line:
+            continue
+
+        parts = line.split()
+        if len(parts) < 8:
+            continue
+
+        permissions = parts[0]
+        size = parts[4]
+        date_parts = parts[5:7]
+        name = ' '.join(parts[7:])
+
+        if not show_hidden and name.startswith('.'):
+            continue
+
+
+        if name in ['.', '..']:
+            continue
+
+
+        if not show_hidden:
+            if is_winscp_hidden_file(name, permissions, path):
+                continue
+
+        is_directory = permissions.startswith('d')
+
+        items.append({
+            "name": name,
+            "path": os.path.join(path, name),
+            "is_directory": is_directory,
+            "size": int(size) if size.isdigit() else 0,
+            "modified": ' '.join(date_parts),
+            "modified_ts": _coerce_modified_timestamp(' '.join(date_parts))
+        })
+    return items
+
+def parse_windows_json_listing(text, base_path):
+    """Parse the ConvertTo-Json rows emitted by _windows_listing_script."""
+    rows = json.loads(text or '[]')
+    if isinstance(rows, dict):
+        rows = [rows]
+    prefix = f"{base_path.rstrip('/')}/".replace('\\', '/')
+    return [
+        {
+            "name": row['n'],
+            "path": prefix + row['n'],
+            "is_directory": bool(row.get('d')),
+            "size": 0 if row.get('d') else int(row.get('s') or 0),
+            "modified": row.get('m') or '',
+            "modified_ts": int(row.get('t') or 0)
+        }
+        for row in rows
+        if isinstance(row, dict) and row.get('n') not in (None, '.', '..')
+    ]
+
+def _windows_listing_script(win_path, show_hidden):
+    force_flag = " -Force" if show_hidden else ""
+    return (
+        f"$rows=@(Get-ChildItem -LiteralPath '{_escape_pwsh_literal(win_path)}'{force_flag} -ErrorAction Stop | ForEach-Object {{"
+        "[pscustomobject]@{n=$_.Name; d=[bool]$_.PSIsContainer;"
+        " s=$(if($_.PSIsContainer){0}else{[int64]$_.Length});"
+        " t=[int64](($_.LastWriteTimeUtc - [datetime]'1970-01-01').TotalSeconds);"
+        " m=$_.LastWriteTime.ToString('yyyy-MM-dd HH:mm')}});"
+        "ConvertTo-Json -Compress -InputObject $rows"
+    )
+
 def get_directory_listing(server_ip, path=None, show_hidden=False, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
     """Get a remote directory listing.
 
@@ -1729,6 +3921,7 @@ def get_directory_listing(server_ip, path=None, show_hidden=False, sort_by=BROWS
     if is_local_server(server_ip):
 
         try:
+            watch_generation, dir_mtime, listed_at = listing_cache.begin_local(path)
             items = []
             for item in os.listdir(path):
                 if not show_hidden and item.startswith('.'):
@@ -1747,9 +3940,8 @@ def get_directory_listing(server_ip, path=None, show_hidden=False, sort_by=BROWS
                     "modified": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
                     "modified_ts": int(mtime)
                 })
-            items = sort_file_items(items, sort_by, sort_order)
-            set_cached_listing(server_ip, path, show_hidden, items, sort_by, sort_order)
-            return items
+            listing = set_cached_listing(server_ip, path, show_hidden, items, dir_mtime, listed_at, watch_generation)
+            return listing.view(sort_by, sort_order)
         except Exception:
             return []
     else:
@@ -1769,6 +3961,17 @@ def get_directory_listing(server_ip, path=None, show_hidden=False, sort_by=BROWS
 
             win_path = normalized_path.replace('/', '\\')
 
+            ps_command = f'powershell -NoProfile -Command "{_windows_listing_script(win_path, show_hidden)}"'
+            output, error, exit_code = ssh_manager.execute_command(server_ip, ps_command)
+            if exit_code == 0:
+                try:
+                    items = parse_windows_json_listing(output, normalized_path or path)
+                    listing = set_cached_listing(server_ip, path, show_hidden, items)
+                    return listing.view(sort_by, sort_order)
+                except (ValueError, KeyError, TypeError):
+                    pass
+
+            # Fallback: parse localized `dir` output.
             dir_flags = "/-c"
             if show_hidden:
                 dir_flags = "/a /-c"
@@ -1841,139 +4044,1324 @@ def get_directory_listing(server_ip, path=None, show_hidden=False, sort_by=BROWS
                         "modified_ts": _coerce_modified_timestamp(f"{date_str} {full_time}")
                     })
 
-            items = sort_file_items(items, sort_by, sort_order)
-            set_cached_listing(server_ip, path, show_hidden, items, sort_by, sort_order)
-            return items
+            listing = set_cached_listing(server_ip, path, show_hidden, items)
+            return listing.view(sort_by, sort_order)
         else:
 
 
 
-            command = f"LC_ALL=C ls -la --time-style=long-iso {shlex.quote(path)} | tail -n +2"
+            # Directory mtime and remote clock ride along so later reads can revalidate with `stat -c %Y`.
+            quoted_path = shlex.quote(path)
+            header = f"stat -c %Y {quoted_path} && date +%s && "
+            command = (
+                f"{header}LC_ALL=C find {quoted_path} -mindepth 1 -maxdepth 1 -printf '{FIND_LISTING_PRINTF}'"
+            )
 
-            output, error, _ = ssh_manager.execute_command(server_ip, command)
+            output, error, exit_code = ssh_manager.execute_command(server_ip, command)
+            structured = exit_code == 0
+            if not structured:
+                # e.g. busybox find without -printf: fall back to ls text parsing.
+                command = f"{header}LC_ALL=C ls -la --time-style=long-iso {quoted_path} | tail -n +2"
+                output, error, _ = ssh_manager.execute_command(server_ip, command)
+                if error:
+                    return []
 
-            if error:
-                return []
+            head = (output or '').split('\n', 2)
+            try:
+                dir_mtime = int(head[0])
+                listed_at = int(head[1])
+                body = head[2] if len(head) > 2 else ''
+            except (IndexError, ValueError):
+                dir_mtime = None
+                listed_at = None
+                body = output or ''
+
+            if structured:
+                items, _ = parse_find_listing(body, path, show_hidden)
+            else:
+                items = parse_ls_listing(body.strip().split('\n'), path, show_hidden)
+
+            listing = set_cached_listing(server_ip, path, show_hidden, items, dir_mtime, listed_at)
+            return listing.view(sort_by, sort_order)
+
+def get_directory_listing_optimized(server_ip, path=None, show_hidden=False, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
+    """Optimized directory listing focused on response speed."""
+
+
+    if path is None:
+        path = get_default_path(server_ip)
+
+
+    cached_result = get_cached_listing(server_ip, path, show_hidden, sort_by, sort_order)
+    if cached_result is not None:
+        return cached_result
+
+
+    if is_local_server(server_ip):
+
+        try:
+            watch_generation, dir_mtime, listed_at = listing_cache.begin_local(path)
+            items = []
+
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if not show_hidden and entry.name.startswith('.'):
+                        continue
+
+                    try:
+                        stat_info = entry.stat()
+                        is_dir = entry.is_dir()
+                        size = 0 if is_dir else stat_info.st_size
+                        mtime = stat_info.st_mtime
+
+                        items.append({
+                            "name": entry.name,
+                            "path": os.path.join(path, entry.name),
+                            "is_directory": is_dir,
+                            "size": size,
+                            "modified": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
+                            "modified_ts": int(mtime)
+                        })
+                    except (OSError, PermissionError):
+
+                        continue
+
+            listing = set_cached_listing(server_ip, path, show_hidden, items, dir_mtime, listed_at, watch_generation)
+            return listing.view(sort_by, sort_order)
+        except Exception:
+            return []
+    else:
+
+        return get_directory_listing(server_ip, path, show_hidden, sort_by, sort_order)
+class ListingCursor:
+    """A directory listing that fills in the background; readers page through it as it grows.
+
+    With a keyword only matching names (case-insensitive substring) are collected.
+    """
+
+    def __init__(self, server_ip, path, show_hidden, keyword=None):
+        self.id = uuid.uuid4().hex
+        self.server_ip = server_ip
+        self.path = path
+        self.show_hidden = bool(show_hidden)
+        self.keyword = keyword or None
+        self.items = []
+        self.complete = False
+        self.error = None
+        self.cancelled = False
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.cond = threading.Condition()
+        self.channel = None
+
+    @property
+    def key(self):
+        return (self.server_ip, self.path, self.show_hidden, self.keyword)
+
+    def _extend(self, batch):
+        if not batch:
+            return
+        with self.cond:
+            self.items.extend(batch)
+            self.cond.notify_all()
+
+    def cancel(self):
+        """Stop filling; closing the channel aborts a remote find that is blocked in recv."""
+        self.cancelled = True
+        channel = self.channel
+        if channel is not None:
+            try:
+                channel.close()
+            except Exception:
+                pass
+
+    def _finish(self, error=None):
+        with self.cond:
+            self.complete = True
+            self.error = error
+            self.cond.notify_all()
+
+    def wait_for(self, count, timeout):
+        """Block until count items are available or the listing is done; returns True if satisfied."""
+        self.last_access = time.time()
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.items) >= count or self.complete, timeout)
+
+    def wait_complete(self, timeout):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.complete, timeout)
+
+    def page(self, offset, limit):
+        self.last_access = time.time()
+        with self.cond:
+            return self.items[offset:offset + limit], len(self.items), self.complete
+
+
+class ListingCursorRegistry:
+    """Server-side cursors for streamed listings of huge directories (remote POSIX via find -printf, local via scandir)."""
+
+    BATCH_SIZE = 2000
+
+    def __init__(self, idle_timeout):
+        self.idle_timeout = max(10.0, float(idle_timeout))
+        self.cursors = {}
+        self.by_key = {}
+        self.lock = threading.Lock()
 
-            items = []
+    def _sweep(self):
+        now = time.time()
+        for cursor_id, cursor in list(self.cursors.items()):
+            if now - cursor.last_access > self.idle_timeout:
+                cursor.cancel()
+                self.cursors.pop(cursor_id, None)
+                key = cursor.key
+                if self.by_key.get(key) is cursor:
+                    self.by_key.pop(key, None)
+
+    @staticmethod
+    def supports(server_ip):
+        return is_local_server(server_ip) or not is_windows_server(server_ip)
+
+    def get(self, cursor_id, server_ip, path, show_hidden, keyword=None):
+        """Look up a cursor id, but only for the listing it was opened for; None otherwise."""
+        with self.lock:
+            cursor = self.cursors.get(cursor_id)
+        if cursor is None or cursor.key != (server_ip, path, bool(show_hidden), keyword or None):
+            return None
+        return cursor
 
+    def open(self, server_ip, path, show_hidden, restart=False, keyword=None):
+        """Return the in-flight cursor for this directory (or name search), starting one if needed."""
+        key = (server_ip, path, bool(show_hidden), keyword or None)
+        with self.lock:
+            self._sweep()
+            cursor = self.by_key.get(key)
+            if cursor is not None and restart:
+                cursor.cancel()
+                cursor = None
+            if cursor is not None and not cursor.complete:
+                cursor.last_access = time.time()
+                return cursor
+            cursor = ListingCursor(server_ip, path, show_hidden, keyword)
+            self.cursors[cursor.id] = cursor
+            self.by_key[key] = cursor
+        return self.start(cursor)
+
+    def start(self, cursor):
+        """Fill a cursor in the background; unregistered cursors stay private to their caller."""
+        target = self._fill_local if is_local_server(cursor.server_ip) else self._fill_remote
+        threading.Thread(target=target, args=(cursor,), daemon=True).start()
+        return cursor
+
+    def _finish(self, cursor, error=None):
+        cursor._finish(error)
+        with self.lock:
+            key = cursor.key
+            if self.by_key.get(key) is cursor:
+                self.by_key.pop(key, None)
 
+    def _fill_local(self, cursor):
+        path = cursor.path
+        needle = cursor.keyword.lower() if cursor.keyword else None
+        try:
+            watch_generation, dir_mtime, listed_at = listing_cache.begin_local(path)
+            batch = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if cursor.cancelled:
+                        return self._finish(cursor, 'cancelled')
+                    if not cursor.show_hidden and entry.name.startswith('.'):
+                        continue
+                    if needle is not None and needle not in entry.name.lower():
+                        continue
+                    try:
+                        stat_info = entry.stat()
+                        is_dir = entry.is_dir()
+                    except (OSError, PermissionError):
+                        continue
+                    mtime = stat_info.st_mtime
+                    batch.append({
+                        "name": entry.name,
+                        "path": os.path.join(path, entry.name),
+                        "is_directory": is_dir,
+                        "size": 0 if is_dir else stat_info.st_size,
+                        "modified": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
+                        "modified_ts": int(mtime)
+                    })
+                    if len(batch) >= self.BATCH_SIZE:
+                        cursor._extend(batch)
+                        batch = []
+            cursor._extend(batch)
+            if needle is None:
+                set_cached_listing(cursor.server_ip, path, cursor.show_hidden, cursor.items, dir_mtime, listed_at, watch_generation)
+            self._finish(cursor)
+        except Exception as e:
+            self._finish(cursor, str(e))
+
+    def _fill_remote(self, cursor):
+        path = cursor.path
+        quoted_path = shlex.quote(path)
+        name_filter = ''
+        if cursor.keyword:
+            name_filter = f" -iname {shlex.quote('*' + _escape_find_glob(cursor.keyword) + '*')}"
+        command = (
+            f"stat -c %Y {quoted_path} && date +%s && "
+            f"LC_ALL=C find {quoted_path} -mindepth 1 -maxdepth 1{name_filter} -printf '{FIND_LISTING_PRINTF}'"
+        )
+        try:
+            with ssh_manager.lease(cursor.server_ip) as ssh:
+                if ssh is None:
+                    return self._finish(cursor, '无法连接到服务器')
+                channel = ssh.get_transport().open_session()
+                cursor.channel = channel
+                try:
+                    if cursor.cancelled:
+                        return self._finish(cursor, 'cancelled')
+                    channel.exec_command(command)
+                    dir_mtime, listed_at = self._stream_records(cursor, channel)
+                    exit_code = channel.recv_exit_status() if not cursor.cancelled else -1
+                finally:
+                    cursor.channel = None
+                    channel.close()
+            if cursor.cancelled:
+                return self._finish(cursor, 'cancelled')
+            if exit_code != 0 and not cursor.items:
+                return self._finish(cursor, f'find 退出码 {exit_code}')
+            if not cursor.keyword:
+                set_cached_listing(cursor.server_ip, path, cursor.show_hidden, cursor.items, dir_mtime, listed_at)
+            self._finish(cursor)
+        except Exception as e:
+            self._finish(cursor, str(e))
+
+    def _stream_records(self, cursor, channel):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buf = ''
+        header = []
+        while not cursor.cancelled:
+            chunk = channel.recv(256 * 1024)
+            if not chunk:
+                break
+            buf += decoder.decode(chunk)
+            while len(header) < 2:
+                nl = buf.find('\n')
+                if nl < 0:
+                    break
+                header.append(buf[:nl])
+                buf = buf[nl + 1:]
+            if len(header) < 2:
+                continue
+            batch, buf = parse_find_listing(buf, cursor.path, cursor.show_hidden)
+            cursor._extend(batch)
+        try:
+            return int(header[0]), int(header[1])
+        except (IndexError, ValueError):
+            return None, None
 
 
+listing_cursors = ListingCursorRegistry(LISTING_CACHE_CONFIG['cursor_idle_timeout'])
 
 
+class SearchSession:
+    """Live search state for one client panel: a pending query, the one in flight and the last full result."""
 
+    def __init__(self, key, on_result):
+        self.key = key
+        self.on_result = on_result
+        self.pending = None
+        self.deadline = 0.0
+        self.running = None
+        self.last = None
+        self.closed = False
+        self.thread = None
+        self.cond = threading.Condition()
 
 
+class SearchSessionManager:
+    """Search-as-you-type sessions keyed by (client sid, panel).
 
+    Keystrokes are coalesced for debounce seconds, a newer query cancels the in-flight one
+    (closing its SSH channel), and a keyword that extends the previous one is answered by
+    filtering the previous complete result instead of running another remote find.
+    """
 
+    FLUSH_INTERVAL = 0.2
+    IDLE_EXIT = 60.0
 
+    def __init__(self, debounce_ms, max_results):
+        self.debounce = max(0, int(debounce_ms)) / 1000.0
+        self.max_results = max(1, int(max_results))
+        self.sessions = {}
+        self.lock = threading.Lock()
 
+    def submit(self, sid, panel, query, on_result):
+        """Queue a query dict (server_ip/path/keyword/show_hidden/sort_by/sort_order/query_id)."""
+        key = (sid, panel)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = SearchSession(key, on_result)
+        with session.cond:
+            session.on_result = on_result
+            session.pending = query
+            session.deadline = time.time() + self.debounce
+            running = session.running
+            if session.thread is None:
+                session.thread = threading.Thread(target=self._run, args=(session,), daemon=True)
+                session.thread.start()
+            session.cond.notify_all()
+        if running is not None:
+            running.cancel()
+
+    def cancel(self, sid, panel):
+        """Drop the pending query and abort the running one; returns True if anything was stopped."""
+        with self.lock:
+            session = self.sessions.get((sid, panel))
+        if session is None:
+            return False
+        with session.cond:
+            had_pending = session.pending is not None
+            session.pending = None
+            running = session.running
+        if running is not None:
+            running.cancel()
+        return had_pending or running is not None
+
+    def close(self, sid):
+        """Tear down every session of a disconnected client."""
+        with self.lock:
+            sessions = [self.sessions.pop(key) for key in list(self.sessions) if key[0] == sid]
+        for session in sessions:
+            with session.cond:
+                session.closed = True
+                session.pending = None
+                running = session.running
+                session.cond.notify_all()
+            if running is not None:
+                running.cancel()
+        return len(sessions)
+
+    def _run(self, session):
+        while True:
+            with session.cond:
+                while True:
+                    if session.closed:
+                        session.thread = None
+                        return
+                    if session.pending is None:
+                        if not session.cond.wait(self.IDLE_EXIT) and session.pending is None:
+                            session.thread = None
+                            return
+                        continue
+                    remaining = session.deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    session.cond.wait(remaining)
+                query = session.pending
+                session.pending = None
+            try:
+                self._execute(session, query)
+            except Exception as e:
+                self._emit(session, query, [], 0, True, 'error', error=str(e))
 
+    def _emit(self, session, query, matches, offset, complete, source, truncated=False, error=None):
+        if session.pending is not None or session.closed:
+            return
+        payload = {
+            'panel': session.key[1],
+            'query_id': query.get('query_id'),
+            'server_ip': query.get('server_ip'),
+            'path': query.get('path'),
+            'keyword': query.get('keyword'),
+            'matches': matches,
+            'offset': offset,
+            'complete': complete,
+            'truncated': truncated,
+            'source': source,
+            'error': error
+        }
+        try:
+            session.on_result(payload)
+        except Exception:
+            pass
 
+    def _execute(self, session, query):
+        server_ip = query['server_ip']
+        path = query['path']
+        show_hidden = bool(query.get('show_hidden'))
+        keyword = query['keyword']
+        needle = keyword.lower()
+        scope = (server_ip, path, show_hidden)
+
+        files = get_cached_listing(server_ip, path, show_hidden, query.get('sort_by'), query.get('sort_order'))
+        if files is None and not listing_cursors.supports(server_ip):
+            files = get_directory_listing_optimized(server_ip, path, show_hidden, query.get('sort_by'), query.get('sort_order'))
+        if files is not None:
+            # Failed Windows listings come back as a plain [] rather than a ListingView.
+            positions = files.find(needle) if hasattr(files, 'find') else [
+                idx for idx, item in enumerate(files) if needle in str(item.get('name', '')).lower()
+            ]
+            truncated = len(positions) > self.max_results
+            matches = [dict(files[position], index=position) for position in positions[:self.max_results]]
+            return self._emit(session, query, matches, 0, True, 'cache', truncated)
+
+        last = session.last
+        if last is not None and last[0] == scope and last[1] in needle:
+            # Matches for the longer keyword are a subset of the previous complete result.
+            items = [item for item in last[2] if needle in item['name'].lower()]
+            session.last = (scope, needle, items)
+            return self._emit(session, query, [dict(item, index=None) for item in items], 0, True, 'prefix')
+
+        cursor = ListingCursor(server_ip, path, show_hidden, keyword)
+        with session.cond:
+            if session.pending is not None or session.closed:
+                return
+            session.running = cursor
+        listing_cursors.start(cursor)
+        sent = 0
+        truncated = False
+        try:
+            while True:
+                done = cursor.wait_complete(self.FLUSH_INTERVAL)
+                if session.pending is not None or session.closed:
+                    cursor.cancel()
+                    return
+                batch, loaded, _ = cursor.page(sent, self.max_results - sent)
+                truncated = sent + len(batch) >= self.max_results and (loaded > self.max_results or not done)
+                if batch or done or truncated:
+                    self._emit(session, query, [dict(item, index=None) for item in batch], sent,
+                               done or truncated, 'remote', truncated, cursor.error if done else None)
+                    sent += len(batch)
+                if truncated:
+                    cursor.cancel()
+                    return
+                if done:
+                    break
+        finally:
+            with session.cond:
+                if session.running is cursor:
+                    session.running = None
+        if not cursor.error:
+            session.last = (scope, needle, list(cursor.items))
+
+
+search_sessions = SearchSessionManager(SEARCH_INDEX_CONFIG['debounce_ms'], SEARCH_INDEX_CONFIG['live_max_results'])
+
+
+class DirectorySizeJob:
+    """One running size computation; totals grow while the scan is in progress."""
+
+    def __init__(self, server_ip, path):
+        self.id = uuid.uuid4().hex
+        self.server_ip = server_ip
+        self.path = path
+        self.size_bytes = 0
+        self.file_count = 0
+        self.dir_count = 0
+        self.scanned_dirs = 0
+        self.reused_dirs = 0
+        self.done = False
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.last_progress = 0.0
+        self.event = threading.Event()
+
+    def snapshot(self):
+        return {
+            'job_id': self.id,
+            'server': self.server_ip,
+            'path': self.path,
+            'size_bytes': self.size_bytes,
+            'human_size': _human_readable_size(self.size_bytes),
+            'file_count': self.file_count,
+            'dir_count': self.dir_count,
+            'scanned_dirs': self.scanned_dirs,
+            'reused_dirs': self.reused_dirs,
+            'done': self.done,
+            'error': self.error,
+            'elapsed': round((self.finished_at or time.time()) - self.started_at, 2)
+        }
 
 
+class DirectorySizeService:
+    """Exact recursive sizes computed in the background, cached per directory keyed by its mtime.
 
+    A node holds (mtime, own file bytes, own file count, child dirs). Unchanged directories are
+    not listed again, so a repeat request only stats (local) or enumerates (remote) directories.
+    In-place file growth that leaves the parent mtime untouched is picked up once the directory changes.
+    """
 
+    JOB_RETENTION = 300
 
+    def __init__(self, progress_interval, max_dirs):
+        self.progress_interval = progress_interval
+        self.max_dirs = max(1, int(max_dirs))
+        self.nodes = {}
+        self.jobs = {}
+        self.active = {}
+        self.lock = threading.Lock()
 
+    def request(self, server_ip, path):
+        """Return the running job for this path or start a new one."""
+        if not is_windows_server(server_ip) and len(path) > 1:
+            path = path.rstrip('/')
+        key = (server_ip, path)
+        with self.lock:
+            now = time.time()
+            for job_id, old in list(self.jobs.items()):
+                if old.done and now - old.finished_at > self.JOB_RETENTION:
+                    self.jobs.pop(job_id, None)
+            job = self.active.get(key)
+            if job is not None:
+                return job
+            job = DirectorySizeJob(server_ip, path)
+            self.jobs[job.id] = job
+            self.active[key] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
 
+    def clear(self, server_ip=None):
+        with self.lock:
+            if server_ip is None:
+                self.nodes.clear()
+            else:
+                self.nodes.pop(server_ip, None)
 
+    def _server_nodes(self, server_ip):
+        with self.lock:
+            nodes = self.nodes.get(server_ip)
+            if nodes is None or len(nodes) > self.max_dirs:
+                nodes = self.nodes[server_ip] = {}
+            return nodes
+
+    def _progress(self, job, force=False):
+        now = time.time()
+        if not force and now - job.last_progress < self.progress_interval:
+            return
+        job.last_progress = now
+        try:
+            socketio.emit('size_progress', job.snapshot())
+        except Exception:
+            pass
 
+    def _run(self, job):
+        try:
+            if is_local_server(job.server_ip) and not is_windows_server(job.server_ip):
+                self._scan_local(job)
+            elif is_windows_server(job.server_ip):
+                self._scan_windows(job)
+            else:
+                self._scan_remote(job)
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            job.done = True
+            job.finished_at = time.time()
+            with self.lock:
+                if self.active.get((job.server_ip, job.path)) is job:
+                    self.active.pop((job.server_ip, job.path), None)
+            job.event.set()
+            self._progress(job, force=True)
+
+    @staticmethod
+    def _drop_subtree(nodes, path):
+        stack = [path]
+        while stack:
+            node = nodes.pop(stack.pop(), None)
+            if node is not None:
+                stack.extend(node[3])
+
+    def _replace(self, nodes, path, node):
+        old = nodes.get(path)
+        if old is not None:
+            kept = set(node[3])
+            for child in old[3]:
+                if child not in kept:
+                    self._drop_subtree(nodes, child)
+        nodes[path] = node
+
+    def _scan_local(self, job):
+        root = job.path
+        if not os.path.lexists(root):
+            raise FileNotFoundError('路径不存在')
+        if not os.path.isdir(root) or os.path.islink(root):
+            job.size_bytes = os.lstat(root).st_size
+            job.file_count = 1
+            return
+        nodes = self._server_nodes(job.server_ip)
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.lstat(directory).st_mtime_ns
+            except OSError:
+                continue
+            node = nodes.get(directory)
+            if node is None or node[0] != mtime:
+                own_bytes = own_files = 0
+                children = []
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    children.append(entry.path)
+                                else:
+                                    own_bytes += entry.stat(follow_symlinks=False).st_size
+                                    own_files += 1
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                node = (mtime, own_bytes, own_files, tuple(children))
+                self._replace(nodes, directory, node)
+                job.scanned_dirs += 1
+            else:
+                job.reused_dirs += 1
+            job.size_bytes += node[1]
+            job.file_count += node[2]
+            job.dir_count += 1
+            stack.extend(node[3])
+            self._progress(job)
+
+    def _stream(self, job, command, field_count, handle, stdin_data=None):
+        exit_code, _ = _stream_remote_fields(job.server_ip, command, field_count, handle, stdin_data,
+                                             on_chunk=lambda: self._progress(job))
+        return exit_code
+
+    def _scan_remote(self, job):
+        root = job.path
+        quoted_root = shlex.quote(root)
+        nodes = self._server_nodes(job.server_ip)
+        own = {}
+        mtimes = {}
+
+        if root not in nodes:
+            # First visit: one find emits every directory (mtime, path) and every file (size, parent).
+            def handle_full(fields):
+                for i in range(0, len(fields), 3):
+                    kind, value, path = fields[i], fields[i + 1], fields[i + 2]
+                    if kind == 'd':
+                        mtimes[path] = value
+                        own.setdefault(path, [0, 0])
+                        job.dir_count += 1
+                        job.scanned_dirs += 1
+                    else:
+                        size = int(value or 0)
+                        totals = own.setdefault(path, [0, 0])
+                        totals[0] += size
+                        totals[1] += 1
+                        job.size_bytes += size
+                        job.file_count += 1
+
+            command = (
+                f"LC_ALL=C find {quoted_root} \\( -type d -printf 'd\\0%T@\\0%p\\0' \\) "
+                f"-o -printf 'f\\0%s\\0%h\\0'"
+            )
+            exit_code = self._stream(job, command, 3, handle_full)
+            if not mtimes and not job.file_count:
+                raise RuntimeError(f'路径不存在或无法访问 (find 退出码 {exit_code})')
+        else:
+            # Revisit: enumerate directories only, then re-list the ones whose mtime moved.
+            def handle_dirs(fields):
+                for i in range(0, len(fields), 2):
+                    mtimes[fields[i + 1]] = fields[i]
+                    job.dir_count += 1
+
+            exit_code = self._stream(job, f"LC_ALL=C find {quoted_root} -type d -printf '%T@\\0%p\\0'", 2, handle_dirs)
+            if not mtimes:
+                raise RuntimeError(f'路径不存在或无法访问 (find 退出码 {exit_code})')
+            changed = []
+            for path, mtime in mtimes.items():
+                node = nodes.get(path)
+                if node is not None and node[0] == mtime:
+                    own[path] = [node[1], node[2]]
+                    job.reused_dirs += 1
+                else:
+                    own[path] = [0, 0]
+                    changed.append(path)
+            job.scanned_dirs = len(changed)
+            job.size_bytes = sum(totals[0] for totals in own.values())
+            job.file_count = sum(totals[1] for totals in own.values())
+
+            def handle_files(fields):
+                for i in range(0, len(fields), 2):
+                    size = int(fields[i] or 0)
+                    totals = own.get(fields[i + 1])
+                    if totals is not None:
+                        totals[0] += size
+                        totals[1] += 1
+                    job.size_bytes += size
+                    job.file_count += 1
+
+            if changed:
+                relist = (
+                    "LC_ALL=C xargs -0 -r sh -c "
+                    "'find \"$@\" -mindepth 1 -maxdepth 1 ! -type d -printf \"%s\\0%h\\0\"' _"
+                )
+                self._stream(job, relist, 2, handle_files, ('\0'.join(changed) + '\0').encode('utf-8', 'surrogateescape'))
+
+        children = {path: [] for path in mtimes}
+        for path in mtimes:
+            if path != root:
+                parent = children.get(os.path.dirname(path))
+                if parent is not None:
+                    parent.append(path)
+        for path, mtime in mtimes.items():
+            totals = own.get(path, (0, 0))
+            self._replace(nodes, path, (mtime, totals[0], totals[1], tuple(children[path])))
+
+    def _scan_windows(self, job):
+        safe_path = _escape_pwsh_literal(job.path)
+        ps_cmd = (
+            "powershell -NoProfile -Command "
+            f"\"if (Test-Path -LiteralPath '{safe_path}' -PathType Container) {{ "
+            f"$m = Get-ChildItem -LiteralPath '{safe_path}' -Recurse -Force -File -ErrorAction SilentlyContinue "
+            "| Measure-Object -Property Length -Sum; "
+            "@($m.Count, [int64]$m.Sum, 0) -join ' ' "
+            f"}} elseif (Test-Path -LiteralPath '{safe_path}' -PathType Leaf) {{ "
+            f"@(1, (Get-Item -LiteralPath '{safe_path}').Length, 0) -join ' ' "
+            "} else { 'NOTFOUND' }\""
+        )
+        output, error, exit_code = ssh_manager.execute_command(job.server_ip, ps_cmd)
+        text = (output or '').strip()
+        if text.upper().startswith('NOTFOUND'):
+            raise FileNotFoundError('路径不存在')
+        parts = text.split()
+        if exit_code != 0 or len(parts) != 3:
+            raise RuntimeError(error or f'解析大小失败: {text}')
+        job.file_count, job.size_bytes, job.dir_count = (int(part) for part in parts)
 
 
-            for line in output.strip().split('\n'):
+directory_sizes = DirectorySizeService(DIR_SIZE_CONFIG['progress_interval'], DIR_SIZE_CONFIG['max_dirs'])
 
+class FilenameIndex:
+    """Recursive filename index for one server root: compact columns plus a lowercase trigram index.
 
+    Entry ids are stable; deletions set a tombstone flag and are skipped at query time.
+    """
 
-                if not line:
+    FLAG_DIR = 1
+    FLAG_DELETED = 2
+
+    def __init__(self, server_ip, root):
+        self.server_ip = server_ip
+        self.root = self._norm(root)
+        self.names = []
+        self.parents = array('I')
+        self.flags = bytearray()
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.dirs = []
+        self.dir_ids = {}
+        self.children = {}
+        self.trigrams = {}
+        self.short_ids = array('I')
+        self.deleted = 0
+        self.built_at = None
+        self.updated_at = None
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _norm(path):
+        text = str(path or '').replace('\\', '/')
+        return text.rstrip('/') or '/'
+
+    @staticmethod
+    def _grams(lower_name):
+        return {lower_name[i:i + 3] for i in range(len(lower_name) - 2)}
+
+    def covers(self, path):
+        path = self._norm(path)
+        return self.root == '/' or path == self.root or path.startswith(self.root + '/')
+
+    def _dir_id(self, path):
+        path = self._norm(path)
+        dir_id = self.dir_ids.get(path)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(sys.intern(path))
+            self.dir_ids[path] = dir_id
+        return dir_id
+
+    def full_path(self, entry_id):
+        parent = self.dirs[self.parents[entry_id]]
+        return (parent if parent.endswith('/') else parent + '/') + self.names[entry_id]
+
+    def add(self, parent_path, name, is_dir, size, mtime):
+        """Append one entry; caller holds the lock and has checked it is new."""
+        entry_id = len(self.names)
+        parent_id = self._dir_id(parent_path)
+        name = sys.intern(name)
+        self.names.append(name)
+        self.parents.append(parent_id)
+        self.flags.append(self.FLAG_DIR if is_dir else 0)
+        self.sizes.append(int(size or 0))
+        self.mtimes.append(float(mtime or 0))
+        posting = self.children.get(parent_id)
+        if posting is None:
+            posting = self.children[parent_id] = array('I')
+        posting.append(entry_id)
+        lower = name.lower()
+        if len(lower) < 3:
+            self.short_ids.append(entry_id)
+        for gram in self._grams(lower):
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                posting = self.trigrams[gram] = array('I')
+            posting.append(entry_id)
+        return entry_id
+
+    def _live_children(self, parent_path):
+        parent_id = self.dir_ids.get(self._norm(parent_path))
+        if parent_id is None:
+            return {}
+        return {self.names[i]: i for i in self.children.get(parent_id, ()) if not self.flags[i] & self.FLAG_DELETED}
+
+    def _delete(self, entry_id):
+        """Tombstone an entry and, for a directory, its subtree by walking the children postings."""
+        stack = [entry_id]
+        while stack:
+            entry_id = stack.pop()
+            if self.flags[entry_id] & self.FLAG_DELETED:
+                continue
+            self.flags[entry_id] |= self.FLAG_DELETED
+            self.deleted += 1
+            if self.flags[entry_id] & self.FLAG_DIR:
+                dir_id = self.dir_ids.get(self.full_path(entry_id))
+                if dir_id is not None:
+                    stack.extend(self.children.get(dir_id, ()))
+
+    def upsert(self, parent_path, name, is_dir, size, mtime, known=None):
+        """Insert or refresh one entry; known caches parent -> {name: id} across a merge."""
+        parent_path = self._norm(parent_path)
+        if known is None:
+            siblings = self._live_children(parent_path)
+        else:
+            siblings = known.get(parent_path)
+            if siblings is None:
+                siblings = known[parent_path] = self._live_children(parent_path)
+        entry_id = siblings.get(name)
+        if entry_id is not None and bool(self.flags[entry_id] & self.FLAG_DIR) == bool(is_dir):
+            self.sizes[entry_id] = int(size or 0)
+            self.mtimes[entry_id] = float(mtime or 0)
+            return entry_id
+        if entry_id is not None:
+            self._delete(entry_id)
+        entry_id = self.add(parent_path, name, is_dir, size, mtime)
+        siblings[name] = entry_id
+        return entry_id
+
+    def apply_listing(self, dir_path, items, complete):
+        """Merge one directory listing; hidden names are only removed when the listing included them."""
+        with self.lock:
+            live = self._live_children(dir_path)
+            seen = set()
+            known = {self._norm(dir_path): live}
+            for item in items:
+                name = str(item.get('name', ''))
+                if not name:
                     continue
-
-                parts = line.split()
-                if len(parts) < 8:
+                seen.add(name)
+                self.upsert(dir_path, name, item.get('is_directory'), item.get('size'),
+                            _get_item_modified_ts(item), known)
+            for name, entry_id in list(live.items()):
+                if name in seen:
                     continue
+                if not complete and (name.startswith('.') or name in _WINSCP_HIDDEN_CANDIDATES):
+                    continue
+                self._delete(entry_id)
+            self.updated_at = time.time()
 
-                permissions = parts[0]
-                size = parts[4]
-                date_parts = parts[5:7]
-                name = ' '.join(parts[7:])
-
+    def remove_path(self, path):
+        path = self._norm(path)
+        parent, _, name = path.rpartition('/')
+        with self.lock:
+            entry_id = self._live_children(parent or '/').get(name)
+            if entry_id is not None:
+                self._delete(entry_id)
+                self.updated_at = time.time()
+
+    def _candidates(self, literal):
+        """Entry ids that may contain literal (lowercase); None means scan everything."""
+        if len(literal) < 3:
+            return None
+        postings = []
+        for gram in self._grams(literal):
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                return array('I')
+            postings.append(posting)
+        postings.sort(key=len)
+        if len(postings) == 1:
+            return postings[0]
+        rest = set(postings[1])
+        return [i for i in postings[0] if i in rest]
+
+    def query(self, text, mode='substring', limit=50, within=None, show_hidden=False):
+        """Ranked matches: exact, prefix, word-start, then other hits; shallower and shorter names first."""
+        needle = str(text or '').strip().lower()
+        if not needle:
+            return [], 0
+        if mode == 'glob':
+            matcher = re.compile(fnmatch.translate(needle), re.IGNORECASE).match
+            # Bracket classes match one of several characters, so only text outside them is required.
+            outside = re.sub(r'\[[!^]?\]?[^\]]*\]', '\0', needle)
+            literals = [part for part in re.split(r'[*?\0]+', outside) if part]
+            literal = max(literals, key=len) if literals else ''
+        else:
+            matcher = None
+            literal = needle
+        within = self._norm(within) if within else None
+        with self.lock:
+            candidates = self._candidates(literal)
+            if candidates is None:
+                candidates = range(len(self.names))
+            names, flags, parents, dirs = self.names, self.flags, self.parents, self.dirs
+            hits = []
+            for entry_id in candidates:
+                if flags[entry_id] & self.FLAG_DELETED:
+                    continue
+                name = names[entry_id]
+                lower = name.lower()
+                if matcher is not None:
+                    if not matcher(lower):
+                        continue
+                    pos = lower.find(literal) if literal else 0
+                else:
+                    pos = lower.find(needle)
+                    if pos < 0:
+                        continue
                 if not show_hidden and name.startswith('.'):
                     continue
-
-
-                if name in ['.', '..']:
+                parent = dirs[parents[entry_id]]
+                if within and not (parent == within or parent.startswith(within.rstrip('/') + '/')):
                     continue
+                if lower == needle:
+                    rank = 0
+                elif pos == 0:
+                    rank = 1
+                elif pos > 0 and not lower[pos - 1].isalnum():
+                    rank = 2
+                else:
+                    rank = 3
+                hits.append((rank, parent.count('/'), len(name), name, entry_id))
+            total = len(hits)
+            top = heapq.nsmallest(max(1, int(limit)), hits)
+            results = [{
+                'name': names[entry_id],
+                'path': self.full_path(entry_id),
+                'parent': dirs[parents[entry_id]],
+                'is_directory': bool(flags[entry_id] & self.FLAG_DIR),
+                'size': self.sizes[entry_id],
+                'modified_ts': self.mtimes[entry_id],
+                'rank': rank,
+            } for rank, _, _, _, entry_id in top]
+        return results, total
+
+    def get_stats(self):
+        with self.lock:
+            entries = len(self.names)
+            memory = (sys.getsizeof(self.names) + sum(sys.getsizeof(n) for n in self.names)
+                      + len(self.parents) * 4 + len(self.flags) + len(self.sizes) * 8 + len(self.mtimes) * 8
+                      + sum(len(p) * 4 + 64 for p in self.trigrams.values())
+                      + sum(len(p) * 4 + 64 for p in self.children.values()))
+            return {
+                'root': self.root,
+                'entries': entries - self.deleted,
+                'tombstones': self.deleted,
+                'directories': len(self.dirs),
+                'trigrams': len(self.trigrams),
+                'memory_bytes': memory,
+                'memory': _human_readable_size(memory),
+                'built_at': self.built_at,
+                'updated_at': self.updated_at,
+            }
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('lock', None)
+        return state
 
-                if not show_hidden:
-                    if is_winscp_hidden_file(name, permissions, path):
-                        continue
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
 
-                is_directory = permissions.startswith('d')
 
-                items.append({
-                    "name": name,
-                    "path": os.path.join(path, name),
-                    "is_directory": is_directory,
-                    "size": int(size) if size.isdigit() else 0,
-                    "modified": ' '.join(date_parts),
-                    "modified_ts": _coerce_modified_timestamp(' '.join(date_parts))
-                })
+class FilenameIndexService:
+    """Per-server FilenameIndex instances with a background worker each for crawls and incremental merges."""
+
+    def __init__(self, index_dir, save_interval, crawl_timeout):
+        self.index_dir = index_dir
+        self.save_interval = max(10.0, float(save_interval))
+        self.crawl_timeout = max(60.0, float(crawl_timeout))
+        self.indexes = {}
+        self.status = {}
+        self.queues = {}
+        self.dirty_since = {}
+        self.lock = threading.Lock()
 
-            items = sort_file_items(items, sort_by, sort_order)
-            set_cached_listing(server_ip, path, show_hidden, items, sort_by, sort_order)
-            return items
+    def _snapshot_path(self, server_ip):
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', str(server_ip))
+        return os.path.join(self.index_dir, f"{safe}.pkl")
 
-def get_directory_listing_optimized(server_ip, path=None, show_hidden=False, sort_by=BROWSE_SORT_BY_NAME, sort_order=BROWSE_SORT_ORDER_ASC):
-    """Optimized directory listing focused on response speed."""
+    def get(self, server_ip):
+        with self.lock:
+            if server_ip in self.indexes:
+                return self.indexes[server_ip]
+        index = None
+        try:
+            with open(self._snapshot_path(server_ip), 'rb') as f:
+                index = pickle.load(f)
+        except FileNotFoundError:
+            index = None
+        except Exception as e:
+            print(f"⚠️  文件名索引快照读取失败 {server_ip}: {e}")
+        with self.lock:
+            return self.indexes.setdefault(server_ip, index)
 
+    def _submit(self, server_ip, task):
+        with self.lock:
+            tasks = self.queues.get(server_ip)
+            if tasks is None:
+                tasks = self.queues[server_ip] = queue.Queue()
+                threading.Thread(target=self._worker, args=(server_ip, tasks), daemon=True).start()
+        tasks.put(task)
 
-    if path is None:
-        path = get_default_path(server_ip)
+    def _worker(self, server_ip, tasks):
+        while True:
+            try:
+                task = tasks.get(timeout=self.save_interval)
+            except queue.Empty:
+                task = None
+            try:
+                if task is not None:
+                    task()
+            except Exception as e:
+                print(f"⚠️  文件名索引任务失败 {server_ip}: {e}")
+            dirty = self.dirty_since.get(server_ip)
+            if dirty and (task is None or time.time() - dirty >= self.save_interval):
+                self._save(server_ip)
+
+    def _mark_dirty(self, server_ip):
+        self.dirty_since.setdefault(server_ip, time.time())
+
+    def _save(self, server_ip):
+        index = self.indexes.get(server_ip)
+        self.dirty_since.pop(server_ip, None)
+        if index is None:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        target = self._snapshot_path(server_ip)
+        tmp = f"{target}.tmp"
+        with index.lock:
+            with open(tmp, 'wb') as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+
+    def build(self, server_ip, root):
+        """Queue a full crawl of root; the old index keeps serving until the new one is swapped in."""
+        self.status[server_ip] = {'state': 'queued', 'root': root, 'entries': 0, 'started_at': time.time()}
+        self._submit(server_ip, lambda: self._crawl(server_ip, root))
+
+    def _crawl(self, server_ip, root):
+        status = self.status[server_ip] = {'state': 'crawling', 'root': root, 'entries': 0, 'started_at': time.time()}
+        index = FilenameIndex(server_ip, root)
+        try:
+            if is_local_server(server_ip):
+                self._crawl_local(index, status)
+            else:
+                self._crawl_remote(index, status)
+        except Exception as e:
+            status.update({'state': 'error', 'error': str(e)})
+            return
+        index.built_at = index.updated_at = time.time()
+        with self.lock:
+            self.indexes[server_ip] = index
+        status.update({'state': 'ready', 'entries': len(index.names),
+                       'elapsed': round(time.time() - status['started_at'], 2)})
+        self._save(server_ip)
+        print(f"🔎 文件名索引完成: {server_ip}:{index.root} 共 {len(index.names)} 项")
+
+    def _crawl_local(self, index, status):
+        stack = [index.root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            stat_info = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        index.add(current, entry.name, is_dir, 0 if is_dir else stat_info.st_size, stat_info.st_mtime)
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+            status['entries'] = len(index.names)
+
+    def _crawl_remote(self, index, status, root=None, merge=False):
+        """Stream a recursive listing into index; merge=True upserts instead of appending."""
+        root = root or index.root
+        windows = is_windows_server(index.server_ip)
+        if windows:
+            win_root = root.replace('/', '\\')
+            script = (
+                f"Get-ChildItem -LiteralPath '{_escape_pwsh_literal(win_root)}' -Recurse -Force -ErrorAction SilentlyContinue"
+                " | ForEach-Object { '{0}{4}{1}{4}{2}{4}{3}' -f $(if($_.PSIsContainer){'d'}else{'f'}),"
+                " $(if($_.PSIsContainer){0}else{$_.Length}),"
+                " [int64](($_.LastWriteTimeUtc - [datetime]'1970-01-01').TotalSeconds), $_.FullName, [char]9 }"
+            )
+            command = f'powershell -NoProfile -Command "{script}"'
+            decoder = codecs.getincrementaldecoder('gbk')(errors='replace')
+        else:
+            min_depth = '0' if merge else '1'
+            command = (
+                f"LC_ALL=C find {shlex.quote(root)} -mindepth {min_depth} "
+                "-printf '%y\\0%s\\0%T@\\0%h\\0%f\\0'"
+            )
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        known = {} if merge else None
+        started = time.time()
+        with ssh_manager.lease(index.server_ip) as ssh:
+            if ssh is None:
+                raise RuntimeError(f"无法连接到服务器 {index.server_ip}")
+            channel = ssh.get_transport().open_session()
+            try:
+                channel.settimeout(self.crawl_timeout)
+                channel.exec_command(command)
+                buf = ''
+                while True:
+                    chunk = channel.recv(512 * 1024)
+                    if not chunk:
+                        break
+                    if time.time() - started > self.crawl_timeout:
+                        raise RuntimeError('索引扫描超时')
+                    buf += decoder.decode(chunk)
+                    if windows:
+                        records = buf.split('\n')
+                        buf = records.pop()
+                        rows = []
+                        for line in records:
+                            parts = line.rstrip('\r').split('\t', 3)
+                            if len(parts) != 4:
+                                continue
+                            parent, _, name = parts[3].replace('\\', '/').rpartition('/')
+                            rows.append((parts[0], parts[1], parts[2], parent, name))
+                    else:
+                        fields = buf.split('\0')
+                        cut = (len(fields) - 1) // 5 * 5
+                        buf = '\0'.join(fields[cut:])
+                        rows = zip(fields[0:cut:5], fields[1:cut:5], fields[2:cut:5], fields[3:cut:5], fields[4:cut:5])
+                    with index.lock:
+                        for kind, size, mtime, parent, name in rows:
+                            try:
+                                size, mtime = int(size or 0), float(mtime or 0)
+                            except ValueError:
+                                size, mtime = 0, 0.0
+                            if merge:
+                                index.upsert(parent, name, kind == 'd', size, mtime, known)
+                            else:
+                                index.add(parent, name, kind == 'd', size, mtime)
+                    if status is not None:
+                        status['entries'] = len(index.names)
+            finally:
+                channel.close()
+
+    def _merge_paths(self, server_ip, paths):
+        index = self.get(server_ip)
+        if index is None:
+            return
+        for path in paths:
+            if not index.covers(path):
+                continue
+            if is_local_server(server_ip):
+                path = index._norm(path)
+                parent, _, name = path.rpartition('/')
+                try:
+                    stat_info = os.lstat(path)
+                except OSError:
+                    index.remove_path(path)
+                    continue
+                is_dir = os.path.isdir(path) and not os.path.islink(path)
+                with index.lock:
+                    index.upsert(parent or '/', name, is_dir, 0 if is_dir else stat_info.st_size, stat_info.st_mtime)
+                if is_dir:
+                    sub = FilenameIndex(server_ip, path)
+                    self._crawl_local(sub, {})
+                    with index.lock:
+                        known = {}
+                        for entry_id, name in enumerate(sub.names):
+                            index.upsert(sub.dirs[sub.parents[entry_id]], name, sub.flags[entry_id] & sub.FLAG_DIR,
+                                         sub.sizes[entry_id], sub.mtimes[entry_id], known)
+            else:
+                self._crawl_remote(index, None, root=path, merge=True)
+        index.updated_at = time.time()
+        self._mark_dirty(server_ip)
+
+    def note_listing(self, server_ip, path, items, complete):
+        """Fold a directory listing TurboFile just fetched into the server's index."""
+        index = self.indexes.get(server_ip)
+        if index is None or not index.covers(path):
+            return
 
+        def _apply():
+            index.apply_listing(path, items, complete)
+            self._mark_dirty(server_ip)
 
-    cached_result = get_cached_listing(server_ip, path, show_hidden, sort_by, sort_order)
-    if cached_result is not None:
-        return cached_result
+        self._submit(server_ip, _apply)
 
+    def note_changed(self, server_ip, paths):
+        """Re-crawl paths created or modified by a transfer (recursively for directories)."""
+        index = self.indexes.get(server_ip)
+        paths = [p for p in (paths or []) if p]
+        if index is None or not paths:
+            return
+        self._submit(server_ip, lambda: self._merge_paths(server_ip, paths))
 
-    if is_local_server(server_ip):
+    def note_removed(self, server_ip, paths):
+        index = self.indexes.get(server_ip)
+        if index is None:
+            return
 
-        try:
-            items = []
+        def _remove():
+            for path in paths or []:
+                if path and index.covers(path):
+                    index.remove_path(path)
+            self._mark_dirty(server_ip)
 
-            with os.scandir(path) as entries:
-                for entry in entries:
-                    if not show_hidden and entry.name.startswith('.'):
-                        continue
+        self._submit(server_ip, _remove)
 
-                    try:
-                        stat_info = entry.stat()
-                        is_dir = entry.is_dir()
-                        size = 0 if is_dir else stat_info.st_size
-                        mtime = stat_info.st_mtime
+    def drop(self, server_ip):
+        with self.lock:
+            self.indexes[server_ip] = None
+        self.status.pop(server_ip, None)
+        self.dirty_since.pop(server_ip, None)
+        try:
+            os.remove(self._snapshot_path(server_ip))
+        except OSError:
+            pass
 
-                        items.append({
-                            "name": entry.name,
-                            "path": os.path.join(path, entry.name),
-                            "is_directory": is_dir,
-                            "size": size,
-                            "modified": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
-                            "modified_ts": int(mtime)
-                        })
-                    except (OSError, PermissionError):
+    def get_status(self, server_ip):
+        index = self.get(server_ip)
+        return {
+            'status': dict(self.status.get(server_ip) or {'state': 'ready' if index else 'missing'}),
+            'index': index.get_stats() if index is not None else None,
+        }
 
-                        continue
 
-            items = sort_file_items(items, sort_by, sort_order)
-            set_cached_listing(server_ip, path, show_hidden, items, sort_by, sort_order)
-            return items
-        except Exception:
-            return []
-    else:
+filename_indexes = FilenameIndexService(
+    SEARCH_INDEX_CONFIG['index_dir'],
+    SEARCH_INDEX_CONFIG['save_interval'],
+    SEARCH_INDEX_CONFIG['crawl_timeout'],
+)
 
-        return get_directory_listing(server_ip, path, show_hidden, sort_by, sort_order)
 
 def start_speed_update_timer(transfer_id, source_server, target_server):
     """Start the speed update timer to improve transfer performance."""
@@ -1993,9 +5381,9 @@ def start_speed_update_timer(transfer_id, source_server, target_server):
                 current_time = time.time()
 
 
-                simulated_speed = None
-                if current_time - last_speed_update >= 0.1:
-                    simulated_speed = speed_simulator.get_simulated_speed(transfer_id)
+                rate_snapshot = None
+                if current_time - last_speed_update >= PERFORMANCE_CONFIG.get('speed_update_interval', 1):
+                    rate_snapshot = rate_tracker.snapshot(transfer_id)
                     last_speed_update = current_time
 
 
@@ -2012,7 +5400,7 @@ def start_speed_update_timer(transfer_id, source_server, target_server):
                     last_bytes_update = current_time
 
 
-                if simulated_speed is not None or elapsed_time is not None or transferred_human is not None:
+                if rate_snapshot is not None or elapsed_time is not None or transferred_human is not None:
 
                     is_local_source = is_local_server(source_server)
                     is_local_target = is_local_server(target_server)
@@ -2033,8 +5421,15 @@ def start_speed_update_timer(transfer_id, source_server, target_server):
                     }
 
 
-                    if simulated_speed is not None:
-                        update_data['speed'] = simulated_speed
+                    if rate_snapshot is not None and rate_snapshot.get('has_samples'):
+                        eta_seconds = rate_snapshot.get('eta_seconds')
+                        update_data['speed'] = rate_tracker.format_speed(rate_snapshot['speed_ewma'])
+                        update_data['speed_bytes'] = rate_snapshot['speed_ewma']
+                        update_data['speed_instant'] = rate_snapshot['speed_instant']
+                        update_data['speed_average'] = rate_snapshot['speed_average']
+                        update_data['eta_seconds'] = eta_seconds
+                        update_data['eta'] = time_tracker.format_time(eta_seconds) if eta_seconds is not None else None
+                        update_data['parts'] = rate_snapshot['parts']
                     if elapsed_time is not None:
                         update_data['elapsed_time'] = elapsed_time
                     if transferred_human is not None:
@@ -2204,12 +5599,26 @@ def _clear_transfer_listing_cache(source_server, target_server, source_files, ta
     try:
         if target_server and target_path:
             clear_cached_listing(target_server, target_path)
+            target_base = str(target_path).replace('\\', '/').rstrip('/')
+            filename_indexes.note_changed(target_server, [
+                f"{target_base}/{os.path.basename(_normalize_batch_path(info.get('path', '')).rstrip('/'))}"
+                for info in source_files or [] if info.get('path')
+            ])
+            if mode == 'move':
+                filename_indexes.note_removed(source_server, [info.get('path') for info in source_files or []])
     except Exception:
         pass
 
     if mode != 'move':
         return
 
+    try:
+        for info in source_files or []:
+            if info.get('is_directory'):
+                clear_cached_listing(source_server, _normalize_batch_path(info.get('path', '')), recursive=True)
+    except Exception:
+        pass
+
     try:
         source_is_windows = is_windows_server(source_server)
         parent = _get_batch_parent(source_files, source_is_windows)
@@ -2253,6 +5662,12 @@ def transfer_batch_instant(transfer_id, source_server, source_files, target_serv
     rsync_opts = _build_batch_rsync_opts(source_is_windows, target_is_windows)
     rsync_opts_str = ' '.join(rsync_opts)
 
+    batch_parent = _get_batch_parent(source_files, source_is_windows)
+    batch_members = [os.path.basename(_normalize_batch_path(f.get('path', ''))) for f in source_files]
+    if all(batch_members) and _try_tar_stream_transfer(
+            transfer_id, source_server, batch_parent, batch_members, target_server, target_path, mode):
+        return {'success': True, 'completed': len(source_files), 'failed': 0}
+
     try:
         if transfer_mode == 'local_to_remote':
             target_user = SERVERS[target_server]['user']
@@ -2347,11 +5762,11 @@ def transfer_batch_instant(transfer_id, source_server, source_files, target_serv
                 else:
                     remote_cmd = f"rsync {rsync_opts_str} -e {shlex.quote(ssh_to_source)} {sources_arg} {target_dest}"
 
-                ssh = ssh_manager.get_connection(exec_server)
-                if not ssh:
-                    raise Exception(f"无法连接到目标服务器 {exec_server}")
-                part_id = f"rsync_{uuid.uuid4().hex}"
-                exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+                with ssh_manager.lease(exec_server) as ssh:
+                    if not ssh:
+                        raise Exception(f"无法连接到目标服务器 {exec_server}")
+                    part_id = f"rsync_{uuid.uuid4().hex}"
+                    exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
                 if exit_status != 0:
                     return {'success': False, 'message': f'rsync exit {exit_status}: {error}'}
             else:
@@ -2387,11 +5802,11 @@ def transfer_batch_instant(transfer_id, source_server, source_files, target_serv
                 else:
                     remote_cmd = f"rsync {rsync_opts_str} -e {shlex.quote(ssh_to_target)} {sources_arg} {dest}"
 
-                ssh = ssh_manager.get_connection(exec_server)
-                if not ssh:
-                    raise Exception(f"无法连接到源服务器 {exec_server}")
-                part_id = f"rsync_{uuid.uuid4().hex}"
-                exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+                with ssh_manager.lease(exec_server) as ssh:
+                    if not ssh:
+                        raise Exception(f"无法连接到源服务器 {exec_server}")
+                    part_id = f"rsync_{uuid.uuid4().hex}"
+                    exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
                 if exit_status != 0:
                     return {'success': False, 'message': f'rsync exit {exit_status}: {error}'}
         else:
@@ -2454,6 +5869,10 @@ def transfer_directory_contents_instant(transfer_id, source_server, source_dir,
         src_with_slash = src_dir.rstrip('/') + '/'
         tgt_with_slash = tgt_dir.rstrip('/') + '/'
 
+        if _try_tar_stream_transfer(transfer_id, source_server, src_dir_raw, ['.'], target_server, tgt_dir_raw, mode,
+                                    _build_rsync_excludes_for_dir(source_dir, exclude_paths or [])):
+            return {'success': True}
+
         rsync_opts = [
             "-a",
             "--inplace",
@@ -2481,12 +5900,10 @@ def transfer_directory_contents_instant(transfer_id, source_server, source_dir,
         _append_rsync_progress_opts(rsync_opts)
         rsync_opts_str = ' '.join(rsync_opts)
 
-        ssh = None
+        exec_server = None
 
         if source_server == target_server:
-            ssh = ssh_manager.get_connection(source_server)
-            if not ssh:
-                raise Exception(f"无法连接到源服务器 {source_server}")
+            exec_server = source_server
             remote_cmd = f"rsync {rsync_opts_str} {shlex.quote(src_with_slash)} {shlex.quote(tgt_with_slash)}"
         elif source_is_windows and not target_is_windows:
             source_user = SERVERS[source_server]['user']
@@ -2510,13 +5927,9 @@ def transfer_directory_contents_instant(transfer_id, source_server, source_dir,
                     f"{source_spec} {shlex.quote(tgt_with_slash)}"
                 )
 
-            ssh = ssh_manager.get_connection(target_server)
-            if not ssh:
-                raise Exception(f"无法连接到目标服务器 {target_server}")
+            exec_server = target_server
         else:
-            ssh = ssh_manager.get_connection(source_server)
-            if not ssh:
-                raise Exception(f"无法连接到源服务器 {source_server}")
+            exec_server = source_server
             target_user = SERVERS[target_server]['user']
             target_password = SERVERS[target_server].get('password')
 
@@ -2540,8 +5953,11 @@ def transfer_directory_contents_instant(transfer_id, source_server, source_dir,
                 )
 
         emit_transfer_log(transfer_id, f"📁 全选目录传输: {source_dir} -> {target_server}:{target_path}")
-        part_id = f"rsync_{uuid.uuid4().hex}"
-        exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+        with ssh_manager.lease(exec_server) as ssh:
+            if not ssh:
+                raise Exception(f"无法连接到服务器 {exec_server}")
+            part_id = f"rsync_{uuid.uuid4().hex}"
+            exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
         if exit_status != 0:
             return {'success': False, 'message': f'rsync exit {exit_status}: {error}'}
 
@@ -2562,8 +5978,180 @@ def transfer_directory_contents_instant(transfer_id, source_server, source_dir,
         return {'success': False, 'message': str(e)}
 
 
-def start_instant_parallel_transfer(transfer_id, source_server, source_files, target_server, target_path, mode="copy", fast_ssh=True, parallel_enabled=True, select_all=False, source_dir="", exclude_paths=None):
+TRANSFER_PRIORITIES = {'high': 1, 'normal': 0, 'low': -1}
+
+
+def parse_transfer_priority(value):
+    """Map 'high'/'normal'/'low' (or an int) to a queue priority; higher runs first."""
+    if isinstance(value, str) and value.strip().lower() in TRANSFER_PRIORITIES:
+        return TRANSFER_PRIORITIES[value.strip().lower()]
+    try:
+        return max(-10, min(10, int(value)))
+    except (TypeError, ValueError):
+        return 0
+
+
+class TransferScheduler:
+    """Admission control for transfers: a job waits until the global, per-server and per-link caps have room.
+
+    Among the admissible jobs the highest priority wins (aged by one level per `aging_seconds` waited),
+    then the client with the fewest running transfers, then FIFO order. Queued jobs are told their
+    position over Socket.IO whenever it changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = []
+        self.running = {}
+        self.seq = 0
+
+    @staticmethod
+    def _server_key(server_ip):
+        return 'localhost' if is_local_server(server_ip) else server_ip
+
+    def submit(self, transfer_id, start, source_server, target_server, client_ip='', priority=0, sid=None):
+        """Queue a transfer; `start()` runs once it is admitted. Returns the queue position, 0 when started now."""
+        if not TRANSFER_SCHEDULER_CONFIG['enabled']:
+            start()
+            return 0
+        job = {
+            'id': transfer_id,
+            'start': start,
+            'source': self._server_key(source_server),
+            'target': self._server_key(target_server),
+            'client': client_ip or '',
+            'priority': priority,
+            'queued_at': time.time(),
+            'sid': sid,
+            'position': None
+        }
+        with self.lock:
+            self.seq += 1
+            job['seq'] = self.seq
+            self.queue.append(job)
+        self._pump()
+        with self.lock:
+            return 0 if transfer_id in self.running else (job['position'] or 0)
+
+    def release(self, transfer_id):
+        """A transfer finished or was cancelled: free its slots and admit whatever now fits."""
+        with self.lock:
+            if self.running.pop(transfer_id, None) is None:
+                return
+        self._pump()
+
+    def cancel(self, transfer_id):
+        """Drop a job that is still queued; False when it is not waiting (running or unknown)."""
+        with self.lock:
+            job = next((job for job in self.queue if job['id'] == transfer_id), None)
+            if job is None:
+                return False
+            self.queue.remove(job)
+        self._pump()
+        return True
+
+    def snapshot(self):
+        with self.lock:
+            now = time.time()
+            queued = sorted(self.queue, key=lambda job: self._rank(job, now))
+            return {
+                'running': [{'transfer_id': job['id'], 'source': job['source'], 'target': job['target'],
+                             'client_ip': job['client']} for job in self.running.values()],
+                'queued': [{'transfer_id': job['id'], 'source': job['source'], 'target': job['target'],
+                            'client_ip': job['client'], 'priority': job['priority'], 'position': index,
+                            'waited': round(now - job['queued_at'], 1)} for index, job in enumerate(queued, 1)]
+            }
+
+    def _rank(self, job, now):
+        aged = job['priority'] + int((now - job['queued_at']) / TRANSFER_SCHEDULER_CONFIG['aging_seconds'])
+        share = sum(1 for other in self.running.values() if other['client'] == job['client'])
+        return (-aged, share, job['seq'])
+
+    def _admissible(self, job):
+        per_server = TRANSFER_SCHEDULER_CONFIG['per_server']
+        link = 0
+        load = {}
+        for other in self.running.values():
+            for server in {other['source'], other['target']}:
+                load[server] = load.get(server, 0) + 1
+            if {other['source'], other['target']} == {job['source'], job['target']}:
+                link += 1
+        if link >= TRANSFER_SCHEDULER_CONFIG['per_link']:
+            return False
+        return all(load.get(server, 0) < per_server for server in {job['source'], job['target']})
+
+    def _pump(self):
+        started = []
+        moved = []
+        with self.lock:
+            now = time.time()
+            while self.queue and len(self.running) < TRANSFER_SCHEDULER_CONFIG['max_active']:
+                candidates = [job for job in self.queue if self._admissible(job)]
+                if not candidates:
+                    break
+                job = min(candidates, key=lambda job: self._rank(job, now))
+                self.queue.remove(job)
+                self.running[job['id']] = job
+                started.append(job)
+            for position, job in enumerate(sorted(self.queue, key=lambda job: self._rank(job, now)), 1):
+                if job['position'] != position:
+                    if job['position'] is not None:
+                        moved.append((job, position))
+                    job['position'] = position
+        for job in started:
+            if job['position'] is not None:
+                self._notify(job, 0)
+            try:
+                job['start']()
+            except Exception as e:
+                print(f"[SCHEDULER] 启动传输任务失败 {job['id']}: {e}")
+                self.release(job['id'])
+        for job, position in moved:
+            self._notify(job, position)
+
+    def _notify(self, job, position):
+        if not job['sid']:
+            return
+        message = '排队结束，开始传输' if position == 0 else f'排队中，前方还有 {position - 1} 个任务'
+        try:
+            socketio.emit('transfer_queued', {
+                'transfer_id': job['id'],
+                'position': position,
+                'message': message
+            }, room=job['sid'])
+        except Exception:
+            pass
+
+
+transfer_scheduler = TransferScheduler()
+
+
+def start_instant_parallel_transfer(transfer_id, source_server, source_files, target_server, target_path, mode="copy", fast_ssh=True, parallel_enabled=True, select_all=False, source_dir="", exclude_paths=None, resume=False):
     """Start instant parallel transfer tasks without pre-analysis."""
+    if resume:
+        # Items the interrupted run already finished are not sent again.
+        source_files = [f for f in source_files if not transfer_journal.unit_done(transfer_id, f"item:{f.get('path')}")]
+    else:
+        transfer_journal.begin(transfer_id, {
+            'source_server': source_server,
+            'source_files': source_files,
+            'target_server': target_server,
+            'target_path': target_path,
+            'mode': mode,
+            'fast_ssh': fast_ssh,
+            'parallel_enabled': parallel_enabled,
+            'select_all': select_all,
+            'source_dir': source_dir,
+            'exclude_paths': exclude_paths or [],
+            'client_ip': active_transfers.get(transfer_id, {}).get('client_ip'),
+            'priority': active_transfers.get(transfer_id, {}).get('priority', 0),
+            'rate_limit_kb': active_transfers.get(transfer_id, {}).get('rate_limit_kb', 0)
+        })
+    bandwidth_manager.register(
+        transfer_id, source_server, target_server,
+        limit=active_transfers.get(transfer_id, {}).get('rate_limit_kb', 0)
+    )
+
     def _log_transfer_summary(status: str, total_time: str = "", error: str = ""):
         meta = active_transfers.get(transfer_id, {})
         client_ip = meta.get('client_ip', '未知')
@@ -2601,10 +6189,7 @@ def start_instant_parallel_transfer(transfer_id, source_server, source_files, ta
                 total_files = len(source_files)
 
 
-            if (is_windows_server(source_server) or is_windows_server(target_server)):
-                speed_simulator.init_transfer_speed(transfer_id, 50.0, 55.0)
-            else:
-                speed_simulator.init_transfer_speed(transfer_id)
+            rate_tracker.start_transfer(transfer_id)
 
 
             start_speed_update_timer(transfer_id, source_server, target_server)
@@ -2612,6 +6197,17 @@ def start_instant_parallel_transfer(transfer_id, source_server, source_files, ta
 
             progress_manager.init_transfer(transfer_id, total_files)
 
+            if not total_files:
+                emit_transfer_bytes_snapshot(transfer_id)
+                socketio.emit('transfer_complete', {
+                    'transfer_id': transfer_id,
+                    'status': 'success',
+                    'message': '续传完成：所有项目在中断前已传输',
+                    'total_time': '00:00:00'
+                })
+                _log_transfer_summary('success', '00:00:00')
+                return
+
             if select_all and source_dir:
                 time_tracker.start_transfer(transfer_id)
                 result = transfer_directory_contents_instant(
@@ -2683,15 +6279,23 @@ def start_instant_parallel_transfer(transfer_id, source_server, source_files, ta
                     print(f"[INFO] 批量传输未启用或失败，回退并行模式: {batch_result.get('message')}")
 
 
-            max_workers = min(PARALLEL_TRANSFER_CONFIG['max_workers'], total_files)
+            max_workers = min(_stream_ceiling(), total_files)
 
             emit_transfer_log(transfer_id, f'⚡ 启动 {max_workers} 个并行传输线程...')
 
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Longest first: directories (size unknown up front) then files by size, so the
+            # executor's FIFO queue hands the biggest remaining item to whichever worker frees up.
+            ordered_files = sorted(
+                source_files,
+                key=lambda f: (not f.get('is_directory'), -int(f.get('size') or 0))
+            )
+
+            bandwidth_manager.reserve_streams(transfer_id, max_workers - 1)
+            with _stream_executor(transfer_id, source_server, target_server, max_workers) as executor:
                 futures = []
 
 
-                for file_info in source_files:
+                for file_info in ordered_files:
                     future = executor.submit(
                         transfer_single_file_instant,
                         transfer_id, source_server, file_info, target_server, target_path, mode, fast_ssh
@@ -2823,14 +6427,70 @@ def start_instant_parallel_transfer(transfer_id, source_server, source_files, ta
             with TRANSFER_PROCESS_LOCK:
                 transfer_processes.pop(transfer_id, None)
             progress_manager.cleanup_transfer(transfer_id)
-            speed_simulator.cleanup_transfer(transfer_id)
+            rate_tracker.cleanup_transfer(transfer_id)
             cleanup_transfer_bytes(transfer_id)
+            transfer_journal.finish(transfer_id)
+            bandwidth_manager.unregister(transfer_id)
+            transfer_scheduler.release(transfer_id)
 
 
     thread = threading.Thread(target=transfer_worker)
     thread.daemon = True
     thread.start()
 
+
+def resume_journaled_transfers():
+    """Restart the jobs whose journal survived a restart; called once when the app is created."""
+    if not (TRANSFER_JOURNAL_CONFIG['enabled'] and TRANSFER_JOURNAL_CONFIG['auto_resume']):
+        return []
+    resumed = []
+    for transfer_id, state in transfer_journal.pending():
+        job = state['job']
+
+        def start(transfer_id=transfer_id, state=state, job=job):
+            transfer_journal.adopt(transfer_id, state)
+            active_transfers[transfer_id] = {
+                'source_server': job.get('source_server'),
+                'source_files': job.get('source_files') or [],
+                'target_server': job.get('target_server'),
+                'target_path': job.get('target_path'),
+                'mode': job.get('mode', 'copy'),
+                'select_all': bool(job.get('select_all')),
+                'source_dir': job.get('source_dir') or '',
+                'exclude_paths': job.get('exclude_paths') or [],
+                'parallel_enabled': job.get('parallel_enabled', True),
+                'start_time': datetime.now(),
+                'client_ip': job.get('client_ip') or '未知',
+                'rate_limit_kb': job.get('rate_limit_kb', 0),
+                'resumed': True
+            }
+            init_transfer_bytes(transfer_id)
+            if state['bytes']:
+                with TRANSFER_BYTES_LOCK:
+                    TRANSFER_BYTES_STATE[transfer_id]['completed_total'] = int(state['bytes'].get('completed_total') or 0)
+            print(f"[JOURNAL] 恢复中断的传输任务: {transfer_id} (已完成 {len(state['units'])} 个单元, {len(state['chunks'])} 个分块文件)")
+            start_instant_parallel_transfer(
+                transfer_id,
+                job.get('source_server'),
+                job.get('source_files') or [],
+                job.get('target_server'),
+                job.get('target_path'),
+                job.get('mode', 'copy'),
+                job.get('fast_ssh', True),
+                parallel_enabled=job.get('parallel_enabled', True),
+                select_all=bool(job.get('select_all')),
+                source_dir=job.get('source_dir') or '',
+                exclude_paths=job.get('exclude_paths') or [],
+                resume=True
+            )
+
+        transfer_scheduler.submit(
+            transfer_id, start, job.get('source_server'), job.get('target_server'),
+            client_ip=job.get('client_ip') or '', priority=job.get('priority', 0)
+        )
+        resumed.append(transfer_id)
+    return resumed
+
 def transfer_single_file_instant(transfer_id, source_server, file_info, target_server, target_path, mode="copy", fast_ssh=True):
     """Instantly transfer a file or directory without pre-analysis."""
     try:
@@ -2862,7 +6522,11 @@ def transfer_single_file_instant(transfer_id, source_server, file_info, target_s
 
         emit_transfer_log(transfer_id, f'🔄 传输模式: {transfer_mode} ({source_server} → {target_server})')
 
-        if transfer_mode == 'local_to_remote':
+        source_parent, source_base = os.path.split(source_path.rstrip('/'))
+        if (is_directory and source_base == file_name and
+                _try_tar_stream_transfer(transfer_id, source_server, source_parent or '/', [source_base], target_server, target_path, mode)):
+            pass
+        elif transfer_mode == 'local_to_remote':
 
             print(f"📍 调用函数: transfer_file_via_local_rsync_instant")
             success = transfer_file_via_local_rsync_instant(source_path, target_server, target_path, file_name, is_directory, transfer_id, fast_ssh, mode)
@@ -2954,6 +6618,7 @@ def transfer_single_file_instant(transfer_id, source_server, file_info, target_s
         except Exception:
             pass
 
+        transfer_journal.mark_unit(transfer_id, f"item:{source_path}")
         return {'success': True, 'message': f'{file_name} 传输完成'}
 
     except Exception as e:
@@ -2996,27 +6661,527 @@ def transfer_single_file_instant(transfer_id, source_server, file_info, target_s
         )
         return {'success': False, 'message': str(e)}
 
-def transfer_file_via_local_rsync_instant(source_path, target_server, target_path, file_name, is_directory, transfer_id, fast_ssh, mode='copy'):
-    """Instant local rsync transfer with folder-level parallelism and NAS support."""
+def _ssh_command_argv(server_ip):
+    """argv for the system ssh client to a server (same options as rsync's -e), with sshpass when configured."""
+    server = SERVERS[server_ip]
+    argv = shlex.split(RSYNC_SSH_CMD)
+    port = server.get('port', 22)
+    if port != 22:
+        argv += ['-p', str(port)]
+    argv.append(f"{server['user']}@{get_server_host(server_ip)}")
+    if server.get('password'):
+        argv = ['sshpass', '-p', server['password']] + argv
+    return argv
+
+
+class StripedFileTransfer:
+    """Copy one large file as parallel byte-range streams into a preallocated part file on the target.
+
+    Chunks are pulled from a shared queue by `streams` workers (dd with skip/seek byte offsets over
+    the system ssh client), then every chunk is checked against a digest manifest; mismatching chunks
+    are re-sent once before the part file is renamed into place. POSIX endpoints only.
+    """
+
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, transfer_id, source_server, source_path, target_server, target_file, size):
+        self.transfer_id = transfer_id
+        self.source_server = source_server
+        self.source_path = source_path
+        self.target_server = target_server
+        self.target_file = target_file
+        self.size = size
+        self.source_local = is_local_server(source_server)
+        self.target_local = is_local_server(target_server)
+        self.part_path = os.path.join(os.path.dirname(target_file), f'.{os.path.basename(target_file)}.turbofile-part')
+        self.streams = max(1, STRIPE_CONFIG['streams'])
+        self.algorithm = STRIPE_CONFIG['checksum']
+        chunk_size = STRIPE_CONFIG['chunk_mb'] * 1024 * 1024
+        self.chunks = [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+        self.source_digests = {}
+        self.target_fd = None
+        self.journal_key = f'{target_server}:{target_file}:{size}:{chunk_size}'
+
+    @staticmethod
+    def _dd_read(path, offset, length):
+        return f"dd if={shlex.quote(path)} bs=4M iflag=skip_bytes,count_bytes skip={offset} count={length} status=none"
+
+    @staticmethod
+    def _dd_write(path, offset):
+        return f"dd of={shlex.quote(path)} bs=4M oflag=seek_bytes seek={offset} conv=notrunc status=none"
+
+    def run(self):
+        try:
+            self._prepare()
+            # Chunks journaled before a restart are only re-checked by the digest pass below.
+            written = transfer_journal.chunk_digests(self.transfer_id, self.journal_key)
+            pending = [chunk for chunk in self.chunks if chunk[0] not in written]
+            if len(pending) < len(self.chunks):
+                emit_transfer_log(self.transfer_id, f'♻️ 续传: 跳过 {len(self.chunks) - len(pending)}/{len(self.chunks)} 个已写入分块')
+                self.source_digests.update({offset: digest for offset, digest in written.items() if digest})
+            self._parallel(self._copy_chunk, pending)
+            bad = self._verify(self.chunks)
+            if bad:
+                emit_transfer_log(self.transfer_id, f'⚠️ 分块校验不一致 {len(bad)}/{len(self.chunks)}，重新传输这些分块')
+                self._parallel(self._copy_chunk, bad)
+                bad = self._verify(bad)
+                if bad:
+                    raise Exception(f'分块校验失败: {len(bad)} 个分块不一致')
+            self._commit()
+        except Exception:
+            self._discard()
+            raise
+        return True
+
+    def _parallel(self, func, chunks):
+        # FIFO queue over a fixed pool: a stream that finishes early just takes the next chunk.
+        with ThreadPoolExecutor(max_workers=min(self.streams, len(chunks)) or 1) as executor:
+            futures = [executor.submit(func, chunk) for chunk in chunks]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def _prepare(self):
+        if self.target_local:
+            self.target_fd = os.open(self.part_path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.posix_fallocate(self.target_fd, 0, self.size)
+            except (AttributeError, OSError):
+                os.ftruncate(self.target_fd, self.size)
+            return
+        part = shlex.quote(self.part_path)
+        _, error, exit_code = ssh_manager.execute_command(
+            self.target_server, f"fallocate -l {self.size} {part} 2>/dev/null || truncate -s {self.size} {part}"
+        )
+        if exit_code != 0:
+            raise Exception(f'目标文件预分配失败: {error}')
+
+    def _copy_chunk(self, chunk):
+        if self.transfer_id not in active_transfers:
+            raise Exception('传输被取消')
+        offset, length = chunk
+        part_id = f"stripe_{uuid.uuid4().hex}"
+        moved = 0
+        try:
+            if self.source_local:
+                moved = self._push_chunk(offset, length, part_id)
+            elif self.target_local:
+                moved = self._pull_chunk(offset, length, part_id)
+            else:
+                moved = self._relay_chunk(offset, length)
+        finally:
+            finalize_transfer_bytes_part(self.transfer_id, part_id, moved)
+        transfer_journal.mark_chunk(self.transfer_id, self.journal_key, offset, self.source_digests.get(offset))
+
+    def _spawn(self, argv, **kwargs):
+        process = subprocess.Popen(argv, stderr=subprocess.PIPE, preexec_fn=os.setsid, **kwargs)
+        register_transfer_process(self.transfer_id, {'type': 'subprocess', 'process': process})
+        return process
+
+    def _push_chunk(self, offset, length, part_id):
+        """Local source: read the range here, hash it, and pipe it into dd on the target."""
+        digest = hashlib.new(self.algorithm)
+        process = self._spawn(_ssh_command_argv(self.target_server) + [self._dd_write(self.part_path, offset)],
+                              stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        sent = 0
+        try:
+            with open(self.source_path, 'rb') as source:
+                while sent < length:
+                    data = os.pread(source.fileno(), min(self.BLOCK_SIZE, length - sent), offset + sent)
+                    if not data:
+                        raise Exception('源文件在传输过程中变短')
+                    digest.update(data)
+                    process.stdin.write(data)
+                    sent += len(data)
+                    update_transfer_bytes_part(self.transfer_id, part_id, sent)
+                    bandwidth_manager.throttle(self.transfer_id, len(data))
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = process.stderr.read().decode('utf-8', errors='replace').strip()
+        if process.wait() != 0 or sent != length:
+            raise Exception(f'分块写入失败 @{offset}: {error or process.returncode}')
+        self.source_digests[offset] = digest.hexdigest()
+        return sent
+
+    def _pull_chunk(self, offset, length, part_id):
+        """Local target: dd the range out of the source and pwrite it into the part file.
+
+        The source digest is left to _verify, which hashes the range on the source itself.
+        """
+        process = self._spawn(_ssh_command_argv(self.source_server) + [self._dd_read(self.source_path, offset, length)],
+                              stdout=subprocess.PIPE)
+        received = 0
+        while received < length:
+            data = process.stdout.read(min(self.BLOCK_SIZE, length - received))
+            if not data:
+                break
+            os.pwrite(self.target_fd, data, offset + received)
+            received += len(data)
+            update_transfer_bytes_part(self.transfer_id, part_id, received)
+            bandwidth_manager.throttle(self.transfer_id, len(data))
+        error = process.stderr.read().decode('utf-8', errors='replace').strip()
+        if process.wait() != 0 or received != length:
+            raise Exception(f'分块读取失败 @{offset}: {error or process.returncode}')
+        return received
+
+    def _relay_chunk(self, offset, length):
+        """Remote to remote: the source pipes its range straight to the target over its own ssh."""
+        ssh_to_target = ' '.join(shlex.quote(arg) for arg in _ssh_command_argv(self.target_server))
+        command = (f"{self._dd_read(self.source_path, offset, length)} | "
+                   f"{ssh_to_target} {shlex.quote(self._dd_write(self.part_path, offset))}")
+        with ssh_manager.lease(self.source_server) as ssh:
+            if ssh is None:
+                raise Exception(f'无法连接到源服务器 {self.source_server}')
+            channel = ssh.get_transport().open_session()
+            register_transfer_process(self.transfer_id, {'type': 'ssh', 'channel': channel})
+            try:
+                channel.exec_command(command)
+                exit_code = channel.recv_exit_status()
+                error = channel.recv_stderr(8192).decode('utf-8', errors='replace').strip() if channel.recv_stderr_ready() else ''
+            finally:
+                channel.close()
+        if exit_code != 0:
+            raise Exception(f'分块转发失败 @{offset}: {error or exit_code}')
+        return length
+
+    def _local_digests(self, path, chunks):
+        digests = {}
+        with open(path, 'rb') as handle:
+            for offset, length in chunks:
+                digest = hashlib.new(self.algorithm)
+                done = 0
+                while done < length:
+                    data = os.pread(handle.fileno(), min(self.BLOCK_SIZE, length - done), offset + done)
+                    if not data:
+                        break
+                    digest.update(data)
+                    done += len(data)
+                digests[offset] = digest.hexdigest()
+        return digests
+
+    def _remote_digests(self, server_ip, path, chunks):
+        """Hash ranges on a server: one shell loop per stream, each over its share of the chunks."""
+        digests = {}
+        groups = [chunks[i::self.streams] for i in range(self.streams) if chunks[i::self.streams]]
+
+        def run_group(group):
+            ranges = ' '.join(f'{offset}:{length}' for offset, length in group)
+            command = (f"for r in {ranges}; do "
+                       f"dd if={shlex.quote(path)} bs=4M iflag=skip_bytes,count_bytes skip=${{r%:*}} count=${{r#*:}} status=none "
+                       f"| {self.algorithm}sum; done")
+            output, error, exit_code = ssh_manager.execute_command(server_ip, command)
+            lines = [line.split()[0] for line in (output or '').splitlines() if line.strip()]
+            if exit_code != 0 or len(lines) != len(group):
+                raise Exception(f'分块校验计算失败: {error or exit_code}')
+            return dict(zip((offset for offset, _ in group), lines))
+
+        with ThreadPoolExecutor(max_workers=len(groups) or 1) as executor:
+            for result in executor.map(run_group, groups):
+                digests.update(result)
+        return digests
+
+    def _verify(self, chunks):
+        missing = [chunk for chunk in chunks if chunk[0] not in self.source_digests]
+        if missing:
+            self.source_digests.update(self._remote_digests(self.source_server, self.source_path, missing))
+        if self.target_local:
+            os.fsync(self.target_fd)
+            target_digests = self._local_digests(self.part_path, chunks)
+        else:
+            target_digests = self._remote_digests(self.target_server, self.part_path, chunks)
+        bad = [chunk for chunk in chunks if target_digests.get(chunk[0]) != self.source_digests.get(chunk[0])]
+        for chunk in bad:
+            self.source_digests.pop(chunk[0], None)
+        return bad
+
+    def _source_mtime(self):
+        """Source modification time as 'seconds.nanoseconds' text."""
+        if self.source_local:
+            mtime_ns = os.stat(self.source_path).st_mtime_ns
+            return f'{mtime_ns // 1000000000}.{mtime_ns % 1000000000:09d}'
+        output, error, exit_code = ssh_manager.execute_command(
+            self.source_server, f"find {shlex.quote(self.source_path)} -maxdepth 0 -printf '%T@'"
+        )
+        mtime = (output or '').strip()
+        if exit_code != 0 or not re.fullmatch(r'\d+(\.\d+)?', mtime):
+            raise Exception(f'读取源文件修改时间失败: {error or exit_code}')
+        return mtime
+
+    def _commit(self):
+        # Keep the source mtime like rsync -a does, so later quick checks see an unchanged file.
+        mtime = self._source_mtime()
+        if self.target_local:
+            os.close(self.target_fd)
+            self.target_fd = None
+            seconds, _, fraction = mtime.partition('.')
+            mtime_ns = int(seconds) * 1000000000 + int((fraction + '000000000')[:9])
+            os.utime(self.part_path, ns=(mtime_ns, mtime_ns))
+            os.replace(self.part_path, self.target_file)
+            return
+        part = shlex.quote(self.part_path)
+        _, error, exit_code = ssh_manager.execute_command(
+            self.target_server, f"touch -d @{mtime} {part} && mv -f {part} {shlex.quote(self.target_file)}"
+        )
+        if exit_code != 0:
+            raise Exception(f'重命名分块文件失败: {error}')
+
+    def _discard(self):
+        try:
+            if self.target_local:
+                if self.target_fd is not None:
+                    os.close(self.target_fd)
+                    self.target_fd = None
+                if os.path.exists(self.part_path):
+                    os.unlink(self.part_path)
+            else:
+                ssh_manager.execute_command(self.target_server, f"rm -f {shlex.quote(self.part_path)}")
+        except Exception:
+            pass
+
+
+def _try_striped_transfer(transfer_id, source_server, source_path, target_server, target_path, file_name):
+    """Stripe a single file across parallel streams when it is big enough; False means use rsync instead."""
+    if not STRIPE_CONFIG['enabled'] or source_server == target_server:
+        return False
+    if is_windows_server(source_server) or is_windows_server(target_server):
+        return False
+    if bandwidth_manager.limited(transfer_id) and not (is_local_server(source_server) or is_local_server(target_server)):
+        # Relayed chunks never pass through this process, so only rsync --bwlimit can cap them.
+        return False
+    size = parallel_manager.get_file_size(source_server, source_path)
+    if size < STRIPE_CONFIG['threshold_mb'] * 1024 * 1024:
+        return False
+    target_file = os.path.join(target_path, file_name)
+    emit_transfer_log(
+        transfer_id,
+        f'🧩 大文件分块并行传输: {file_name} ({_human_readable_size(size)}) → {STRIPE_CONFIG["streams"]} 路, '
+        f'每块 {STRIPE_CONFIG["chunk_mb"]}MB, {STRIPE_CONFIG["checksum"]} 校验'
+    )
+    try:
+        StripedFileTransfer(transfer_id, source_server, source_path, target_server, target_file, size).run()
+    except Exception as e:
+        if transfer_id not in active_transfers:
+            raise
+        emit_transfer_log(transfer_id, f'⚠️ 分块传输失败，回退到rsync: {e}')
+        return False
+    emit_transfer_log(transfer_id, f'✅ 分块传输完成并通过校验: {file_name}')
+    return True
 
 
+TAR_CHECKPOINT_RECORDS = 1000
+TAR_RECORD_SIZE = 10240
 
 
+def _tree_file_stats(server_ip, base_dir, members):
+    """(file_count, total_bytes) over the first sample_files regular files under base_dir/members."""
+    limit = TAR_STREAM_CONFIG['sample_files']
+    if is_local_server(server_ip):
+        count = total = 0
+        stack = [os.path.join(base_dir, member) for member in members]
+        while stack and count < limit:
+            path = stack.pop()
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                count += 1
+                                total += entry.stat(follow_symlinks=False).st_size
+                elif os.path.isfile(path):
+                    count += 1
+                    total += os.path.getsize(path)
+            except OSError:
+                continue
+        return count, total
+    quoted = ' '.join(shlex.quote(member) for member in members)
+    command = (f"cd {shlex.quote(base_dir)} && find {quoted} -type f -printf '%s\\n' 2>/dev/null "
+               f"| head -n {limit} | awk '{{n++; s+=$1}} END {{print n+0, s+0}}'")
+    output, _, _ = ssh_manager.execute_command(server_ip, command)
+    try:
+        count, total = (int(part) for part in (output or '').split()[:2])
+    except ValueError:
+        return 0, 0
+    return count, total
 
-    enable_folder_parallel = PARALLEL_TRANSFER_CONFIG.get('enable_folder_parallel', False)
-    folder_parallel_threshold = PARALLEL_TRANSFER_CONFIG.get('folder_parallel_threshold', 1000)
 
-    if is_directory and enable_folder_parallel:
+def should_use_tar_stream(source_server, target_server, base_dir, members, mode='copy'):
+    """Pick the tar pipe over rsync when the (sampled) average file size is below avg_file_kb.
 
+    Returns (use_tar, (file_count, total_bytes)). Copy only: move keeps rsync --remove-source-files.
+    """
+    if not TAR_STREAM_CONFIG['enabled'] or mode != 'copy' or source_server == target_server:
+        return False, None
+    if is_local_server(source_server) and is_local_server(target_server):
+        return False, None
+    if is_windows_server(source_server) or is_windows_server(target_server):
+        return False, None
+    count, total = _tree_file_stats(source_server, base_dir, members)
+    if count < TAR_STREAM_CONFIG['min_files']:
+        return False, (count, total)
+    return total / count < TAR_STREAM_CONFIG['avg_file_kb'] * 1024, (count, total)
+
+
+def transfer_tree_via_tar(transfer_id, source_server, base_dir, members, target_server, target_dir, excludes=()):
+    """Stream base_dir/members into target_dir as one tar archive (tar -cf - | ssh | tar -xf -).
+
+    When the TurboFile host is an endpoint the bytes pass through here and are counted directly;
+    remote-to-remote pipes source -> target and counts tar checkpoints on the source's stderr.
+    """
+    exclude_opts = ''.join(f" --exclude={shlex.quote('./' + pattern.lstrip('/'))}" for pattern in excludes)
+    member_args = ' '.join(shlex.quote(member) for member in members)
+    create = f"tar -C {shlex.quote(base_dir)} --anchored{exclude_opts} -cf - -- {member_args}"
+    checkpointed = (f"tar -C {shlex.quote(base_dir)} --anchored{exclude_opts} --totals --checkpoint={TAR_CHECKPOINT_RECORDS} "
+                    f"--checkpoint-action=echo=TFCK%u -cf - -- {member_args}")
+    extract = (f"mkdir -p {shlex.quote(target_dir)} && "
+               f"tar -C {shlex.quote(target_dir)} -xf - --no-same-owner --no-same-permissions")
+    part_id = f"tar_{uuid.uuid4().hex}"
+    moved = 0
+    try:
+        if is_local_server(source_server) or is_local_server(target_server):
+            moved = _pump_tar_stream(transfer_id, part_id, source_server, create, target_server, extract)
+        else:
+            moved = _relay_tar_stream(transfer_id, part_id, source_server, checkpointed, target_server, extract)
+    finally:
+        finalize_transfer_bytes_part(transfer_id, part_id, moved)
+    return moved
+
+
+def _pump_tar_stream(transfer_id, part_id, source_server, create, target_server, extract):
+    def spawn(server_ip, command, **kwargs):
+        argv = ['sh', '-c', command] if is_local_server(server_ip) else _ssh_command_argv(server_ip) + [command]
+        errors = tempfile.TemporaryFile()
+        process = subprocess.Popen(argv, stderr=errors, preexec_fn=os.setsid, **kwargs)
+        register_transfer_process(transfer_id, {'type': 'subprocess', 'process': process})
+        return process, errors
+
+    producer, producer_err = spawn(source_server, create, stdout=subprocess.PIPE)
+    consumer, consumer_err = spawn(target_server, extract, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    moved = 0
+    last_report = 0.0
+    try:
+        source_fd = producer.stdout.fileno()
+        while True:
+            data = os.read(source_fd, 1024 * 1024)
+            if not data:
+                break
+            consumer.stdin.write(data)
+            moved += len(data)
+            bandwidth_manager.throttle(transfer_id, len(data))
+            now = time.time()
+            if now - last_report >= 0.5:
+                last_report = now
+                update_transfer_bytes_part(transfer_id, part_id, moved)
+        consumer.stdin.close()
+    except BrokenPipeError:
+        producer.kill()
+    producer_code = producer.wait()
+    consumer_code = consumer.wait()
+    if producer_code != 0 or consumer_code != 0:
+        messages = []
+        for handle in (producer_err, consumer_err):
+            handle.seek(0)
+            messages.append(handle.read()[-2000:].decode('utf-8', errors='replace').strip())
+        raise Exception(f"tar 流传输失败 (打包 {producer_code}, 解包 {consumer_code}): {' | '.join(m for m in messages if m)}")
+    return moved
+
+
+def _relay_tar_stream(transfer_id, part_id, source_server, create, target_server, extract):
+    ssh_to_target = ' '.join(shlex.quote(arg) for arg in _ssh_command_argv(target_server))
+    command = (
+        f"{{ {create} || echo TFFAIL >&2; }} | {ssh_to_target} {shlex.quote(extract)}"
+    )
+    moved = 0
+    errors = ''
+    with ssh_manager.lease(source_server) as ssh:
+        if ssh is None:
+            raise Exception(f"无法连接到源服务器 {source_server}")
+        channel = ssh.get_transport().open_session()
+        register_transfer_process(transfer_id, {'type': 'ssh', 'channel': channel})
         try:
-            file_count = sum(len(files) for _, _, files in os.walk(source_path))
-            if file_count > folder_parallel_threshold:
+            channel.exec_command(command)
+            buf = ''
+            while True:
+                if channel.recv_stderr_ready():
+                    buf += channel.recv_stderr(65536).decode('utf-8', errors='replace')
+                    lines = buf.split('\n')
+                    buf = lines.pop()
+                    for line in lines:
+                        marker = re.search(r'TFCK(\d+)', line)
+                        totals = re.search(r'Total bytes written: (\d+)', line)
+                        if marker:
+                            # %u is the record number reached at this checkpoint.
+                            moved = int(marker.group(1)) * TAR_RECORD_SIZE
+                            update_transfer_bytes_part(transfer_id, part_id, moved)
+                        elif totals:
+                            moved = int(totals.group(1))
+                        elif line.strip():
+                            errors = (errors + '\n' + line)[-2000:]
+                elif channel.exit_status_ready():
+                    break
+                else:
+                    time.sleep(0.2)
+            exit_code = channel.recv_exit_status()
+        finally:
+            channel.close()
+    if exit_code != 0 or 'TFFAIL' in errors:
+        raise Exception(f"tar 流传输失败 (退出码 {exit_code}): {errors.replace('TFFAIL', '').strip()}")
+    return moved
+
+
+def _try_tar_stream_transfer(transfer_id, source_server, base_dir, members, target_server, target_dir, mode, excludes=()):
+    """Use the tar pipe for trees of small files; False means the caller should run rsync."""
+    if transfer_journal.is_resumed(transfer_id):
+        # tar cannot skip what already arrived; rsync's quick check can.
+        return False
+    if bandwidth_manager.limited(transfer_id) and not (is_local_server(source_server) or is_local_server(target_server)):
+        return False
+    try:
+        use_tar, stats = should_use_tar_stream(source_server, target_server, base_dir, members, mode)
+    except Exception:
+        return False
+    if not use_tar:
+        return False
+    count, total = stats
+    emit_transfer_log(
+        transfer_id,
+        f'📦 小文件聚合传输: 约 {count} 个文件, 平均 {_human_readable_size(total // max(count, 1))} → tar 流'
+    )
+    start = time.time()
+    try:
+        moved = transfer_tree_via_tar(transfer_id, source_server, base_dir, members, target_server, target_dir, excludes)
+    except Exception as e:
+        if transfer_id not in active_transfers:
+            raise
+        emit_transfer_log(transfer_id, f'⚠️ tar 流传输失败，回退到rsync: {e}')
+        return False
+    elapsed = max(time.time() - start, 0.001)
+    emit_transfer_log(transfer_id, f'✅ tar 流传输完成: {_human_readable_size(moved)}, {_human_readable_size(moved / elapsed)}/s')
+    return True
+
+
+def transfer_file_via_local_rsync_instant(source_path, target_server, target_path, file_name, is_directory, transfer_id, fast_ssh, mode='copy'):
+    """Instant local rsync transfer with folder-level parallelism and NAS support."""
+
+
 
-                return transfer_directory_parallel(source_path, target_server, target_path, file_name, transfer_id, fast_ssh, mode)
-        except:
-            pass
 
 
+    if is_directory:
+        table = _plan_parallel_directory('localhost', source_path)
+        if table is not None:
+            return transfer_directory_parallel(source_path, target_server, target_path, file_name, transfer_id, fast_ssh, mode, table)
+
+
+    if not is_directory and _try_striped_transfer(transfer_id, 'localhost', source_path, target_server, target_path, file_name):
+        return True
+
     return transfer_single_rsync(source_path, target_server, target_path, file_name, is_directory, transfer_id, fast_ssh, mode)
 
 def transfer_single_rsync(source_path, target_server, target_path, file_name, is_directory, transfer_id, fast_ssh, mode='copy'):
@@ -3092,143 +7257,231 @@ def transfer_single_rsync(source_path, target_server, target_path, file_name, is
 
     return True
 
-def transfer_directory_parallel(source_path, target_server, target_path, file_name, transfer_id, fast_ssh, mode='copy'):
-    """In-directory parallel transfer implementation."""
-    target_user = SERVERS[target_server]['user']
-    target_password = SERVERS[target_server].get('password')
+def _plan_parallel_directory(source_server, source_path):
+    """FileTable of a source directory when in-directory parallel transfer applies, else None."""
+    if not PARALLEL_TRANSFER_CONFIG.get('enable_folder_parallel', False):
+        return None
+    try:
+        if is_local_server(source_server):
+            table = walk_local_tree(source_path)
+        else:
+            table = walk_remote_tree(source_server, source_path)
+    except Exception as e:
+        print(f"⚠️ 目录并行规划失败，使用单rsync: {e}")
+        return None
+    if len(table) > PARALLEL_TRANSFER_CONFIG.get('folder_parallel_threshold', 1000):
+        return table
+    return None
 
-    target_is_windows = is_windows_server(target_server)
-    remote_target_root = target_path
-    if target_is_windows:
-        normalized = normalize_windows_path_for_transfer(target_path)
-        remote_target_root = convert_windows_path_to_cygwin(normalized)
 
-    emit_transfer_log(transfer_id, f'📁 启用目录内部并行传输: {file_name}')
+def _rsync_with_local_file_list(run_rsync, extra_opts, listing):
+    """Run a local rsync command with `listing` passed through a temporary NUL-separated --files-from file."""
+    list_file = tempfile.NamedTemporaryFile(prefix='turbofile-plan-', delete=False)
+    try:
+        with list_file:
+            list_file.write(listing)
+        return run_rsync(extra_opts + ['--from0', f'--files-from={list_file.name}'])
+    finally:
+        try:
+            os.unlink(list_file.name)
+        except OSError:
+            pass
+
 
+def _run_planned_units(transfer_id, source_server, target_server, source_path, file_name, table, run_rsync):
+    """Bin-pack a directory's FileTable and send the units over parallel rsync streams.
 
-    parallel_tasks = []
+    run_rsync(extra_opts, listing) runs one rsync of the directory root and returns its exit code;
+    listing is the unit's NUL-separated relative paths, or None for the final directory-only pass.
+    """
+    emit_transfer_log(transfer_id, f'📁 启用目录内部并行传输: {file_name}')
+
+    max_workers = max(1, _stream_ceiling())
+    units, loads = plan_transfer_units(table, max_workers)
+    max_workers = max(1, min(max_workers, len(units)))
+    busiest = max(loads) if loads else 0
+    ideal = sum(loads) / max_workers if loads else 0
+    emit_transfer_log(
+        transfer_id,
+        f'📊 传输计划: {len(table)}个文件 / {_human_readable_size(table.total_size)} → {len(units)}个单元, '
+        f'{"最多" if AUTOTUNE_CONFIG["enabled"] else ""}{max_workers}路并行 (最长单路为均值的 {busiest / ideal:.2f} 倍)' if ideal else
+        f'📊 传输计划: 目录 {file_name} 无文件，仅同步目录结构'
+    )
 
+    def execute_unit(unit):
+        """Send one unit as a file list relative to the directory root."""
+        if transfer_id not in active_transfers:
+            return {'success': False, 'task_name': unit['name'], 'error': '传输被取消'}
+        listing = b'\0'.join(table.blob[table.offsets[i]:table.offsets[i + 1]] for i in unit['indexes']) + b'\0'
+        unit_key = f"unit:{source_path}:{hashlib.md5(listing).hexdigest()}"
+        if transfer_journal.unit_done(transfer_id, unit_key):
+            return {'success': True, 'task_name': unit['name']}
+        try:
+            return_code = run_rsync([], listing)
+        except Exception as e:
+            return {'success': False, 'task_name': unit['name'], 'error': str(e)}
+        if return_code == 0:
+            transfer_journal.mark_unit(transfer_id, unit_key)
+            return {'success': True, 'task_name': unit['name']}
+        return {'success': False, 'task_name': unit['name'], 'error': f'rsync 退出码 {return_code}'}
+
+    completed_tasks = 0
+    failed_tasks = 0
+    # Units are submitted longest-first; the executor queue is FIFO, so a worker that finishes
+    # early always takes the largest unit still waiting (greedy LPT with work stealing).
+    # This transfer's stream already counts once; the other workers split its byte budget too.
+    bandwidth_manager.reserve_streams(transfer_id, max_workers - 1)
     try:
+        with _stream_executor(transfer_id, source_server, target_server, max_workers) as executor:
+            futures = [executor.submit(execute_unit, unit) for unit in units]
 
-        items = os.listdir(source_path)
-        subdirs = []
-        files = []
+            for future in concurrent.futures.as_completed(futures):
 
-        for item in items:
-            item_path = os.path.join(source_path, item)
-            if os.path.isdir(item_path):
-                subdirs.append(item)
-            else:
-                files.append(item)
+                if transfer_id not in active_transfers:
 
+                    for f in futures:
+                        f.cancel()
+                    raise Exception("传输被用户取消")
 
-        for subdir in subdirs:
-            parallel_tasks.append({
-                'type': 'subdir',
-                'source': os.path.join(source_path, subdir),
-                'target_subpath': f'{file_name}/{subdir}',
-                'name': subdir
-            })
+                result = future.result()
+                if result['success']:
+                    completed_tasks += 1
+                else:
+                    failed_tasks += 1
+                    emit_transfer_log(transfer_id, f'❌ 并行任务失败: {result["task_name"]} - {result.get("error", "未知错误")}')
+    finally:
+        bandwidth_manager.release_streams(transfer_id, max_workers - 1)
 
+    if failed_tasks > 0:
+        raise Exception(f"目录并行传输部分失败: {failed_tasks}/{len(units)} 任务失败")
 
-        if files:
+    # File lists only create the parents they need; one directory-only pass adds empty directories.
+    if run_rsync(['--include=*/', '--exclude=*'], None) != 0:
+        raise Exception("目录结构同步失败")
 
-            max_file_groups = 3
-            group_size = max(1, len(files) // max_file_groups)
+    emit_transfer_log(transfer_id, f'🎉 目录并行传输完成: {completed_tasks}/{len(units)} 任务成功')
+    return True
 
-            for i in range(0, len(files), group_size):
-                file_group = files[i:i + group_size]
-                parallel_tasks.append({
-                    'type': 'files',
-                    'files': file_group,
-                    'source_dir': source_path,
-                    'target_subpath': file_name,
-                    'name': f'文件组{i//group_size + 1}'
-                })
 
-        emit_transfer_log(transfer_id, f'📊 并行任务: {len(subdirs)}个子目录 + {len(files)}个文件 → {len(parallel_tasks)}个并行任务')
+def transfer_directory_parallel(source_path, target_server, target_path, file_name, transfer_id, fast_ssh, mode='copy', table=None):
+    """In-directory parallel transfer: size-aware work units over max_workers rsync streams."""
+    target_user = SERVERS[target_server]['user']
+    target_password = SERVERS[target_server].get('password')
 
+    target_is_windows = is_windows_server(target_server)
+    remote_target_root = target_path
+    if target_is_windows:
+        normalized = normalize_windows_path_for_transfer(target_path)
+        remote_target_root = convert_windows_path_to_cygwin(normalized)
 
-        max_workers = min(4, len(parallel_tasks))
+    try:
+        if table is None:
+            table = walk_local_tree(source_path)
 
-        def execute_parallel_task(task):
-            """Execute a single parallel task."""
+        target_spec = build_remote_spec(target_server, target_user, f"{remote_target_root}/{file_name}/")
+        base_opts = ['-a', '--inplace', '--whole-file', '--no-compress', '--numeric-ids', '--timeout=600', '--no-perms', '--no-owner', '--no-group', '--omit-dir-times']
+        if target_is_windows:
+            base_opts.append('--iconv=UTF-8,UTF-8')
+        prefix = ['sshpass', '-p', target_password, 'rsync'] if target_password else ['rsync']
 
-            rsync_opts = ['-a', '--inplace', '--whole-file', '--no-compress', '--numeric-ids', '--timeout=600', '--no-perms', '--no-owner', '--no-group', '--omit-dir-times']
-            if target_is_windows:
-                rsync_opts.append('--iconv=UTF-8,UTF-8')
+        def run_command(extra_opts):
+            rsync_opts = base_opts + extra_opts
+            _append_rsync_progress_opts(rsync_opts)
+            cmd = prefix + rsync_opts + ['-e', RSYNC_SSH_CMD, f'{source_path}/', target_spec]
+            return _run_rsync_subprocess_with_progress(cmd, transfer_id, f"rsync_{uuid.uuid4().hex}")
 
-            if task['type'] == 'subdir':
+        def run_rsync(extra_opts, listing):
+            if listing is None:
+                return run_command(extra_opts)
+            return _rsync_with_local_file_list(run_command, extra_opts, listing)
 
-                target_spec = build_remote_spec(target_server, target_user, f"{remote_target_root}/{task['target_subpath']}/")
-                if target_password:
-                    cmd = ['sshpass', '-p', target_password, 'rsync'] + rsync_opts + ['-e', RSYNC_SSH_CMD,
-                        f"{task['source']}/", target_spec
-                    ]
-                else:
-                    cmd = ['rsync'] + rsync_opts + ['-e', RSYNC_SSH_CMD,
-                        f"{task['source']}/", target_spec
-                    ]
-            else:
+        return _run_planned_units(transfer_id, 'localhost', target_server, source_path, file_name, table, run_rsync)
 
-                file_paths = [os.path.join(task['source_dir'], f) for f in task['files']]
-                target_spec = build_remote_spec(target_server, target_user, f"{remote_target_root}/{task['target_subpath']}/")
-                if target_password:
-                    cmd = ['sshpass', '-p', target_password, 'rsync'] + rsync_opts + ['-e', RSYNC_SSH_CMD] + file_paths + [
-                        target_spec
-                    ]
-                else:
-                    cmd = ['rsync'] + rsync_opts + ['-e', RSYNC_SSH_CMD] + file_paths + [
-                        target_spec
-                    ]
+    except Exception as e:
+        emit_transfer_log(transfer_id, f'⚠️ 目录并行传输失败，回退到单rsync: {str(e)}')
 
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-                if result.returncode == 0:
-                    return {'success': True, 'task_name': task['name']}
-                else:
-                    return {'success': False, 'task_name': task['name'], 'error': result.stderr}
-            except Exception as e:
-                return {'success': False, 'task_name': task['name'], 'error': str(e)}
+        return transfer_single_rsync(source_path, target_server, target_path, file_name, True, transfer_id, fast_ssh, mode='copy')
 
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(execute_parallel_task, task) for task in parallel_tasks]
+def transfer_directory_parallel_from_remote(source_server, source_path, target_path, file_name, transfer_id, table):
+    """Planned parallel pull of a remote Linux directory onto the TurboFile host; False if it should fall back."""
+    source_user = SERVERS[source_server]['user']
+    source_password = SERVERS[source_server].get('password')
+    ssh_cmd = RSYNC_SSH_CMD
+    source_port = SERVERS[source_server].get('port', 22)
+    if source_port != 22:
+        ssh_cmd = f"{ssh_cmd} -p {source_port}"
 
+    source_spec = build_remote_spec(source_server, source_user, f'{source_path}/')
+    base_opts = ['-a', '--inplace', '--whole-file', '--no-compress', '--numeric-ids', '--timeout=600', '-s', '--no-perms', '--no-owner', '--no-group', '--omit-dir-times']
+    prefix = ['sshpass', '-p', source_password, 'rsync'] if source_password else ['rsync']
 
-            completed_tasks = 0
-            failed_tasks = 0
+    def run_command(extra_opts):
+        rsync_opts = base_opts + extra_opts
+        _append_rsync_progress_opts(rsync_opts)
+        cmd = prefix + rsync_opts + ['-e', ssh_cmd, source_spec, f'{target_path}/{file_name}/']
+        return _run_rsync_subprocess_with_progress(cmd, transfer_id, f"rsync_{uuid.uuid4().hex}")
 
-            for future in concurrent.futures.as_completed(futures):
+    def run_rsync(extra_opts, listing):
+        if listing is None:
+            return run_command(extra_opts)
+        return _rsync_with_local_file_list(run_command, extra_opts, listing)
 
-                if transfer_id not in active_transfers:
+    try:
+        return _run_planned_units(transfer_id, source_server, 'localhost', source_path, file_name, table, run_rsync)
+    except Exception as e:
+        if transfer_id not in active_transfers:
+            raise
+        emit_transfer_log(transfer_id, f'⚠️ 目录并行传输失败，回退到单rsync: {str(e)}')
+        return False
 
-                    for f in futures:
-                        f.cancel()
-                    raise Exception("传输被用户取消")
 
-                result = future.result()
-                if result['success']:
-                    completed_tasks += 1
-                    emit_transfer_log(transfer_id, f'✅ 并行任务完成: {result["task_name"]}')
-                else:
-                    failed_tasks += 1
-                    emit_transfer_log(transfer_id, f'❌ 并行任务失败: {result["task_name"]} - {result.get("error", "未知错误")}')
+def transfer_directory_parallel_remote(source_server, source_path, target_server, target_path, file_name, transfer_id, table):
+    """Planned parallel push between two remote Linux servers (rsync runs on the source); False if it should fall back.
+
+    Each unit's file list is fed to the remote rsync on stdin (--files-from=-).
+    """
+    target_user = SERVERS[target_server]['user']
+    target_password = SERVERS[target_server].get('password')
+    ssh_to_target = RSYNC_SSH_CMD
+    target_port = SERVERS[target_server].get('port', 22)
+    if target_port != 22:
+        ssh_to_target = f"{ssh_to_target} -p {target_port}"
 
-        if failed_tasks > 0:
-            raise Exception(f"目录并行传输部分失败: {failed_tasks}/{len(parallel_tasks)} 任务失败")
+    target_spec = build_remote_spec(target_server, target_user, f'{target_path}/{file_name}/')
+    base_opts = ['-a', '--inplace', '--whole-file', '--no-compress', '--numeric-ids', '--timeout=600', '-s', '--no-perms', '--no-owner', '--no-group', '--omit-dir-times']
+    prefix = f"sshpass -p {shlex.quote(target_password)} rsync" if target_password else "rsync"
 
-        emit_transfer_log(transfer_id, f'🎉 目录并行传输完成: {completed_tasks}/{len(parallel_tasks)} 任务成功')
+    def run_rsync(extra_opts, listing):
+        rsync_opts = base_opts + extra_opts
+        if listing is not None:
+            rsync_opts += ['--from0', '--files-from=-']
+        _append_rsync_progress_opts(rsync_opts)
+        remote_cmd = (f"{prefix} {' '.join(shlex.quote(opt) for opt in rsync_opts)} -e {shlex.quote(ssh_to_target)} "
+                      f"{shlex.quote(f'{source_path}/')} {shlex.quote(target_spec)}")
+        with ssh_manager.lease(source_server) as ssh:
+            if not ssh:
+                raise Exception(f"无法连接到源服务器 {source_server}")
+            exit_status, error = _run_remote_rsync_with_progress(
+                ssh, remote_cmd, transfer_id, f"rsync_{uuid.uuid4().hex}", stdin_data=listing
+            )
+        if exit_status != 0 and error:
+            print(f"⚠️ 并行单元rsync错误: {error.strip()[:200]}")
+        return exit_status
 
+    try:
+        return _run_planned_units(transfer_id, source_server, target_server, source_path, file_name, table, run_rsync)
     except Exception as e:
+        if transfer_id not in active_transfers:
+            raise
         emit_transfer_log(transfer_id, f'⚠️ 目录并行传输失败，回退到单rsync: {str(e)}')
-
-        return transfer_single_rsync(source_path, target_server, target_path, file_name, True, transfer_id, fast_ssh, mode='copy')
+        return False
 
 def transfer_file_via_remote_to_local_rsync_instant(source_server, source_path, target_server, target_path, file_name, is_directory, transfer_id, fast_ssh, mode='copy'):
     """Transfer from remote server to TurboFile host using rsync pull."""
 
-
+    if not is_directory and _try_striped_transfer(transfer_id, source_server, source_path, target_server, target_path, file_name):
+        return True
 
     source_user = SERVERS[source_server]['user']
     source_password = SERVERS[source_server].get('password')
@@ -3236,6 +7489,11 @@ def transfer_file_via_remote_to_local_rsync_instant(source_server, source_path,
 
     source_is_windows = is_windows_server(source_server)
 
+    if is_directory and not source_is_windows:
+        table = _plan_parallel_directory(source_server, source_path)
+        if table is not None and transfer_directory_parallel_from_remote(source_server, source_path, target_path, file_name, transfer_id, table):
+            return True
+
 
     rsync_opts = [
         '-a',
@@ -3515,6 +7773,9 @@ def transfer_file_via_remote_rsync_instant(source_server, source_path, target_se
 
 
 
+    if not is_directory and _try_striped_transfer(transfer_id, source_server, source_path, target_server, target_path, file_name):
+        return True
+
     print(f"🔄 使用rsync传输方案")
 
 
@@ -3523,6 +7784,11 @@ def transfer_file_via_remote_rsync_instant(source_server, source_path, target_se
 
     print(f"🔍 Windows检测结果: 源是Windows={source_is_windows}, 目标是Windows={target_is_windows}")
 
+    if is_directory and not (source_is_windows or target_is_windows):
+        table = _plan_parallel_directory(source_server, source_path)
+        if table is not None and transfer_directory_parallel_remote(source_server, source_path, target_server, target_path, file_name, transfer_id, table):
+            return True
+
     target_user = SERVERS[target_server]['user']
     target_password = SERVERS[target_server].get('password')
     source_user = SERVERS[source_server]['user']
@@ -3579,13 +7845,13 @@ def transfer_file_via_remote_rsync_instant(source_server, source_path, target_se
         print(f"🔄 目标服务器执行的拉取命令: {remote_cmd}")
 
 
-        ssh = ssh_manager.get_connection(target_server)
-        if not ssh:
-            raise Exception(f"无法连接到目标服务器 {target_server}")
+        with ssh_manager.lease(target_server) as ssh:
+            if not ssh:
+                raise Exception(f"无法连接到目标服务器 {target_server}")
 
-        start_time = time.time()
-        part_id = f"rsync_{uuid.uuid4().hex}"
-        exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+            start_time = time.time()
+            part_id = f"rsync_{uuid.uuid4().hex}"
+            exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
         end_time = time.time()
         transfer_duration = end_time - start_time
         print(f"📊 拉取完成 - 耗时: {transfer_duration:.2f}秒, 状态: {exit_status}")
@@ -3636,11 +7902,11 @@ def transfer_file_via_remote_rsync_instant(source_server, source_path, target_se
     print(f"🔄 远程rsync命令: {remote_cmd}")
 
     start_time = time.time()
-    ssh = ssh_manager.get_connection(source_server)
-    if not ssh:
-        raise Exception(f"无法连接到源服务器 {source_server}")
-    part_id = f"rsync_{uuid.uuid4().hex}"
-    exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+    with ssh_manager.lease(source_server) as ssh:
+        if not ssh:
+            raise Exception(f"无法连接到源服务器 {source_server}")
+        part_id = f"rsync_{uuid.uuid4().hex}"
+        exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
     end_time = time.time()
     transfer_duration = end_time - start_time
     print(f"📊 传输完成 - 耗时: {transfer_duration:.2f}秒")
@@ -3730,15 +7996,15 @@ def transfer_file_via_remote_rsync(source_server, source_path, target_server, ta
             remote_cmd = f"rsync {' '.join(rsync_base_opts)} -e {shlex.quote(ssh_cmd)} {shlex.quote(source_path)} {shlex.quote(file_target_spec)}"
 
 
-    ssh = ssh_manager.get_connection(source_server)
-    if not ssh:
-        raise Exception(f"无法连接到源服务器 {source_server}")
+    with ssh_manager.lease(source_server) as ssh:
+        if not ssh:
+            raise Exception(f"无法连接到源服务器 {source_server}")
 
-    start_time = time.time()
+        start_time = time.time()
 
 
-    part_id = f"rsync_{uuid.uuid4().hex}"
-    exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+        part_id = f"rsync_{uuid.uuid4().hex}"
+        exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
     if exit_status != 0:
         raise Exception(f"rsync传输失败 (退出码: {exit_status}): {error}")
 
@@ -3749,11 +8015,8 @@ def start_sequential_transfer(transfer_id, source_server, source_files, target_s
 
 
 
-
-    if (is_windows_server(source_server) or is_windows_server(target_server)):
-        speed_simulator.init_transfer_speed(transfer_id, 50.0, 55.0)
-    else:
-        speed_simulator.init_transfer_speed(transfer_id)
+    if transfer_id not in rate_tracker.transfers:
+        rate_tracker.start_transfer(transfer_id)
 
     for file_info in source_files:
 
@@ -3778,7 +8041,6 @@ def start_sequential_transfer(transfer_id, source_server, source_files, target_s
         else:
             transfer_mode = 'remote_to_remote'
 
-        simulated_speed = speed_simulator.get_simulated_speed(transfer_id)
         elapsed_time = time_tracker.get_elapsed_time(transfer_id)
 
 
@@ -3919,9 +8181,7 @@ def start_sequential_transfer(transfer_id, source_server, source_files, target_s
                             remote_cmd = f"rsync {' '.join(rsync_base_opts)} -e {shlex.quote(ssh_to_source)} {shlex.quote(file_source_spec)} {shlex.quote(f'{target_path}/')}"
 
 
-                    ssh = ssh_manager.get_connection(target_server)
-                    if not ssh:
-                        raise Exception(f"无法连接到目标服务器 {target_server}")
+                    exec_server = target_server
                 else:
 
 
@@ -3945,9 +8205,7 @@ def start_sequential_transfer(transfer_id, source_server, source_files, target_s
                             remote_cmd = f"rsync {' '.join(rsync_base_opts)} -e {shlex.quote(ssh_to_target)} {shlex.quote(rsync_source_path)} {shlex.quote(file_target_spec)}"
 
 
-                    ssh = ssh_manager.get_connection(source_server)
-                    if not ssh:
-                        raise Exception(f"无法连接到源服务器 {source_server}")
+                    exec_server = source_server
 
                 import time
                 start_time = time.time()
@@ -3955,8 +8213,11 @@ def start_sequential_transfer(transfer_id, source_server, source_files, target_s
                 emit_transfer_log(transfer_id, f'⚡️ 开始传输 {file_name}...')
 
 
-                part_id = f"rsync_{uuid.uuid4().hex}"
-                exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
+                with ssh_manager.lease(exec_server) as ssh:
+                    if not ssh:
+                        raise Exception(f"无法连接到服务器 {exec_server}")
+                    part_id = f"rsync_{uuid.uuid4().hex}"
+                    exit_status, error = _run_remote_rsync_with_progress(ssh, remote_cmd, transfer_id, part_id)
                 if exit_status != 0:
                     raise Exception(f"传输 {file_name} 失败: {error}")
 
@@ -4023,6 +8284,8 @@ def start_sequential_transfer(transfer_id, source_server, source_files, target_s
             except Exception as e:
                 emit_transfer_log(transfer_id, f'❌ 删除源文件异常: {str(e)}')
 
+        transfer_journal.mark_unit(transfer_id, f"item:{source_path}")
+
     # Stop transfer timing.
     total_time = time_tracker.end_transfer(transfer_id)
 
@@ -5060,25 +9323,25 @@ def transfer_file_via_local_rsync(source_path, target_server, target_path, file_
 
 def transfer_file_via_paramiko(source_path, target_server, target_path, file_name, is_directory, transfer_id):
     """Transfer files with Paramiko (local to remote)."""
-    ssh = ssh_manager.get_connection(target_server)
-    if not ssh:
-        raise Exception(f"无法连接到目标服务器 {target_server}")
+    with ssh_manager.lease(target_server) as ssh:
+        if not ssh:
+            raise Exception(f"无法连接到目标服务器 {target_server}")
 
-    sftp = ssh.open_sftp()
+        sftp = ssh.open_sftp()
 
-    try:
-        if is_directory:
+        try:
+            if is_directory:
 
-            remote_dir_path = f"{target_path}/{file_name}"
-            emit_transfer_log(transfer_id, f'正在传输目录: {file_name}')
-            transfer_directory_to_remote(sftp, source_path, remote_dir_path, transfer_id)
-        else:
+                remote_dir_path = f"{target_path}/{file_name}"
+                emit_transfer_log(transfer_id, f'正在传输目录: {file_name}')
+                transfer_directory_to_remote(sftp, source_path, remote_dir_path, transfer_id)
+            else:
 
-            remote_file_path = f"{target_path}/{file_name}"
-            emit_transfer_log(transfer_id, f'正在传输文件: {file_name}')
-            sftp.put(source_path, remote_file_path)
-    finally:
-        sftp.close()
+                remote_file_path = f"{target_path}/{file_name}"
+                emit_transfer_log(transfer_id, f'正在传输文件: {file_name}')
+                sftp.put(source_path, remote_file_path, callback=bandwidth_manager.sftp_callback(transfer_id))
+        finally:
+            sftp.close()
 
 
 
@@ -5094,7 +9357,7 @@ def transfer_directory_to_remote(sftp, local_dir, remote_dir, transfer_id):
         remote_path = f"{remote_dir}/{item}"
 
         if os.path.isfile(local_path):
-            sftp.put(local_path, remote_path)
+            sftp.put(local_path, remote_path, callback=bandwidth_manager.sftp_callback(transfer_id))
         elif os.path.isdir(local_path):
             transfer_directory_to_remote(sftp, local_path, remote_path, transfer_id)
 
@@ -5111,7 +9374,7 @@ def transfer_directory_from_remote(sftp, remote_dir, local_dir, transfer_id):
             if stat.st_mode & 0o040000:
                 transfer_directory_from_remote(sftp, remote_path, local_path, transfer_id)
             else:
-                sftp.get(remote_path, local_path)
+                sftp.get(remote_path, local_path, callback=bandwidth_manager.sftp_callback(transfer_id))
         except:
             pass
 
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+OpenCV thumbnail jobs for the image worker pool.
+
+Kept free of Flask/SSH imports so pool workers only pull in cv2/numpy.
+"""
+
+from multiprocessing import shared_memory
+
+
+_DECODE_FLAG_NAMES = ('unchanged', 'color', 'reduced2', 'reduced4', 'reduced8')
+
+
+def init_worker():
+    """Pool initializer: keep each worker single-threaded inside OpenCV."""
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except Exception:
+        pass
+
+
+def _decode_flag(cv2, name):
+    return {
+        'color': cv2.IMREAD_COLOR,
+        'reduced2': cv2.IMREAD_REDUCED_COLOR_2,
+        'reduced4': cv2.IMREAD_REDUCED_COLOR_4,
+        'reduced8': cv2.IMREAD_REDUCED_COLOR_8,
+    }.get(name, cv2.IMREAD_UNCHANGED)
+
+
+def decode_image(buf, decode_flag='unchanged'):
+    """Decode an encoded image from any buffer (bytes, memoryview, shared memory)."""
+    import cv2
+    import numpy as np
+    try:
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        return cv2.imdecode(arr, _decode_flag(cv2, decode_flag))
+    except Exception:
+        return None
+
+
+def read_image_file(path, decode_flag='unchanged'):
+    import cv2
+    return cv2.imread(path, _decode_flag(cv2, decode_flag))
+
+
+def is_small_image(img, dim_limit):
+    try:
+        if img is None:
+            return False
+        h, w = img.shape[:2]
+        return int(w) > 0 and int(h) > 0 and int(w) < dim_limit and int(h) < dim_limit
+    except Exception:
+        return False
+
+
+def transform_image(img, opts):
+    """Downscale and re-encode a decoded image; returns (bytes, mime) or (None, None)."""
+    import cv2
+    if img is None:
+        return None, None
+    h, w = img.shape[:2]
+    if w <= 0 or h <= 0:
+        return None, None
+
+    new_w = opts['width']
+    new_h = opts['height']
+    out_img = img
+    did_resize = False
+    if opts['resize_requested'] and (new_w > 0 or new_h > 0):
+        target_w, target_h = new_w, new_h
+        if target_w > 0 and target_h > 0:
+            ratio = min(target_w / w, target_h / h)
+        elif target_w > 0:
+            ratio = target_w / w
+        else:
+            ratio = target_h / h
+
+        # Only downscale; keep original size when ratio >= 1 unless a re-encode is requested.
+        if ratio > 0 and ratio < 1:
+            target_w = max(1, int(w * ratio))
+            target_h = max(1, int(h * ratio))
+            interp_method = cv2.INTER_AREA if opts['interp'] == 'area' else cv2.INTER_LANCZOS4
+            out_img = cv2.resize(img, (target_w, target_h), interpolation=interp_method)
+            did_resize = True
+
+    if opts['resize_requested'] and not did_resize and not opts['encode_requested'] and not opts['fmt_requested']:
+        return None, None
+
+    fmt = opts['format']
+    if fmt not in {'jpg', 'png', 'webp'}:
+        fmt = 'jpg'
+
+    q = opts['quality']
+    if fmt == 'webp':
+        ok, enc = cv2.imencode('.webp', out_img, [int(cv2.IMWRITE_WEBP_QUALITY), q])
+        if ok:
+            return enc.tobytes(), 'image/webp'
+        # Fallback to jpeg.
+        ok, enc = cv2.imencode('.jpg', out_img, [int(cv2.IMWRITE_JPEG_QUALITY), q])
+        if ok:
+            return enc.tobytes(), 'image/jpeg'
+        return None, None
+    if fmt == 'png':
+        ok, enc = cv2.imencode('.png', out_img, [int(cv2.IMWRITE_PNG_COMPRESSION), 3])
+        if ok:
+            return enc.tobytes(), 'image/png'
+        return None, None
+
+    ok, enc = cv2.imencode('.jpg', out_img, [int(cv2.IMWRITE_JPEG_QUALITY), q])
+    if ok:
+        return enc.tobytes(), 'image/jpeg'
+    return None, None
+
+
+def thumbnail_job(source, opts):
+    """Worker entry point.
+
+    source is ('file', path), ('bytes', data) or ('shm', name, size); the shared
+    memory variant lets large originals reach the worker without pickling them.
+    Returns ('decode_failed', None), ('small', None) when the original should be
+    sent as-is, or ('ok', (data, mime)) where data may be None if encoding failed.
+    """
+    kind = source[0]
+    shm = None
+    try:
+        if kind == 'file':
+            img = read_image_file(source[1], opts.get('decode_flag', 'unchanged'))
+        elif kind == 'shm':
+            shm = shared_memory.SharedMemory(name=source[1])
+            img = decode_image(shm.buf[:source[2]], opts.get('decode_flag', 'unchanged'))
+        else:
+            img = decode_image(source[1], opts.get('decode_flag', 'unchanged'))
+    finally:
+        if shm is not None:
+            shm.close()
+
+    if img is None:
+        return 'decode_failed', None
+    if opts.get('small_dim_limit') and is_small_image(img, opts['small_dim_limit']):
+        return 'small', None
+    return 'ok', transform_image(img, opts)
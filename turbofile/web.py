@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, request, jsonify, Response, redirect, send_from_directory
+from flask import Blueprint, render_template, request, jsonify, Response, redirect, send_from_directory, current_app, stream_with_context
 from flask_socketio import emit
 
+import base64
 import codecs
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
 import posixpath
 import os
 import re
@@ -10,7 +15,11 @@ import threading
 import time
 import uuid
 import zipfile
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from multiprocessing import shared_memory
 
+from . import imaging
 from .extensions import socketio
 from .core import *  # noqa: F403 - Keep legacy imports; refine to explicit later.
 
@@ -24,6 +33,18 @@ _REMOTE_WIN_IMAGE_TOOL_CACHE = {}
 _REMOTE_WIN_IMAGE_TOOL_CACHE_GUARD = threading.Lock()
 _REMOTE_WIN_IMAGE_TOOL_CACHE_TTL_SEC = 300
 
+# Warm SFTP sessions on the shared per-host SSH client; ssh_pool_config keeps the count low so
+# the transport stays under sshd's MaxSessions alongside scheduled command channels.
+_SFTP_SESSION_CACHE = {}
+_SFTP_SESSION_CACHE_GUARD = threading.Condition(threading.Lock())
+_SFTP_SESSION_LOCAL = threading.local()
+_SFTP_SESSION_IDLE_SEC = 120
+_SFTP_SESSIONS_PER_SERVER = max(1, int(SSH_POOL_CONFIG['sftp_sessions_per_server']))
+_SFTP_SESSION_WAIT_SEC = SSH_POOL_CONFIG['sftp_session_wait']
+
+IMAGE_BATCH_MAX_PATHS = 500
+IMAGE_BATCH_MAX_COMMAND_BYTES = 96 * 1024
+
 _SERVER_ACCESS_KEYS = ('server', 'source_server', 'target_server', 'server_a', 'server_b')
 
 TEXT_EDITOR_FULL_READ_MAX_BYTES = 1024 * 1024
@@ -135,12 +156,11 @@ def _extract_zip_local_linux(file_path: str, base_dir: str):
 
 
 def _extract_zip_remote_linux(server_ip: str, file_path: str, base_dir: str):
-    ssh = ssh_manager.get_connection(server_ip)
-    if not ssh:
-        raise RuntimeError(f'无法连接到服务器 {server_ip}')
-    sftp = None
+    entry = _checkout_sftp_session(server_ip)
     try:
-        sftp = ssh.open_sftp()
+        sftp = entry['sftp']
+        if sftp is None:
+            raise RuntimeError(f'无法打开 SFTP 会话: {server_ip}')
         archive_file, _ = _sftp_open_with_fallback(sftp, file_path, 'rb', False)
         with archive_file:
             with zipfile.ZipFile(archive_file) as archive:
@@ -168,11 +188,7 @@ def _extract_zip_remote_linux(server_ip: str, file_path: str, base_dir: str):
                     except Exception:
                         pass
     finally:
-        if sftp:
-            try:
-                sftp.close()
-            except Exception:
-                pass
+        _release_sftp_session(entry)
 
 
 def _collect_requested_server_ips():
@@ -411,13 +427,7 @@ def _exec_ssh_command_bytes(ssh, command: str, timeout_sec: float = 25.0):
     if not ssh or not command:
         return b'', b'', 1
     try:
-        stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout_sec)
-        out_b = stdout.read() if stdout else b''
-        err_b = stderr.read() if stderr else b''
-        try:
-            exit_code = stdout.channel.recv_exit_status() if stdout and stdout.channel else 0
-        except Exception:
-            exit_code = 0 if out_b else 1
+        out_b, err_b, exit_code = ssh_manager.exec_command_bytes(ssh, command, timeout=timeout_sec)
         return out_b or b'', err_b or b'', int(exit_code or 0)
     except Exception as e:
         return b'', str(e).encode('utf-8', errors='ignore'), 1
@@ -809,20 +819,139 @@ def _read_posix_file_range_via_ssh(ssh, path: str, offset: int = 0, length: int
     raise last_err or FileNotFoundError(path)
 
 
-def _read_remote_file_bytes(server_ip: str, path: str, timeout_sec: float = 30.0) -> bytes:
-    """Read remote file bytes via SFTP first, then fall back to SSH shell reads."""
+def _sftp_session_alive(entry) -> bool:
+    sftp = entry.get('sftp')
+    ssh = entry.get('ssh')
+    try:
+        channel = sftp.get_channel() if sftp else None
+        transport = ssh.get_transport() if ssh else None
+        return bool(channel and not channel.closed and transport and transport.is_active())
+    except Exception:
+        return False
+
+
+def _close_sftp_entry(entry):
+    try:
+        if entry.get('sftp'):
+            entry['sftp'].close()
+    except Exception:
+        pass
+
+
+def _sweep_sftp_sessions(now: float):
+    """Drop idle or dead cached sessions; caller must hold the cache guard."""
+    expired = []
+    for server_ip in list(_SFTP_SESSION_CACHE.keys()):
+        keep = []
+        for entry in _SFTP_SESSION_CACHE[server_ip]:
+            busy = entry['owner'] is not None
+            idle = (now - entry['last_used']) >= _SFTP_SESSION_IDLE_SEC
+            if not busy and (idle or not _sftp_session_alive(entry)):
+                expired.append(entry)
+            else:
+                keep.append(entry)
+        if keep:
+            _SFTP_SESSION_CACHE[server_ip] = keep
+        else:
+            _SFTP_SESSION_CACHE.pop(server_ip, None)
+    return expired
+
+
+def _checkout_sftp_session(server_ip: str):
+    """Borrow a warm SFTP session for server_ip (reentrant per thread); entry['sftp'] may be None."""
+    held = getattr(_SFTP_SESSION_LOCAL, 'entries', None)
+    if held is None:
+        held = _SFTP_SESSION_LOCAL.entries = {}
+    entry = held.get(server_ip)
+    if entry is not None:
+        entry['depth'] += 1
+        return entry
+
     ssh = ssh_manager.get_connection(server_ip)
     if not ssh:
         raise RuntimeError('SSH连接失败')
+    me = threading.get_ident()
+    deadline = time.time() + _SFTP_SESSION_WAIT_SEC
+    expired = []
+    with _SFTP_SESSION_CACHE_GUARD:
+        while True:
+            now = time.time()
+            expired.extend(_sweep_sftp_sessions(now))
+            sessions = _SFTP_SESSION_CACHE.setdefault(server_ip, [])
+            entry = next((e for e in sessions if e['owner'] is None and e['ssh'] is ssh and _sftp_session_alive(e)), None)
+            reserved = False
+            if entry is None and (len(sessions) < _SFTP_SESSIONS_PER_SERVER or now >= deadline):
+                # Reserve a slot before opening so concurrent callers wait instead of all opening.
+                entry = {'ssh': ssh, 'sftp': None, 'owner': me, 'depth': 0, 'last_used': now,
+                         'cached': len(sessions) < _SFTP_SESSIONS_PER_SERVER}
+                if entry['cached']:
+                    sessions.append(entry)
+                reserved = True
+            if entry is not None:
+                entry['owner'] = me
+                entry['depth'] = 1
+                entry['last_used'] = now
+                break
+            # Woken by _release_sftp_session; past the deadline the next pass opens an uncached session.
+            _SFTP_SESSION_CACHE_GUARD.wait(max(0.0, deadline - now))
+    for stale in expired:
+        _close_sftp_entry(stale)
 
-    sftp = None
-    is_windows = is_windows_server(server_ip)
-    try:
+    if reserved:
         try:
-            sftp = ssh.open_sftp()
+            entry['sftp'] = ssh.open_sftp()
         except Exception:
-            sftp = None
+            entry['sftp'] = None
+        if entry['sftp'] is None and entry['cached']:
+            with _SFTP_SESSION_CACHE_GUARD:
+                sessions = _SFTP_SESSION_CACHE.get(server_ip, [])
+                _SFTP_SESSION_CACHE[server_ip] = [e for e in sessions if e is not entry]
+                _SFTP_SESSION_CACHE_GUARD.notify()
+            entry['cached'] = False
+    entry['server'] = server_ip
+    held[server_ip] = entry
+    return entry
+
+
+def _release_sftp_session(entry, broken: bool = False):
+    if not entry:
+        return
+    entry['depth'] -= 1
+    if entry['depth'] > 0:
+        return
+    held = getattr(_SFTP_SESSION_LOCAL, 'entries', None)
+    if held is not None and held.get(entry['server']) is entry:
+        held.pop(entry['server'], None)
+    if not entry.get('cached'):
+        _close_sftp_entry(entry)
+        return
+    drop = False
+    with _SFTP_SESSION_CACHE_GUARD:
+        entry['owner'] = None
+        entry['last_used'] = time.time()
+        if broken or not _sftp_session_alive(entry):
+            sessions = _SFTP_SESSION_CACHE.get(entry['server'], [])
+            _SFTP_SESSION_CACHE[entry['server']] = [e for e in sessions if e is not entry]
+            drop = True
+        _SFTP_SESSION_CACHE_GUARD.notify_all()
+    if drop:
+        _close_sftp_entry(entry)
+
+
+@contextmanager
+def _sftp_session(server_ip: str):
+    """Yield (ssh, sftp) from the per-server SFTP session cache; sftp is None if the subsystem is unavailable."""
+    entry = _checkout_sftp_session(server_ip)
+    try:
+        yield entry['ssh'], entry['sftp']
+    finally:
+        _release_sftp_session(entry)
+
 
+def _read_remote_file_bytes(server_ip: str, path: str, timeout_sec: float = 30.0) -> bytes:
+    """Read remote file bytes via SFTP first, then fall back to SSH shell reads."""
+    is_windows = is_windows_server(server_ip)
+    with _sftp_session(server_ip) as (ssh, sftp):
         try:
             fobj, _ = _sftp_open_with_fallback(sftp, path, 'rb', is_windows)
             with fobj as f:
@@ -834,12 +963,6 @@ def _read_remote_file_bytes(server_ip: str, path: str, timeout_sec: float = 30.0
             if is_windows:
                 return _read_windows_file_bytes_via_ssh(ssh, path, timeout_sec=timeout_sec)
             return _read_posix_file_bytes_via_ssh(ssh, path, timeout_sec=timeout_sec)
-    finally:
-        if sftp:
-            try:
-                sftp.close()
-            except Exception:
-                pass
 
 
 def _read_remote_file_range(server_ip: str, path: str, offset: int = 0, length: int = None, timeout_sec: float = 30.0) -> bytes:
@@ -847,23 +970,13 @@ def _read_remote_file_range(server_ip: str, path: str, offset: int = 0, length:
     if offset <= 0 and length is None:
         return _read_remote_file_bytes(server_ip, path, timeout_sec=timeout_sec)
 
-    ssh = ssh_manager.get_connection(server_ip)
-    if not ssh:
-        raise RuntimeError('SSH连接失败')
-
-    sftp = None
     is_windows = is_windows_server(server_ip)
     offset = max(int(offset or 0), 0)
     length = None if length is None else max(int(length or 0), 0)
     if length == 0:
         return b''
 
-    try:
-        try:
-            sftp = ssh.open_sftp()
-        except Exception:
-            sftp = None
-
+    with _sftp_session(server_ip) as (ssh, sftp):
         try:
             fobj, _ = _sftp_open_with_fallback(sftp, path, 'rb', is_windows)
             with fobj as f:
@@ -877,12 +990,6 @@ def _read_remote_file_range(server_ip: str, path: str, offset: int = 0, length:
             if is_windows:
                 return _read_windows_file_range_via_ssh(ssh, path, offset=offset, length=length, timeout_sec=timeout_sec)
             return _read_posix_file_range_via_ssh(ssh, path, offset=offset, length=length, timeout_sec=timeout_sec)
-    finally:
-        if sftp:
-            try:
-                sftp.close()
-            except Exception:
-                pass
 
 
 def _decode_text_bytes(data: bytes):
@@ -995,18 +1102,8 @@ def _stat_posix_file_via_ssh(ssh, path: str, timeout_sec: float = 12.0):
 
 def _stat_remote_file(server_ip: str, path: str, timeout_sec: float = 12.0):
     """Return (size_bytes:int, mtime_unix:int) for a remote file."""
-    ssh = ssh_manager.get_connection(server_ip)
-    if not ssh:
-        raise RuntimeError('SSH连接失败')
-
-    sftp = None
     is_windows = is_windows_server(server_ip)
-    try:
-        try:
-            sftp = ssh.open_sftp()
-        except Exception:
-            sftp = None
-
+    with _sftp_session(server_ip) as (ssh, sftp):
         try:
             st, _ = _sftp_stat_with_fallback(sftp, path, is_windows)
             return int(getattr(st, 'st_size', 0) or 0), int(getattr(st, 'st_mtime', 0) or 0)
@@ -1014,12 +1111,6 @@ def _stat_remote_file(server_ip: str, path: str, timeout_sec: float = 12.0):
             if is_windows:
                 return _windows_file_stat_via_ssh(ssh, path, timeout_sec=timeout_sec)
             return _stat_posix_file_via_ssh(ssh, path, timeout_sec=timeout_sec)
-    finally:
-        if sftp:
-            try:
-                sftp.close()
-            except Exception:
-                pass
 
 
 def _stat_file(server_ip: str, path: str, timeout_sec: float = 12.0):
@@ -1054,6 +1145,368 @@ def _apply_netron_cors_headers(resp: Response):
     return resp
 
 
+class ThumbnailDiskCache:
+    """Content-addressed thumbnail store under data/ with a byte budget and LRU eviction."""
+
+    _EXT_BY_MIME = {
+        'image/jpeg': 'jpg',
+        'image/png': 'png',
+        'image/webp': 'webp',
+        'image/gif': 'gif',
+        'image/bmp': 'bmp',
+        'image/tiff': 'tif',
+        'application/octet-stream': 'bin',
+    }
+
+    def __init__(self, root_dir, max_bytes, max_entry_bytes):
+        self.root_dir = root_dir
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entry_bytes = max(0, int(max_entry_bytes))
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(server_ip, path, size, mtime, width, height, quality, fmt, interp):
+        raw = json.dumps([server_ip, path, int(size), int(mtime), int(width), int(height), int(quality), fmt, interp],
+                         ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def etag_for(key):
+        return f'"{key[:32]}"'
+
+    def _path_for(self, key, ext):
+        return os.path.join(self.root_dir, key[:2], f'{key}.{ext}')
+
+    def _mime_for_ext(self, ext):
+        for mime, known in self._EXT_BY_MIME.items():
+            if known == ext:
+                return mime
+        return 'application/octet-stream'
+
+    def _ensure_loaded(self):
+        """Rebuild the index from disk once, oldest-used first."""
+        if self.loaded:
+            return
+        found = []
+        if os.path.isdir(self.root_dir):
+            for dirpath, _, filenames in os.walk(self.root_dir):
+                for name in filenames:
+                    key, _, ext = name.partition('.')
+                    if len(key) != 64 or not ext or ext.endswith('.tmp'):
+                        continue
+                    full = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, key, ext, st.st_size))
+        found.sort()
+        for _, key, ext, size in found:
+            self.entries[key] = (ext, size)
+            self.total_bytes += size
+        self.loaded = True
+        self._evict_locked()
+
+    def _evict_locked(self):
+        removed = []
+        while self.entries and self.total_bytes > self.max_bytes:
+            key, (ext, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            removed.append(self._path_for(key, ext))
+        return removed
+
+    def get(self, key):
+        """Return (bytes, mime) for a cached thumbnail, or None."""
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        ext, size = entry
+        file_path = self._path_for(key, ext)
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            os.utime(file_path, None)
+        except OSError:
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    self.total_bytes -= size
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return data, self._mime_for_ext(ext)
+
+    def contains(self, key):
+        with self.lock:
+            self._ensure_loaded()
+            return key in self.entries
+
+    def put(self, key, data, mime):
+        if not data or len(data) > self.max_entry_bytes or len(data) > self.max_bytes:
+            return False
+        ext = self._EXT_BY_MIME.get((mime or '').split(';')[0].strip().lower(), 'bin')
+        file_path = self._path_for(key, ext)
+        tmp_path = f'{file_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        with self.lock:
+            self._ensure_loaded()
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self.entries[key] = (ext, len(data))
+            self.total_bytes += len(data)
+            removed = self._evict_locked()
+            if old is not None and old[0] != ext:
+                removed.append(self._path_for(key, old[0]))
+        for stale in removed:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        return True
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+thumbnail_cache = ThumbnailDiskCache(
+    THUMBNAIL_CACHE_CONFIG['cache_dir'],
+    THUMBNAIL_CACHE_CONFIG['max_bytes'],
+    THUMBNAIL_CACHE_CONFIG['max_entry_bytes'],
+)
+
+
+class ImagePoolSaturated(Exception):
+    """Raised when the image worker pool and its queue are full."""
+
+
+class ImageTransformPool:
+    """Bounded process pool for OpenCV thumbnail jobs, with backpressure and per-format latency stats."""
+
+    def __init__(self, max_workers, queue_limit, job_timeout, shm_min_bytes, latency_window=512):
+        self.max_workers = max(1, int(max_workers))
+        self.queue_limit = max(0, int(queue_limit))
+        self.job_timeout = max(1.0, float(job_timeout))
+        self.shm_min_bytes = max(0, int(shm_min_bytes))
+        self.capacity = threading.BoundedSemaphore(self.max_workers + self.queue_limit)
+        self.executor = None
+        self.in_flight = 0
+        self.rejected = 0
+        self.failures = 0
+        self.latency = {}
+        self.latency_window = max(16, int(latency_window))
+        self.lock = threading.Lock()
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # Never fork this multithreaded process (locks held by other threads would be copied
+                # locked); workers come from a forkserver that has only imported turbofile.imaging.
+                ctx = multiprocessing.get_context('forkserver')
+                ctx.set_forkserver_preload(['turbofile.imaging'])
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=ctx,
+                    initializer=imaging.init_worker,
+                )
+            return self.executor
+
+    def _reset_executor(self, broken):
+        with self.lock:
+            if self.executor is broken:
+                self.executor = None
+        try:
+            broken.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+    def _record(self, fmt, seconds, ok):
+        with self.lock:
+            samples = self.latency.get(fmt)
+            if samples is None:
+                samples = self.latency[fmt] = deque(maxlen=self.latency_window)
+            samples.append(seconds)
+            if not ok:
+                self.failures += 1
+
+    def run(self, source, opts):
+        """Run imaging.thumbnail_job in a worker; raise ImagePoolSaturated instead of queueing unboundedly.
+
+        source is ('file', path) or ('bytes', data); large byte payloads are handed
+        over through shared memory rather than pickled into the call pipe.
+        """
+        if not self.capacity.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise ImagePoolSaturated('图片处理队列已满')
+        with self.lock:
+            self.in_flight += 1
+        started = time.monotonic()
+        shm = None
+        ok = False
+        submitted = False
+        try:
+            if source[0] == 'bytes' and len(source[1]) >= self.shm_min_bytes:
+                payload = source[1]
+                shm = shared_memory.SharedMemory(create=True, size=len(payload))
+                shm.buf[:len(payload)] = payload
+                source = ('shm', shm.name, len(payload))
+            executor = self._get_executor()
+            try:
+                future = executor.submit(imaging.thumbnail_job, source, opts)
+            except concurrent.futures.process.BrokenProcessPool:
+                # Broken while nobody was waiting on a result: rebuild it and submit once more.
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(imaging.thumbnail_job, source, opts)
+            submitted = True
+            # The slot (and the shared memory) stay held until the worker is really done, even when
+            # the caller gives up on a timeout, so slow images cannot pile up work behind the 429 limit.
+            future.add_done_callback(lambda _: self._finish(shm))
+            try:
+                result = future.result(timeout=self.job_timeout)
+            except concurrent.futures.process.BrokenProcessPool:
+                self._reset_executor(executor)
+                raise
+            ok = result[0] != 'decode_failed'
+            return result
+        finally:
+            self._record(opts.get('format') or 'jpg', time.monotonic() - started, ok)
+            if not submitted:
+                self._finish(shm)
+
+    def _finish(self, shm):
+        if shm is not None:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        with self.lock:
+            self.in_flight -= 1
+        self.capacity.release()
+
+    def get_stats(self):
+        with self.lock:
+            formats = {}
+            for fmt, samples in self.latency.items():
+                ordered = sorted(samples)
+                if not ordered:
+                    continue
+
+                def _pct(p):
+                    return round(ordered[min(len(ordered) - 1, int(p * (len(ordered) - 1) + 0.5))] * 1000, 1)
+
+                formats[fmt] = {
+                    'count': len(ordered),
+                    'p50_ms': _pct(0.50),
+                    'p90_ms': _pct(0.90),
+                    'p99_ms': _pct(0.99),
+                    'max_ms': round(ordered[-1] * 1000, 1),
+                }
+            return {
+                'max_workers': self.max_workers,
+                'queue_limit': self.queue_limit,
+                'in_flight': self.in_flight,
+                'rejected': self.rejected,
+                'failures': self.failures,
+                'latency': formats,
+            }
+
+
+image_transform_pool = ImageTransformPool(
+    IMAGE_TRANSFORM_POOL_CONFIG['max_workers'],
+    IMAGE_TRANSFORM_POOL_CONFIG['queue_limit'],
+    IMAGE_TRANSFORM_POOL_CONFIG['job_timeout'],
+    IMAGE_TRANSFORM_POOL_CONFIG['shm_min_bytes'],
+)
+
+
+def _if_none_match_hits(etag: str) -> bool:
+    header = request.headers.get('If-None-Match') or ''
+    if not header or not etag:
+        return False
+    candidates = [item.strip() for item in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def _thumbnail_cache_response(data, mime, etag, status):
+    resp = Response(data, mimetype=mime or 'application/octet-stream')
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    resp.headers['X-TurboFile-Image-Cache'] = status
+    return resp
+
+
+def _normalize_image_thumb_params(args):
+    """Return (width, height, quality, fmt, interp) normalized like the renderer, or None when no transform is requested."""
+    def _safe_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    new_w = _safe_int(args.get('width', 0))
+    new_h = _safe_int(args.get('height', 0))
+    quality = _safe_int(args.get('quality', 0))
+    interp = str(args.get('interp') or '').strip().lower()
+    img_format = str(args.get('format') or '').strip().lower()
+    if not (new_w or new_h or quality or interp or img_format):
+        return None
+
+    quality_eff = quality if 1 <= quality <= 95 else 82
+    interp_key = interp if interp in {'lanczos', 'lanczos4', 'sharp'} else 'area'
+    fmt_key = img_format if img_format in {'jpg', 'jpeg', 'png', 'webp'} else ''
+    if fmt_key == 'jpeg':
+        fmt_key = 'jpg'
+    if not fmt_key:
+        fmt_key = 'jpg'
+    return new_w, new_h, quality_eff, fmt_key, interp_key
+
+
+def _image_stream_cache_key(server_ip: str, path: str):
+    """Cache key for a transformed /api/image/stream request, or None when it should bypass the cache."""
+    if not THUMBNAIL_CACHE_CONFIG.get('enabled', True) or not server_ip or not path:
+        return None
+    params = _normalize_image_thumb_params(request.args)
+    if params is None:
+        return None
+    try:
+        size, mtime = _stat_file(server_ip, path, timeout_sec=8.0)
+    except Exception:
+        return None
+    return ThumbnailDiskCache.make_key(server_ip, path, size, mtime, *params)
+
+
 def _get_netron_package_dir():
     try:
         import netron
@@ -1091,8 +1544,38 @@ def index():
         transfer_bytes_enabled=TRANSFER_BYTES_CONFIG.get('enabled', True)
     )
 
+# Engines that serve the original bytes untouched; their responses are never cached.
+_RAW_IMAGE_ENGINES = frozenset({'unknown', 'raw', 'raw-small-original', 'windows-pwsh', 'posix-ssh'})
+
+
 @bp.route('/api/image/stream')
 def api_image_stream():
+    """Serve an image preview; transformed thumbnails are answered from the on-disk cache when possible."""
+    server_ip = request.args.get('server')
+    path = request.args.get('path')
+    key = _image_stream_cache_key(server_ip, path)
+    if not key:
+        return _render_image_stream()
+
+    etag = ThumbnailDiskCache.etag_for(key)
+    if _if_none_match_hits(etag):
+        resp = _thumbnail_cache_response(b'', None, etag, 'HIT')
+        resp.status_code = 304
+        return resp
+    cached = thumbnail_cache.get(key)
+    if cached:
+        return _thumbnail_cache_response(cached[0], cached[1], etag, 'HIT')
+
+    resp = _render_image_stream()
+    if (isinstance(resp, Response) and resp.status_code == 200 and not resp.is_streamed
+            and resp.headers.get('X-TurboFile-Image-Cache') == 'MISS'):
+        thumbnail_cache.put(key, resp.get_data(), resp.mimetype)
+        resp.headers['ETag'] = etag
+        resp.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return resp
+
+
+def _render_image_stream():
     server_ip = request.args.get('server')
     path = request.args.get('path')
     small_image_dim_limit = 100
@@ -1128,16 +1611,15 @@ def api_image_stream():
     is_windows = is_windows_server(server_ip)
     ssh = None
     sftp = None
+    sftp_entry = None
     engine = 'unknown'
     resolved_remote_path = path
 
     try:
-        import cv2
-        import numpy as np
-
-        def _decode_image_bytes(img_bytes: bytes):
+        def _decode_flag_name(img_bytes: bytes):
+            """Pick a reduced JPEG decode when the requested size allows it."""
             try:
-                decode_flag = cv2.IMREAD_UNCHANGED
+                decode_flag = 'unchanged'
                 if resize_requested and (new_w > 0 or new_h > 0):
                     lower = (path or '').lower()
                     is_jpeg = lower.endswith(('.jpg', '.jpeg')) or (isinstance(img_bytes, (bytes, bytearray)) and bytes(img_bytes[:2]) == b'\xFF\xD8')
@@ -1160,44 +1642,50 @@ def api_image_stream():
                                 reduce_factor = 2
 
                             if reduce_factor == 8:
-                                decode_flag = cv2.IMREAD_REDUCED_COLOR_8
+                                decode_flag = 'reduced8'
                             elif reduce_factor == 4:
-                                decode_flag = cv2.IMREAD_REDUCED_COLOR_4
+                                decode_flag = 'reduced4'
                             elif reduce_factor == 2:
-                                decode_flag = cv2.IMREAD_REDUCED_COLOR_2
+                                decode_flag = 'reduced2'
                             else:
-                                decode_flag = cv2.IMREAD_COLOR
-
-                arr = np.frombuffer(img_bytes, dtype=np.uint8)
-                return cv2.imdecode(arr, decode_flag)
+                                decode_flag = 'color'
+                return decode_flag
             except Exception:
-                return None
+                return 'unchanged'
+
+        transform_opts = {
+            'width': new_w,
+            'height': new_h,
+            'quality': quality_eff,
+            'format': fmt_key,
+            'interp': interp_key,
+            'resize_requested': resize_requested,
+            'encode_requested': encode_requested,
+            'fmt_requested': fmt_requested,
+        }
 
-        def _is_small_original_image(img) -> bool:
-            try:
-                if img is None:
-                    return False
-                h, w = img.shape[:2]
-                return int(w) > 0 and int(h) > 0 and int(w) < small_image_dim_limit and int(h) < small_image_dim_limit
-            except Exception:
-                return False
+        def _pool_thumbnail(source, decode_flag='unchanged'):
+            """Decode, size-check and transform in the image worker pool."""
+            opts = dict(transform_opts, decode_flag=decode_flag, small_dim_limit=small_image_dim_limit)
+            return image_transform_pool.run(source, opts)
 
         def _raw_image_payload(img_bytes: bytes):
             return img_bytes, (_guess_image_mime_from_path(path) or 'application/octet-stream')
 
         def _try_read_remote_small_original():
+            """(data, mime, engine) for originals whose header says they are small; (None, None, None) otherwise."""
             try:
                 head = _read_remote_file_range(server_ip, path, offset=0, length=131072, timeout_sec=8.0)
                 dims = _try_parse_image_dimensions(head, path)
                 if not dims:
-                    return None, None
+                    return None, None, None
                 width, height = dims
                 if int(width) <= 0 or int(height) <= 0:
-                    return None, None
+                    return None, None, None
                 if int(width) >= small_image_dim_limit or int(height) >= small_image_dim_limit:
-                    return None, None
+                    return None, None, None
             except Exception:
-                return None, None
+                return None, None, None
 
             try:
                 raw_bytes = None
@@ -1214,68 +1702,19 @@ def api_image_stream():
                         raw_bytes = _read_posix_file_bytes_via_ssh(ssh, path)
 
                 if not raw_bytes:
-                    return None, None
-
-                img = _decode_image_bytes(raw_bytes)
-                if _is_small_original_image(img):
-                    return _raw_image_payload(raw_bytes)
+                    return None, None, None
+
+                # Decode in the worker pool: the header check can be wrong, so confirm (or transform) there.
+                status, result = _pool_thumbnail(('bytes', raw_bytes), _decode_flag_name(raw_bytes))
+                if status == 'small':
+                    return _raw_image_payload(raw_bytes) + ('raw-small-original',)
+                if status == 'ok' and result and result[0] and result[1]:
+                    return result[0], result[1], 'opencv'
+            except ImagePoolSaturated:
+                raise
             except Exception:
-                return None, None
-            return None, None
-
-        def _transform_cv_image(img):
-            if img is None:
-                return None, None
-            h, w = img.shape[:2]
-            if w <= 0 or h <= 0:
-                return None, None
-
-            out_img = img
-            did_resize = False
-            if resize_requested and (new_w > 0 or new_h > 0):
-                target_w, target_h = new_w, new_h
-                if target_w > 0 and target_h > 0:
-                    ratio = min(target_w / w, target_h / h)
-                elif target_w > 0:
-                    ratio = target_w / w
-                else:
-                    ratio = target_h / h
-
-                # Only downscale; keep original size when ratio >= 1 unless a re-encode is requested.
-                if ratio > 0 and ratio < 1:
-                    target_w = max(1, int(w * ratio))
-                    target_h = max(1, int(h * ratio))
-                    interp_method = cv2.INTER_AREA if interp_key == 'area' else cv2.INTER_LANCZOS4
-                    out_img = cv2.resize(img, (target_w, target_h), interpolation=interp_method)
-                    did_resize = True
-
-            if resize_requested and not did_resize and not encode_requested and not fmt_requested:
-                return None, None
-
-            fmt = fmt_key
-            if fmt not in {'jpg', 'png', 'webp'}:
-                fmt = 'jpg'
-
-            q = quality_eff
-            if fmt == 'webp':
-                ok, enc = cv2.imencode('.webp', out_img, [int(cv2.IMWRITE_WEBP_QUALITY), q])
-                if ok:
-                    return enc.tobytes(), 'image/webp'
-                # Fallback to jpeg.
-                ok, enc = cv2.imencode('.jpg', out_img, [int(cv2.IMWRITE_JPEG_QUALITY), q])
-                if ok:
-                    return enc.tobytes(), 'image/jpeg'
-                return None, None
-            if fmt == 'png':
-                ok, enc = cv2.imencode('.png', out_img, [int(cv2.IMWRITE_PNG_COMPRESSION), 3])
-                if ok:
-                    return enc.tobytes(), 'image/png'
-                return None, None
-
-            ok, enc = cv2.imencode('.jpg', out_img, [int(cv2.IMWRITE_JPEG_QUALITY), q])
-            if ok:
-                return enc.tobytes(), 'image/jpeg'
-            return None, None
+                return None, None, None
+            return None, None, None
 
         # Local read.
         if is_local:
@@ -1305,7 +1744,7 @@ def api_image_stream():
                 resp.headers['X-TurboFile-Image-Engine'] = 'raw-small-original'
                 return resp
 
-            img_read_flag = cv2.IMREAD_UNCHANGED
+            img_read_flag = 'unchanged'
             try:
                 lower = (path or '').lower()
                 if resize_requested and (new_w > 0 or new_h > 0) and lower.endswith(('.jpg', '.jpeg')):
@@ -1327,18 +1766,18 @@ def api_image_stream():
                             elif orig_w // 2 >= desired_w and orig_h // 2 >= desired_h:
                                 reduce_factor = 2
                             if reduce_factor == 8:
-                                img_read_flag = cv2.IMREAD_REDUCED_COLOR_8
+                                img_read_flag = 'reduced8'
                             elif reduce_factor == 4:
-                                img_read_flag = cv2.IMREAD_REDUCED_COLOR_4
+                                img_read_flag = 'reduced4'
                             elif reduce_factor == 2:
-                                img_read_flag = cv2.IMREAD_REDUCED_COLOR_2
+                                img_read_flag = 'reduced2'
                             else:
-                                img_read_flag = cv2.IMREAD_COLOR
+                                img_read_flag = 'color'
             except Exception:
-                img_read_flag = cv2.IMREAD_UNCHANGED
+                img_read_flag = 'unchanged'
 
-            img = cv2.imread(path, img_read_flag)
-            if img is None:
+            status, result = _pool_thumbnail(('file', path), img_read_flag)
+            if status == 'decode_failed':
                 with open(path, 'rb') as f:
                     data = f.read()
                 resp = Response(data, mimetype=_guess_image_mime_from_path(path) or 'application/octet-stream')
@@ -1346,13 +1785,13 @@ def api_image_stream():
                 resp.headers['X-TurboFile-Image-Engine'] = 'raw'
                 return resp
 
-            if _is_small_original_image(img):
+            if status == 'small':
                 with open(path, 'rb') as f:
                     data = f.read()
                 mime = _guess_image_mime_from_path(path)
                 engine = 'raw-small-original'
             else:
-                data, mime = _transform_cv_image(img)
+                data, mime = result
                 did_transform = bool(data and mime)
                 engine = 'opencv' if did_transform else 'raw'
                 if not did_transform:
@@ -1361,15 +1800,12 @@ def api_image_stream():
                         data = f.read()
                     mime = _guess_image_mime_from_path(path)
         else:
-            if not ssh:
-                ssh = ssh_manager.get_connection(server_ip)
-            if not ssh:
-                return jsonify({'success': False, 'error': 'SSH连接失败'}), 500
-            if not sftp:
+            if not sftp_entry:
                 try:
-                    sftp = ssh.open_sftp()
-                except Exception:
-                    sftp = None
+                    sftp_entry = _checkout_sftp_session(server_ip)
+                except RuntimeError:
+                    return jsonify({'success': False, 'error': 'SSH连接失败'}), 500
+                ssh, sftp = sftp_entry['ssh'], sftp_entry['sftp']
 
             if not transform_requested:
                 data_in = None
@@ -1395,10 +1831,10 @@ def api_image_stream():
             data = None
             mime = None
 
-            data, mime = _try_read_remote_small_original()
+            data, mime, small_engine = _try_read_remote_small_original()
             if data and mime:
                 did_transform = True
-                engine = 'raw-small-original'
+                engine = small_engine
 
             # Windows: prefer SFTP read + local OpenCV transform first (fast path similar to older versions).
             # This avoids spawning a PowerShell/ImageMagick process per image when SFTP access works.
@@ -1415,16 +1851,18 @@ def api_image_stream():
                         data_in = None
 
                     if data_in:
-                        img = _decode_image_bytes(data_in)
-                        if _is_small_original_image(img):
+                        status, result = _pool_thumbnail(('bytes', data_in), _decode_flag_name(data_in))
+                        if status == 'small':
                             data, mime = _raw_image_payload(data_in)
                             did_transform = True
                             engine = 'raw-small-original'
-                        else:
-                            data, mime = _transform_cv_image(img)
+                        elif status == 'ok':
+                            data, mime = result
                             did_transform = bool(data and mime)
                             if did_transform:
                                 engine = 'opencv'
+                except ImagePoolSaturated:
+                    raise
                 except Exception:
                     did_transform = False
                     data = None
@@ -1550,13 +1988,13 @@ def api_image_stream():
                         data_in = _read_posix_file_bytes_via_ssh(ssh, path)
                         engine = 'posix-ssh'
 
-                img = _decode_image_bytes(data_in)
-                if _is_small_original_image(img):
+                status, result = _pool_thumbnail(('bytes', data_in), _decode_flag_name(data_in))
+                if status == 'small':
                     data, mime = _raw_image_payload(data_in)
                     did_transform = True
                     engine = 'raw-small-original'
                 else:
-                    data, mime = _transform_cv_image(img)
+                    data, mime = result if status == 'ok' else (None, None)
                     did_transform = bool(data and mime)
                     if not did_transform:
                         data = data_in
@@ -1571,17 +2009,242 @@ def api_image_stream():
                             engine = 'opencv'
 
         resp = Response(data, mimetype=mime or 'application/octet-stream')
-        resp.headers['X-TurboFile-Image-Cache'] = 'BYPASS'
+        # Only transformed bodies may enter the thumbnail cache; raw fallbacks stay BYPASS.
+        resp.headers['X-TurboFile-Image-Cache'] = 'BYPASS' if engine in _RAW_IMAGE_ENGINES else 'MISS'
         resp.headers['X-TurboFile-Image-Engine'] = engine
         return resp
+    except ImagePoolSaturated as e:
+        resp = jsonify({'success': False, 'error': str(e)})
+        resp.headers['Retry-After'] = '1'
+        return resp, 429
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
-        if sftp:
+        _release_sftp_session(sftp_entry)
+
+
+@bp.route('/api/image/cache/stats', methods=['GET'])
+def api_image_cache_stats():
+    return jsonify({'success': True, **thumbnail_cache.get_stats()})
+
+
+@bp.route('/api/image/pool/stats', methods=['GET'])
+def api_image_pool_stats():
+    return jsonify({'success': True, **image_transform_pool.get_stats()})
+
+
+_IMAGE_BATCH_FRAME_RE = re.compile(rb'^TFTHUMB (\d+) (-?\d+) (\d+) (\w+)$')
+
+
+def _split_command_args(args, base_len):
+    """Group pre-quoted shell arguments so each command stays under IMAGE_BATCH_MAX_COMMAND_BYTES (UTF-8)."""
+    groups, group, size = [], [], base_len
+    for arg in args:
+        arg_len = len(arg.encode('utf-8', errors='surrogateescape')) + 1
+        if group and size + arg_len > IMAGE_BATCH_MAX_COMMAND_BYTES:
+            groups.append(group)
+            group, size = [], base_len
+        group.append(arg)
+        size += arg_len
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _remote_stat_batch(ssh, paths, timeout_sec: float = 25.0):
+    """Stat many POSIX paths in as few execs as ARG_MAX allows; returns {index: (size, mtime)} for readable files."""
+    script = (
+        'i=$1; shift; for f in "$@"; do '
+        'st=$(stat -c "%s %Y" -- "$f" 2>/dev/null) || st="-1 -1"; '
+        'echo "$i $st"; i=$((i+1)); done'
+    )
+    prefix = f"sh -c {shlex.quote(script)} sh"
+    stats = {}
+    start = 0
+    for group in _split_command_args([shlex.quote(p) for p in paths], len(prefix) + 16):
+        cmd = f"{prefix} {start} " + ' '.join(group)
+        start += len(group)
+        out_b, _, _ = _exec_ssh_command_bytes(ssh, cmd, timeout_sec=timeout_sec)
+        for line in (out_b or b'').decode('utf-8', errors='ignore').splitlines():
+            parts = line.split()
+            if len(parts) != 3:
+                continue
             try:
-                sftp.close()
-            except Exception:
-                pass
+                idx, size, mtime = int(parts[0]), int(parts[1]), int(parts[2])
+            except ValueError:
+                continue
+            if size >= 0:
+                stats[idx] = (size, mtime)
+    return stats
+
+
+def _remote_imagemagick_batch(ssh, tool: str, items, params, timeout_sec: float = 120.0):
+    """Render thumbnails for [(index, path), ...] in one remote shell; yields (index, ok, data, mime)."""
+    new_w, new_h, quality_eff, fmt_key, interp_key = params
+    target_w = new_w if new_w > 0 else new_h
+    target_h = new_h if new_h > 0 else new_w
+    geom = f"{target_w}x{target_h}>" if (target_w and target_h) else ""
+    im_opts = []
+    if geom:
+        im_opts.append(f"-thumbnail {shlex.quote(geom)}")
+    if interp_key != 'area':
+        im_opts.append("-filter Lanczos")
+    im_opts.append("-strip")
+    if 1 <= quality_eff <= 95:
+        im_opts.append(f"-quality {int(quality_eff)}")
+    opts = ' '.join(im_opts)
+    spec = 'webp' if fmt_key == 'webp' else ('png' if fmt_key == 'png' else 'jpg')
+
+    # One shell renders every item; each result is framed as "TFTHUMB <idx> <rc> <len> <fmt>\n<bytes>".
+    script = (
+        'tmp=$(mktemp) || exit 1; trap \'rm -f "$tmp"\' EXIT; '
+        'while [ $# -gt 1 ]; do i=$1; f=$2; shift 2; '
+        f'fmt={spec}; {tool} "$f" {opts} "$fmt:-" > "$tmp" 2>/dev/null; rc=$?; '
+        'if [ $rc -ne 0 ] && [ "$fmt" = webp ]; then '
+        f'fmt=jpg; {tool} "$f" {opts} jpg:- > "$tmp" 2>/dev/null; rc=$?; fi; '
+        'n=$(wc -c < "$tmp"); printf "TFTHUMB %s %s %s %s\\n" "$i" "$rc" "$n" "$fmt"; cat "$tmp"; '
+        'done'
+    )
+    args = ' '.join(f"{int(idx)} {shlex.quote(path)}" for idx, path in items)
+    cmd = f"sh -c {shlex.quote(script)} sh {args}"
+    mime_by_fmt = {'webp': 'image/webp', 'png': 'image/png', 'jpg': 'image/jpeg'}
+
+    with ssh_manager.get_scheduler(ssh).session() as channel:
+        channel.settimeout(timeout_sec)
+        channel.exec_command(cmd)
+        buf = b''
+        pending = None
+        while True:
+            if pending is None:
+                nl = buf.find(b'\n')
+                if nl >= 0:
+                    match = _IMAGE_BATCH_FRAME_RE.match(buf[:nl])
+                    buf = buf[nl + 1:]
+                    if match:
+                        pending = (int(match.group(1)), int(match.group(2)), int(match.group(3)), match.group(4).decode('ascii'))
+                    continue
+            elif len(buf) >= pending[2]:
+                idx, rc, size, fmt = pending
+                data, buf = buf[:size], buf[size:]
+                pending = None
+                ok = rc == 0 and bool(data)
+                yield idx, ok, data if ok else None, mime_by_fmt.get(fmt, 'image/jpeg') if ok else None
+                continue
+            chunk = channel.recv(256 * 1024)
+            if not chunk:
+                break
+            buf += chunk
+
+
+def _render_single_thumbnail(server_ip: str, path: str, params):
+    """Render one item through /api/image/stream (cache included); returns (data, mime, cache_status, engine)."""
+    new_w, new_h, quality_eff, fmt_key, interp_key = params
+    query = {'server': server_ip, 'path': path, 'width': new_w, 'height': new_h,
+             'quality': quality_eff, 'format': fmt_key, 'interp': interp_key}
+    with current_app.test_request_context('/api/image/stream', query_string=query):
+        resp = api_image_stream()
+    if isinstance(resp, tuple) or not isinstance(resp, Response) or resp.status_code != 200:
+        return None, None, None, None
+    return (resp.get_data(), resp.mimetype, resp.headers.get('X-TurboFile-Image-Cache'),
+            resp.headers.get('X-TurboFile-Image-Engine'))
+
+
+def _image_batch_record(index, path, data=None, mime=None, cache=None, engine=None, etag=None, error=None):
+    record = {'index': index, 'path': path, 'success': bool(data)}
+    if data:
+        record.update({
+            'mime': mime,
+            'cache': cache,
+            'engine': engine,
+            'data': base64.b64encode(data).decode('ascii'),
+        })
+        if etag:
+            record['etag'] = etag
+    else:
+        record['error'] = error or '缩略图生成失败'
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+@bp.route('/api/image/batch', methods=['POST'])
+def api_image_batch():
+    """Stream thumbnails for many images of one directory as NDJSON (one JSON object per line)."""
+    payload = request.get_json(silent=True) or {}
+    server_ip = payload.get('server')
+    paths = payload.get('paths') or []
+    if not server_ip or not isinstance(paths, list) or not paths:
+        return jsonify({'success': False, 'error': '缺少参数'}), 400
+    paths = [str(p) for p in paths if p][:IMAGE_BATCH_MAX_PATHS]
+    params = _normalize_image_thumb_params(payload) or _normalize_image_thumb_params({'width': 200, 'height': 200})
+
+    use_remote_batch = (not is_local_server(server_ip)) and (not is_windows_server(server_ip))
+    remote_tool = _get_remote_linux_imagemagick_tool(server_ip) if use_remote_batch else None
+
+    def _generate():
+        if not remote_tool:
+            # No single-invocation renderer: reuse the per-image pipeline in-process (one HTTP round trip).
+            for idx, path in enumerate(paths):
+                data, mime, cache, engine = _render_single_thumbnail(server_ip, path, params)
+                yield _image_batch_record(idx, path, data, mime, cache, engine)
+            return
+
+        ssh = ssh_manager.get_connection(server_ip)
+        if not ssh:
+            for idx, path in enumerate(paths):
+                yield _image_batch_record(idx, path, error='SSH连接失败')
+            return
+
+        stats = _remote_stat_batch(ssh, paths)
+        misses = []
+        for idx, path in enumerate(paths):
+            if idx not in stats:
+                yield _image_batch_record(idx, path, error='文件不存在或无法访问')
+                continue
+            key = ThumbnailDiskCache.make_key(server_ip, path, stats[idx][0], stats[idx][1], *params)
+            cached = thumbnail_cache.get(key) if THUMBNAIL_CACHE_CONFIG.get('enabled', True) else None
+            if cached:
+                yield _image_batch_record(idx, path, cached[0], cached[1], 'HIT', 'cache', ThumbnailDiskCache.etag_for(key))
+            else:
+                misses.append((idx, path, key))
+
+        if not misses:
+            return
+        by_index = {idx: (path, key) for idx, path, key in misses}
+        done = set()
+        # Keep each shell command well below ARG_MAX (in bytes); a normal page fits in one invocation.
+        chunks, chunk, chunk_len = [], [], 0
+        for idx, path, _ in misses:
+            arg_len = len(f"{idx} {shlex.quote(path)} ".encode('utf-8', errors='surrogateescape'))
+            if chunk and chunk_len + arg_len > IMAGE_BATCH_MAX_COMMAND_BYTES:
+                chunks.append(chunk)
+                chunk, chunk_len = [], 0
+            chunk.append((idx, path))
+            chunk_len += arg_len
+        if chunk:
+            chunks.append(chunk)
+        try:
+            for chunk in chunks:
+                for idx, ok, data, mime in _remote_imagemagick_batch(ssh, remote_tool, chunk, params):
+                    if idx not in by_index or idx in done or not ok:
+                        continue
+                    path, key = by_index[idx]
+                    done.add(idx)
+                    if THUMBNAIL_CACHE_CONFIG.get('enabled', True):
+                        thumbnail_cache.put(key, data, mime)
+                    yield _image_batch_record(idx, path, data, mime, 'MISS', 'remote-imagemagick-batch', ThumbnailDiskCache.etag_for(key))
+        except Exception as e:
+            print(f"⚠️  批量缩略图生成中断 {server_ip}: {e}")
+
+        # Items ImageMagick could not handle fall back to the regular per-image pipeline.
+        for idx, path, _ in misses:
+            if idx in done:
+                continue
+            data, mime, cache, engine = _render_single_thumbnail(server_ip, path, params)
+            yield _image_batch_record(idx, path, data, mime, cache, engine)
+
+    resp = Response(stream_with_context(_generate()), mimetype='application/x-ndjson')
+    resp.headers['Cache-Control'] = 'no-store'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
 
 @bp.route('/api/file/read', methods=['GET'])
@@ -1646,20 +2309,20 @@ def api_file_save():
                 f.write(data_bytes)
             return jsonify({'success': True})
         else:
-            ssh = ssh_manager.get_connection(server_ip)
-            if not ssh:
+            try:
+                sftp_entry = _checkout_sftp_session(server_ip)
+            except RuntimeError:
                 return jsonify({'success': False, 'error': 'SSH连接失败'}), 500
-            sftp = ssh.open_sftp()
             try:
+                sftp = sftp_entry['sftp']
+                if sftp is None:
+                    raise RuntimeError(f'无法打开 SFTP 会话: {server_ip}')
                 fobj, _ = _sftp_open_with_fallback(sftp, path, 'wb', is_windows_server(server_ip))
                 with fobj as f:
                     f.write(data_bytes)
                 return jsonify({'success': True})
             finally:
-                try:
-                    sftp.close()
-                except Exception:
-                    pass
+                _release_sftp_session(sftp_entry)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1674,19 +2337,17 @@ def api_netron_model():
     if not str(path).lower().endswith('.onnx'):
         return jsonify({'success': False, 'error': '仅支持 ONNX 文件'}), 400
 
-    sftp = None
+    sftp_entry = None
     try:
         if is_local_server(server_ip):
             with open(path, 'rb') as f:
                 data = f.read()
         else:
-            ssh = ssh_manager.get_connection(server_ip)
-            if not ssh:
-                return jsonify({'success': False, 'error': 'SSH连接失败'}), 500
             try:
-                sftp = ssh.open_sftp()
-            except Exception:
-                sftp = None
+                sftp_entry = _checkout_sftp_session(server_ip)
+            except RuntimeError:
+                return jsonify({'success': False, 'error': 'SSH连接失败'}), 500
+            ssh, sftp = sftp_entry['ssh'], sftp_entry['sftp']
 
             try:
                 fobj, _ = _sftp_open_with_fallback(sftp, path, 'rb', is_windows_server(server_ip))
@@ -1707,11 +2368,7 @@ def api_netron_model():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
-        if sftp:
-            try:
-                sftp.close()
-            except Exception:
-                pass
+        _release_sftp_session(sftp_entry)
 
 
 @bp.route('/netron')
@@ -1855,6 +2512,45 @@ def browse_directory(server_ip):
             cleared_count = clear_cached_listing(server_ip, path)
             print(f"🔄 强制刷新: 清除了 {cleared_count} 个缓存项 - {server_ip}:{path}")
 
+        # Huge directories: page through a background-filled cursor instead of waiting for the full listing.
+        cursor = listing_cursors.get(request.args.get('cursor') or '', server_ip, path, show_hidden)
+        if cursor is None and listing_cursors.supports(server_ip):
+            if get_cached_listing(server_ip, path, show_hidden, sort_by, sort_order) is None:
+                cursor = listing_cursors.open(server_ip, path, show_hidden, restart=force_refresh)
+                if cursor.wait_complete(LISTING_CACHE_CONFIG['stream_after']) or cursor.error:
+                    # Finished quickly (now cached) or failed: use the regular sorted listing.
+                    cursor = None
+        if cursor is not None:
+            cursor.wait_for(offset + limit, LISTING_CACHE_CONFIG['stream_page_wait'])
+            loaded_total = len(cursor.items)
+            start_index = min(offset, loaded_total)
+            paged_files, loaded_total, complete = cursor.page(start_index, limit)
+            end_index = start_index + len(paged_files)
+            has_more = (not complete) or end_index < loaded_total
+            response_time = (time.time() - start_time) * 1000
+            return jsonify({
+                'success': True,
+                'path': path,
+                'files': paged_files,
+                'show_hidden': show_hidden,
+                'sort_by': sort_by,
+                'sort_order': sort_order,
+                'sorted': False,
+                'streaming': True,
+                'cursor': cursor.id,
+                'complete': complete,
+                'force_refresh': force_refresh,
+                'cache_cleared': cleared_count if force_refresh else 0,
+                'response_time': round(response_time, 2),
+                'file_count': loaded_total,
+                'total_count': loaded_total,
+                'offset': start_index,
+                'limit': limit,
+                'has_more': has_more,
+                'next_offset': end_index if has_more else None,
+                'loaded_count': end_index
+            })
+
         # Fetch directory list (rebuild after cache clear).
         files = get_directory_listing_optimized(server_ip, path, show_hidden, sort_by, sort_order)
         total_count = len(files)
@@ -1896,6 +2592,83 @@ def browse_directory(server_ip):
             'response_time': round(response_time, 2)
         })
 
+QUICK_SEARCH_PAGE_SIZE_DEFAULT = 200
+QUICK_SEARCH_PAGE_SIZE_MAX = 2000
+
+def _quick_search_all(server_ip, path, keyword, show_hidden, sort_by, sort_order):
+    """Every match in one directory, paginated; uncached directories stream through a search cursor."""
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
+    try:
+        limit = int(request.args.get('limit', QUICK_SEARCH_PAGE_SIZE_DEFAULT))
+    except ValueError:
+        limit = QUICK_SEARCH_PAGE_SIZE_DEFAULT
+    limit = max(1, min(limit, QUICK_SEARCH_PAGE_SIZE_MAX))
+
+    cursor = listing_cursors.get(request.args.get('cursor') or '', server_ip, path, show_hidden, keyword=keyword)
+    files = None
+    if cursor is None:
+        files = get_cached_listing(server_ip, path, show_hidden, sort_by, sort_order)
+        if files is None and not listing_cursors.supports(server_ip):
+            # Windows: one structured listing (cached for the next keystroke), filtered here.
+            files = get_directory_listing_optimized(server_ip, path, show_hidden, sort_by, sort_order)
+
+    if files is not None:
+        positions = files.find(keyword) if hasattr(files, 'find') else [
+            idx for idx, item in enumerate(files) if keyword.lower() in str(item.get('name', '')).lower()
+        ]
+        start_index = min(offset, len(positions))
+        page = positions[start_index:start_index + limit]
+        matches = [dict(files[position], index=position) for position in page]
+        end_index = start_index + len(matches)
+        has_more = end_index < len(positions)
+        return jsonify({
+            'success': True,
+            'path': path,
+            'keyword': keyword,
+            'mode': 'all',
+            'total_count': len(files),
+            'match_count': len(positions),
+            'matches': matches,
+            'sorted': True,
+            'streaming': False,
+            'cursor': None,
+            'complete': True,
+            'offset': start_index,
+            'limit': limit,
+            'has_more': has_more,
+            'next_offset': end_index if has_more else None
+        })
+
+    if cursor is None:
+        cursor = listing_cursors.open(server_ip, path, show_hidden, keyword=keyword)
+    cursor.wait_for(offset + limit, LISTING_CACHE_CONFIG['stream_page_wait'])
+    if cursor.error and not cursor.items:
+        return jsonify({'success': False, 'error': cursor.error}), 500
+    start_index = min(offset, len(cursor.items))
+    matches, loaded_total, complete = cursor.page(start_index, limit)
+    end_index = start_index + len(matches)
+    has_more = (not complete) or end_index < loaded_total
+    return jsonify({
+        'success': True,
+        'path': path,
+        'keyword': keyword,
+        'mode': 'all',
+        'total_count': None,
+        'match_count': loaded_total,
+        'matches': [dict(item, index=None) for item in matches],
+        'sorted': False,
+        'streaming': True,
+        'cursor': cursor.id,
+        'complete': complete,
+        'offset': start_index,
+        'limit': limit,
+        'has_more': has_more,
+        'next_offset': end_index if has_more else None
+    })
+
 @bp.route('/api/quick_search/<server_ip>')
 def quick_search(server_ip):
     path = request.args.get('path', '')
@@ -1903,6 +2676,7 @@ def quick_search(server_ip):
     show_hidden = request.args.get('show_hidden', 'false').lower() == 'true'
     sort_by = normalize_browse_sort_by(request.args.get('sort_by'))
     sort_order = normalize_browse_sort_order(request.args.get('sort_order'))
+    mode = request.args.get('mode', 'first').strip().lower()
 
     if not server_ip or server_ip not in SERVERS:
         return jsonify({'success': False, 'error': '无效的服务器'}), 400
@@ -1910,6 +2684,9 @@ def quick_search(server_ip):
         return jsonify({'success': False, 'error': '缺少路径或关键字'}), 400
 
     try:
+        if mode == 'all':
+            return _quick_search_all(server_ip, path, keyword, show_hidden, sort_by, sort_order)
+
         files = get_cached_listing(server_ip, path, show_hidden, sort_by, sort_order)
         if files is not None:
             if not files:
@@ -1922,19 +2699,16 @@ def quick_search(server_ip):
                     'index': None
                 })
 
-            keyword_lower = keyword.lower()
             first_match = None
-            first_index = None
-            for idx, item in enumerate(files):
-                name = str(item.get('name', ''))
-                if keyword_lower in name.lower():
-                    first_match = {
-                        'name': item.get('name', ''),
-                        'path': item.get('path', ''),
-                        'is_directory': bool(item.get('is_directory'))
-                    }
-                    first_index = idx
-                    break
+            positions = files.find(keyword)
+            first_index = positions[0] if positions else None
+            if first_index is not None:
+                item = files[first_index]
+                first_match = {
+                    'name': item.get('name', ''),
+                    'path': item.get('path', ''),
+                    'is_directory': bool(item.get('is_directory'))
+                }
 
             return jsonify({
                 'success': True,
@@ -1995,27 +2769,22 @@ def quick_search(server_ip):
                 except Exception:
                     first_match = None
         else:
-            def _escape_find_glob(text: str) -> str:
-                return re.sub(r'([*?\\[\\]\\\\])', lambda m: '\\\\' + m.group(1), text)
-
             pattern = f"*{_escape_find_glob(keyword)}*"
             hidden_filter = "" if show_hidden else " -not -name '.*'"
+            # Type and name in one round trip (%y/%f), NUL-separated so odd names survive.
             find_cmd = (
                 f"find {shlex.quote(path)} -maxdepth 1 -mindepth 1"
-                f"{hidden_filter} -iname {shlex.quote(pattern)} -print -quit"
+                f"{hidden_filter} -iname {shlex.quote(pattern)} -printf '%y\\0%f\\0' -quit"
             )
             stdout, stderr, exit_code = ssh_manager.execute_command(server_ip, find_cmd)
-            found_line = (stdout or '').strip().splitlines()
-            found_path = found_line[0].strip() if found_line else ''
-            if found_path:
-                name = os.path.basename(found_path.rstrip('/'))
-                test_cmd = f"[ -d {shlex.quote(found_path)} ] && echo DIR || echo FILE"
-                t_out, _, _ = ssh_manager.execute_command(server_ip, test_cmd)
-                is_dir = (t_out or '').strip().upper() == 'DIR'
+            fields = (stdout or '').split('\0')
+            if len(fields) >= 2 and fields[1]:
+                name = fields[1]
+                prefix = path if path.endswith('/') else path + '/'
                 first_match = {
                     'name': name,
-                    'path': found_path,
-                    'is_directory': is_dir
+                    'path': prefix + name,
+                    'is_directory': fields[0] == 'd'
                 }
 
         return jsonify({
@@ -2049,6 +2818,11 @@ def handle_start_transfer(data):
     select_all = bool(data.get('select_all', False))
     source_dir = data.get('source_dir') or ''
     exclude_paths = data.get('exclude_paths') or []
+    priority = parse_transfer_priority(data.get('priority'))
+    try:
+        rate_limit_kb = max(0, int(data.get('rate_limit_kb') or 0))
+    except (TypeError, ValueError):
+        rate_limit_kb = 0
 
     if not source_server or not target_server or not target_path:
         emit('transfer_cancelled', {'status': 'error', 'message': '参数不完整：请提供源/目标服务器与目标路径'})
@@ -2064,38 +2838,83 @@ def handle_start_transfer(data):
         emit('transfer_cancelled', {'status': 'error', 'message': '全选传输缺少 source_dir'})
         return
 
-    # Record transfer task.
-    active_transfers[transfer_id] = {
-        'source_server': source_server,
-        'source_files': source_files,
-        'target_server': target_server,
-        'target_path': target_path,
-        'mode': mode,
-        'select_all': select_all,
-        'source_dir': source_dir,
-        'exclude_paths': exclude_paths,
-        'parallel_enabled': parallel_enabled,
-        'start_time': datetime.now(),
-        'client_ip': client_ip
-    }
-    init_transfer_bytes(transfer_id)
-
-    # Start immediate parallel transfer.
-    start_instant_parallel_transfer(
-        transfer_id,
-        source_server,
-        source_files,
-        target_server,
-        target_path,
-        mode,
-        fast_ssh,
-        select_all=select_all,
-        source_dir=source_dir,
-        exclude_paths=exclude_paths,
-        parallel_enabled=parallel_enabled
+    def start():
+        # Record transfer task once the scheduler admits it.
+        active_transfers[transfer_id] = {
+            'source_server': source_server,
+            'source_files': source_files,
+            'target_server': target_server,
+            'target_path': target_path,
+            'mode': mode,
+            'select_all': select_all,
+            'source_dir': source_dir,
+            'exclude_paths': exclude_paths,
+            'parallel_enabled': parallel_enabled,
+            'start_time': datetime.now(),
+            'client_ip': client_ip,
+            'priority': priority,
+            'rate_limit_kb': rate_limit_kb
+        }
+        init_transfer_bytes(transfer_id)
+
+        start_instant_parallel_transfer(
+            transfer_id,
+            source_server,
+            source_files,
+            target_server,
+            target_path,
+            mode,
+            fast_ssh,
+            select_all=select_all,
+            source_dir=source_dir,
+            exclude_paths=exclude_paths,
+            parallel_enabled=parallel_enabled
+        )
+
+    position = transfer_scheduler.submit(
+        transfer_id, start, source_server, target_server,
+        client_ip=client_ip, priority=priority, sid=request.sid
     )
 
-    emit('transfer_started', {'transfer_id': transfer_id})
+    emit('transfer_started', {'transfer_id': transfer_id, 'queued': position > 0, 'queue_position': position})
+
+@socketio.on('set_rate_limit')
+def handle_set_rate_limit(data):
+    """Change a running transfer's byte budget (KB/s, 0 = unlimited); without transfer_id, the global one."""
+    data = data or {}
+    transfer_id = data.get('transfer_id')
+    raw_limit = data.get('limit_kb')
+    client_ip = _get_client_ip()
+    is_admin = is_admin_client_ip(client_ip)
+    if not transfer_id and not is_admin:
+        emit('rate_limit_updated', {'transfer_id': None, 'success': False, 'message': '仅管理员可以调整全局限速'})
+        return
+    if transfer_id and not is_admin and (active_transfers.get(transfer_id) or {}).get('client_ip') != client_ip:
+        emit('rate_limit_updated', {'transfer_id': transfer_id, 'success': False, 'message': '无权调整其他客户端的传输限速'})
+        return
+    try:
+        limit = None if raw_limit is None and not transfer_id else max(0, int(raw_limit or 0))
+    except (TypeError, ValueError):
+        emit('rate_limit_updated', {'transfer_id': transfer_id, 'success': False, 'message': '无效的限速值'})
+        return
+
+    if transfer_id:
+        if transfer_id in active_transfers:
+            active_transfers[transfer_id]['rate_limit_kb'] = limit
+        if not bandwidth_manager.set_limit(transfer_id, limit):
+            emit('rate_limit_updated', {'transfer_id': transfer_id, 'success': False, 'message': '传输任务不存在或尚未开始'})
+            return
+    else:
+        bandwidth_manager.set_global_limit(limit)
+
+    snapshot = bandwidth_manager.snapshot(transfer_id)
+    emit('rate_limit_updated', {
+        'transfer_id': transfer_id,
+        'success': True,
+        'limit_kb': limit,
+        'effective_kb': snapshot['transfers'].get(transfer_id, {}).get('effective', 0) if transfer_id else snapshot['global_limit'],
+        'global_limit_kb': snapshot['global_limit']
+    })
 
 @socketio.on('cancel_transfer')
 def handle_cancel_transfer(data):
@@ -2107,6 +2926,14 @@ def handle_cancel_transfer(data):
         emit('transfer_cancelled', {'status': 'error', 'message': '无效的传输ID'})
         return
 
+    if transfer_scheduler.cancel(transfer_id):
+        emit('transfer_cancelled', {
+            'transfer_id': transfer_id,
+            'status': 'success',
+            'message': '已从传输队列移除'
+        })
+        return
+
     if transfer_id not in active_transfers and not force_cancel:
         emit('transfer_cancelled', {'status': 'error', 'message': '传输任务不存在或已完成'})
         return
@@ -2326,11 +3153,18 @@ def delete_files():
                     if exit_code != 0:
                         failed_items.append({'path': base_dir, 'error': stderr or stdout or '删除失败'})
 
-            # Clear cache for affected dirs to refresh the browser view.
+            # Clear base_dir itself, then only the subtrees that were deleted (excluded and,
+            # without show_hidden, dot entries were kept along with their cached listings).
             cache_cleared = 0
             try:
+                kept = {str(p).replace('\\', '/').rstrip('/') for p in exclude_paths if p}
                 for d in parent_dirs:
                     cache_cleared += clear_cached_listing(server_ip, d)
+                    for name in listing_cache.child_names(server_ip, d):
+                        child = f"{d.rstrip('/')}/{name}"
+                        if child in kept or (not show_hidden and name.startswith('.')):
+                            continue
+                        cache_cleared += clear_cached_listing(server_ip, child, recursive=True)
             except Exception:
                 pass
 
@@ -2509,6 +3343,9 @@ def delete_files():
         try:
             for d in parent_dirs:
                 cache_cleared += clear_cached_listing(server_ip, d)
+            for deleted_path in paths:
+                cache_cleared += clear_cached_listing(server_ip, deleted_path, recursive=True)
+            filename_indexes.note_removed(server_ip, paths)
         except Exception:
             pass
 
@@ -2984,7 +3821,7 @@ def restore_terminal_sessions():
 
 @bp.route('/api/compute_size', methods=['POST'])
 def compute_size():
-    """Compute file/folder size."""
+    """Compute file/folder size (exact bytes and file count) via the background size service."""
     try:
         data = request.get_json()
         server_ip = data.get('server')
@@ -2992,71 +3829,25 @@ def compute_size():
         if not server_ip or not file_path:
             return jsonify({'success': False, 'error': '缺少必要参数'})
 
-        is_windows = is_windows_server(server_ip)
-        is_local = is_local_server(server_ip)
-
-        size_bytes = None
-
-        if is_local and not is_windows:
-            # Local Linux: use du -sh for human-readable size.
-            if not os.path.exists(file_path):
-                return jsonify({'success': False, 'error': '路径不存在'})
-            du_human_cmd = f"du -sh {shlex.quote(file_path)} 2>/dev/null"
-            try:
-                output = subprocess.check_output(du_human_cmd, shell=True, text=True, stderr=subprocess.STDOUT)
-                human_size = (output or '').strip().split()[0]
-            except subprocess.CalledProcessError as e:
-                return jsonify({'success': False, 'error': e.output.strip() if e.output else '计算失败'})
-            return jsonify({
-                'success': True,
-                'size_bytes': None,
-                'human_size': human_size
-            })
-        else:
-            if is_windows:
-                safe_path = _escape_pwsh_literal(file_path)
-                pwsh_template = (
-                    "powershell -NoProfile -Command "
-                    "\"if (Test-Path -LiteralPath '{path}' -PathType Container) {{ "
-                    "(Get-ChildItem -LiteralPath '{path}' -Recurse -Force -ErrorAction SilentlyContinue "
-                    "| Measure-Object -Property Length -Sum).Sum "
-                    "}} elseif (Test-Path -LiteralPath '{path}' -PathType Leaf) {{ "
-                    "(Get-Item -LiteralPath '{path}').Length "
-                    "}} else {{ 'NOTFOUND' }}\""
-                )
-                pwsh_cmd = pwsh_template.format(path=safe_path)
-                output, error, exit_code = ssh_manager.execute_command(server_ip, pwsh_cmd)
-                if exit_code != 0 or not output:
-                    return jsonify({'success': False, 'error': error or '计算失败'})
-                text = (output or '').strip()
-                if text.upper().startswith('NOTFOUND'):
-                    return jsonify({'success': False, 'error': '路径不存在'})
-                try:
-                    size_bytes = int(text)
-                except Exception:
-                    return jsonify({'success': False, 'error': f'解析大小失败: {text}'})
-            else:
-                # Remote Linux/NAS: use du -sh for human-readable size.
-                du_human_cmd = f"du -sh {shlex.quote(file_path)} 2>/dev/null | awk '{{print $1}}'"
-                output, error, exit_code = ssh_manager.execute_command(server_ip, du_human_cmd)
-                if exit_code != 0 or not output:
-                    return jsonify({'success': False, 'error': error or '计算失败'})
-                human_size = (output or '').strip().splitlines()[0]
-                return jsonify({
-                    'success': True,
-                    'size_bytes': None,
-                    'human_size': human_size
-                })
-
-        return jsonify({
-            'success': True,
-            'size_bytes': size_bytes,
-            'human_size': _human_readable_size(size_bytes)
-        })
+        job = directory_sizes.request(server_ip, file_path)
+        job.event.wait(DIR_SIZE_CONFIG['wait_seconds'])
+        result = job.snapshot()
+        if job.done and job.error:
+            return jsonify({'success': False, 'error': job.error})
+        # Still scanning: partial totals now, size_progress events until done.
+        return jsonify(dict(result, success=True, pending=not job.done))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
+@bp.route('/api/compute_size/<job_id>', methods=['GET'])
+def compute_size_status(job_id):
+    job = directory_sizes.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify(dict(job.snapshot(), success=not (job.done and job.error), pending=not job.done))
+
+
 @bp.route('/api/compress', methods=['POST'])
 def compress_path():
     """Compress files/folders into a zip."""
@@ -3322,12 +4113,82 @@ def get_active_transfers():
         return jsonify({
             'success': True,
             'active_count': len(transfers),
-            'transfers': transfers
+            'transfers': transfers,
+            'queued': transfer_scheduler.snapshot()['queued']
         })
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@bp.route('/api/ssh_pool/stats', methods=['GET'])
+def get_ssh_pool_stats():
+    """Return SSH connection pool metrics."""
+    try:
+        return jsonify({'success': True, **ssh_manager.get_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/api/listing_cache/stats', methods=['GET'])
+def get_listing_cache_stats():
+    """Return directory listing cache metrics."""
+    try:
+        return jsonify({'success': True, **listing_cache.get_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/api/search_index/<server_ip>/build', methods=['POST'])
+def build_search_index(server_ip):
+    """Start a recursive filename crawl of a server root."""
+    if not server_ip or server_ip not in SERVERS:
+        return jsonify({'success': False, 'error': '无效的服务器'}), 400
+    payload = request.get_json(silent=True) or {}
+    root = str(payload.get('root') or get_default_path(server_ip))
+    filename_indexes.build(server_ip, root)
+    return jsonify({'success': True, 'root': root, **filename_indexes.get_status(server_ip)})
+
+@bp.route('/api/search_index/<server_ip>/status', methods=['GET'])
+def get_search_index_status(server_ip):
+    if not server_ip or server_ip not in SERVERS:
+        return jsonify({'success': False, 'error': '无效的服务器'}), 400
+    return jsonify({'success': True, **filename_indexes.get_status(server_ip)})
+
+@bp.route('/api/search_index/<server_ip>', methods=['DELETE'])
+def drop_search_index(server_ip):
+    if not server_ip or server_ip not in SERVERS:
+        return jsonify({'success': False, 'error': '无效的服务器'}), 400
+    filename_indexes.drop(server_ip)
+    return jsonify({'success': True})
+
+@bp.route('/api/search_index/<server_ip>', methods=['GET'])
+def query_search_index(server_ip):
+    """Ranked substring/glob filename search over the server's index."""
+    keyword = request.args.get('q', '').strip()
+    mode = 'glob' if request.args.get('mode') == 'glob' else 'substring'
+    within = request.args.get('path') or None
+    show_hidden = request.args.get('show_hidden', 'false').lower() == 'true'
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), SEARCH_INDEX_CONFIG['max_results']))
+    except ValueError:
+        limit = 50
+    if not server_ip or server_ip not in SERVERS:
+        return jsonify({'success': False, 'error': '无效的服务器'}), 400
+    if not keyword:
+        return jsonify({'success': False, 'error': '缺少关键字'}), 400
+    index = filename_indexes.get(server_ip)
+    if index is None:
+        return jsonify({'success': False, 'error': '该服务器尚未建立文件名索引'}), 404
+    start_time = time.time()
+    results, total = index.query(keyword, mode, limit, within, show_hidden)
+    return jsonify({
+        'success': True,
+        'keyword': keyword,
+        'mode': mode,
+        'root': index.root,
+        'results': results,
+        'total_count': total,
+        'response_time': round((time.time() - start_time) * 1000, 2)
+    })
+
 @bp.route('/api/active_terminals', methods=['GET'])
 def get_active_terminals():
     """Return active terminal sessions."""
@@ -3360,9 +4221,51 @@ def handle_disconnect():
         mark_terminal_sessions_detached_for_sid(request.sid)
     except Exception:
         pass
+    search_sessions.close(request.sid)
     print('客户端已断开连接')
 
 
+@socketio.on('search_query')
+def handle_search_query(data):
+    """Search-as-you-type: results arrive as search_results events; newer queries supersede older ones."""
+    data = data or {}
+    panel = str(data.get('panel') or 'source')
+    server_ip = str(data.get('server_ip') or '')
+    path = str(data.get('path') or '')
+    keyword = str(data.get('keyword') or '').strip()
+    if not server_ip or server_ip not in SERVERS:
+        emit('search_results', {'panel': panel, 'query_id': data.get('query_id'), 'complete': True, 'error': '无效的服务器'})
+        return
+    client_ip = _get_client_ip()
+    if not is_server_visible_to_client(server_ip, client_ip):
+        emit('search_results', {
+            'panel': panel,
+            'query_id': data.get('query_id'),
+            'complete': True,
+            'error': f'客户端 {client_ip or "未知"} 无权访问服务器 {server_ip}'
+        })
+        return
+    if not path or not keyword:
+        search_sessions.cancel(request.sid, panel)
+        emit('search_results', {'panel': panel, 'query_id': data.get('query_id'), 'matches': [], 'complete': True, 'error': None})
+        return
+    sid = request.sid
+    search_sessions.submit(sid, panel, {
+        'server_ip': server_ip,
+        'path': path,
+        'keyword': keyword,
+        'show_hidden': bool(data.get('show_hidden')),
+        'sort_by': normalize_browse_sort_by(data.get('sort_by')),
+        'sort_order': normalize_browse_sort_order(data.get('sort_order')),
+        'query_id': data.get('query_id')
+    }, lambda payload: socketio.emit('search_results', payload, room=sid))
+
+
+@socketio.on('search_cancel')
+def handle_search_cancel(data):
+    search_sessions.cancel(request.sid, str((data or {}).get('panel') or 'source'))
+
+
 @socketio.on('terminal_input')
 def handle_terminal_input(data):
     task, error = _get_socket_owned_terminal(data)